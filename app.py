@@ -11,19 +11,39 @@ Compliant with:
 
 import os
 import json
+import asyncio
 import hashlib
 import logging
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime, timedelta
 from functools import wraps
 from typing import Optional, Dict, Any, List
 
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, stream_with_context, url_for
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import google.generativeai as genai
 from cryptography.fernet import Fernet
-import bleach
+
+from behavior_library import BehaviorLibrary, BehaviorLibraryStore, count_behaviors
+from chat_parsers import parse_chat
+from conversation_analysis import (
+    ConversationStateStore, compact_state, fingerprint_chain, merge_window_analyses, split_windows
+)
+from job_queue import JobQueue
+from json_provider import create_json_provider
+from json_stream import JsonRepairParser, RepairedJson, SectionStreamParser, repair_json
+from model_registry import ModelRegistry
+from model_router import ModelRouter, RoutingPolicy
+from profile_store import ProfileState, ProfileStateStore
+from prompts import CHARS_PER_TOKEN, PromptStats, PromptTemplate, Trimmed, fit_to_budget
+from result_cache import TieredResultCache, create_result_cache, result_cache_key
+from sanitizer import sanitize, sanitize_fields
+from single_flight import AsyncSingleFlight, SingleFlight
+from sync_store import SQLiteSyncStore, SyncVersion
 
 # Configure logging
 logging.basicConfig(
@@ -34,6 +54,8 @@ logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
+# orjson-backed response encoding; JSON_PROVIDER=stdlib uses Flask's own encoder
+app.json = create_json_provider(app, os.environ.get('JSON_PROVIDER', 'orjson'))
 
 # CORS configuration for mobile and web apps
 CORS(app, origins=[
@@ -56,29 +78,73 @@ limiter = Limiter(
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY')  # For sync encryption
 APP_SECRET_KEY = os.environ.get('APP_SECRET_KEY', 'dev-secret-key')
+BEHAVIOR_LIBRARY_RELOAD_INTERVAL = float(os.environ.get('BEHAVIOR_LIBRARY_RELOAD_INTERVAL', '30'))
+RESULT_CACHE_MAX_MB = int(os.environ.get('RESULT_CACHE_MAX_MB', '64'))
+RESULT_CACHE_BACKEND = os.environ.get('RESULT_CACHE_BACKEND', 'memory')  # memory, sqlite or redis
+REDIS_URL = os.environ.get('REDIS_URL')
+SINGLE_FLIGHT_SHARED = os.environ.get('SINGLE_FLIGHT_SHARED', 'true').lower() == 'true'
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '50'))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', '8'))
+MODEL_KEEPALIVE_INTERVAL = float(os.environ.get('MODEL_KEEPALIVE_INTERVAL', '240'))
+LONG_CONVERSATION_MAX_WINDOWS = int(os.environ.get('LONG_CONVERSATION_MAX_WINDOWS', '8'))
+LONG_CONVERSATION_OVERLAP = int(os.environ.get('LONG_CONVERSATION_OVERLAP', '4'))  # messages
+LONG_CONVERSATION_CONCURRENCY = int(os.environ.get('LONG_CONVERSATION_CONCURRENCY', '4'))
+INCREMENTAL_MAX_NEW_MESSAGES = int(os.environ.get('INCREMENTAL_MAX_NEW_MESSAGES', '50'))
+INCREMENTAL_STATE_TTL = int(os.environ.get('INCREMENTAL_STATE_TTL', str(7 * 24 * 3600)))
+BEHAVIOR_CANDIDATES = int(os.environ.get('BEHAVIOR_CANDIDATES', '15'))
+CHAT_PARSER_MIN_CONFIDENCE = float(os.environ.get('CHAT_PARSER_MIN_CONFIDENCE', '0.8'))
+PROFILE_STATE_TTL = int(os.environ.get('PROFILE_STATE_TTL', str(30 * 24 * 3600)))
+SYNC_MAX_VERSIONS = int(os.environ.get('SYNC_MAX_VERSIONS', '5'))
+SYNC_MAX_BLOB_BYTES = int(os.environ.get('SYNC_MAX_BLOB_BYTES', str(5 * 1024 * 1024)))
+# Per-endpoint overrides of fast_max_tokens, e.g. '{"conversation": 2000}'
+MODEL_ROUTING_THRESHOLDS = json.loads(os.environ.get('MODEL_ROUTING_THRESHOLDS', '{}'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', '3600'))
+JOB_MAX_WAIT = 30
+LOCAL_STORE_DIR = os.environ.get(
+    'LOCAL_STORE_DIR',
+    os.path.join(tempfile.gettempdir(), 'text-decoder')
+)
 
 # Configure Gemini
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
-# Initialize encryption for sync
+# Initialize encryption for sync. A malformed key disables encryption like a
+# missing one: a key generated per process would leave the shared stores
+# unreadable to other workers and after a restart.
 cipher_suite = None
 if ENCRYPTION_KEY:
-    cipher_suite = Fernet(ENCRYPTION_KEY.encode() if len(ENCRYPTION_KEY) == 44 else Fernet.generate_key())
+    try:
+        cipher_suite = Fernet(ENCRYPTION_KEY.encode())
+    except ValueError:
+        logger.error("ENCRYPTION_KEY is not a valid Fernet key; encryption is disabled")
 
 
 # =============================================================================
 # UTILITY FUNCTIONS
 # =============================================================================
 
-def sanitize_input(text: str) -> str:
-    """Sanitize user input to prevent injection attacks."""
-    if not text:
-        return ""
-    # Remove potentially harmful HTML/scripts
-    cleaned = bleach.clean(text, tags=[], strip=True)
-    # Limit length to prevent abuse
-    return cleaned[:50000]
+MAX_INPUT_LENGTH = 50000
+
+
+def sanitize_input(text: str, max_length: Optional[int] = MAX_INPUT_LENGTH) -> str:
+    """
+    Sanitize user input to prevent injection attacks.
+    Pass max_length=None for input already fitted to a token budget.
+    """
+    # Remove potentially harmful HTML/scripts and limit length to prevent abuse.
+    # Plain text skips the HTML parse entirely.
+    return sanitize(text, max_length)
+
+
+def sanitize_payload(value: Any) -> Any:
+    """
+    Sanitize a structured request field (a conversation, a profile) in
+    place in the parsed value, so it is serialized only once, as valid
+    JSON. Each string inside it is cut to MAX_INPUT_LENGTH.
+    """
+    return sanitize_fields(value, MAX_INPUT_LENGTH)
 
 
 def validate_api_key(f):
@@ -111,9 +177,9 @@ def create_accessible_response(data: Dict[Any, Any], message: str = "Success") -
     }
 
 
-def create_error_response(error: str, details: str = "", status_code: int = 400) -> tuple:
-    """Create accessible error response."""
-    return jsonify({
+def create_error_body(error: str, details: str = "") -> Dict[str, Any]:
+    """Build the accessible error body (framework independent)."""
+    return {
         'success': False,
         'error': error,
         'details': details,
@@ -122,13 +188,36 @@ def create_error_response(error: str, details: str = "", status_code: int = 400)
             'screen_reader_summary': f"Error: {error}",
             'suggested_action': 'Please try again or contact support'
         }
-    }), status_code
+    }
+
+
+def create_error_response(error: str, details: str = "", status_code: int = 400) -> tuple:
+    """Create accessible error response."""
+    return jsonify(create_error_body(error, details)), status_code
 
 
 # =============================================================================
 # GEMINI API PROMPTS
 # =============================================================================
 
+SIMPLE_ANALYSIS_PROMPT = """Analyze this conversation and identify speakers with their emotional states.
+
+Return ONLY valid JSON in this exact format:
+{
+    "speakers": [
+        {
+            "label": "Speaker 1",
+            "likely_emotional_state": "emotion description",
+            "translation": "what they really mean in plain language",
+            "advice": "how to respond effectively"
+        }
+    ]
+}
+
+Conversation:
+{text}
+"""
+
 SPEAKER_IDENTIFICATION_PROMPT = """
 You are an expert conversation analyst. Analyze the following text and identify distinct speakers.
 
@@ -240,11 +329,24 @@ Return a JSON object:
 
 Speakers in conversation: {speakers}
 Behavior library categories to reference: {behavior_categories}
+Library behaviors these messages most resemble (use these behavior_id values for matches): {behavior_candidates}
 
 Conversation:
 {conversation}
 """
 
+# Appended to the conversation prompt when a long conversation is analyzed in parts
+CONVERSATION_WINDOW_NOTE = """
+This is part {window} of a longer conversation. Analyze only the messages above; the parts are combined afterwards.
+"""
+
+# Appended to the conversation prompt when only newly added messages are analyzed
+CONVERSATION_UPDATE_NOTE = """
+These messages continue a conversation that was already analyzed. Summary of the earlier analysis, for context:
+{prior}
+The first {context_count} messages above were covered by that analysis and are included only for context. Analyze the {new_count} messages after them, but write the summary for the whole conversation so far, building on the earlier summary.
+"""
+
 RESPONSE_IMPACT_PROMPT = """
 You are a communication dynamics expert. The user wants to understand how a potential response might impact their conversation.
 
@@ -365,6 +467,13 @@ Create a detailed profile analysis:
 }
 """
 
+# Appended to the profile prompt when new conversations are folded into an earlier profile
+PROFILE_UPDATE_NOTE = """
+The historical data above holds only the conversations added since this profile was created:
+{prior}
+Update that profile with what the new conversations show, and return the complete updated profile in the same format.
+"""
+
 SELF_PROFILE_PROMPT = """
 You are creating an unbiased self-analysis profile for the user based on their conversations.
 Be honest, supportive, and constructive. Do not flatter - provide genuine insights.
@@ -442,427 +551,1589 @@ Create an unbiased self-profile:
 """
 
 
+# Templates compiled once into static segments and slots
+PROMPT_TEMPLATES = {
+    'simple': PromptTemplate(SIMPLE_ANALYSIS_PROMPT, ['text']),
+    'identify_speakers': PromptTemplate(SPEAKER_IDENTIFICATION_PROMPT + '{text}', ['text']),
+    'conversation': PromptTemplate(
+        CONVERSATION_ANALYSIS_PROMPT,
+        ['speakers', 'behavior_categories', 'behavior_candidates', 'conversation']
+    ),
+    'conversation_window': PromptTemplate(
+        CONVERSATION_ANALYSIS_PROMPT + CONVERSATION_WINDOW_NOTE,
+        ['speakers', 'behavior_categories', 'behavior_candidates', 'conversation', 'window']
+    ),
+    'conversation_update': PromptTemplate(
+        CONVERSATION_ANALYSIS_PROMPT + CONVERSATION_UPDATE_NOTE,
+        ['speakers', 'behavior_categories', 'behavior_candidates', 'conversation', 'prior',
+         'context_count', 'new_count']
+    ),
+    'response_impact': PromptTemplate(
+        RESPONSE_IMPACT_PROMPT, ['user_speaker', 'draft_response', 'conversation']
+    ),
+    'profile': PromptTemplate(PROFILE_ANALYSIS_PROMPT, ['profile_data']),
+    'profile_update': PromptTemplate(PROFILE_ANALYSIS_PROMPT + PROFILE_UPDATE_NOTE, ['profile_data', 'prior']),
+    'self_profile': PromptTemplate(SELF_PROFILE_PROMPT, ['user_data'])
+}
+
+
 # =============================================================================
-# API ENDPOINTS
+# GEMINI CALLS
 # =============================================================================
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint for Cloud Run."""
-    return jsonify({
-        'status': 'healthy',
-        'service': 'text-decoder-api',
-        'version': '1.0.0-mvp',
-        'timestamp': datetime.utcnow().isoformat()
-    })
-    
-@app.route('/analyze', methods=['POST'])
-@limiter.limit("30 per minute")
-def analyze_simple():x
-    """
-    Simple analysis endpoint for Expo app backward compatibility.
-    Returns basic speaker analysis without requiring authentication.
-    """
-    try:
-        data = request.get_json()
-        if not data or 'text' not in data:
-            return jsonify({
-                'success': False,
-                'message': 'Missing required field: text'
-            }), 400
+# Model per routing tier, fastest first
+MODEL_TIERS = {
+    'flash': 'gemini-1.5-flash',
+    'pro': 'gemini-1.5-pro'
+}
 
-        text = sanitize_input(data['text'])
-        if not text:
-            return jsonify({
-                'success': False,
-                'message': 'Text cannot be empty'
-            }), 400
+# Model, generation settings, result cache TTL (seconds) and prompt token
+# budget per endpoint. 'model' is the endpoint's default; inputs up to
+# fast_max_tokens (estimated, excluding the prompt template) go to the flash
+# tier, and while the default model's latency is over latency_target seconds
+# so do inputs up to twice that
+ANALYSIS_ENDPOINTS = {
+    'simple': {
+        'model': 'gemini-1.5-flash',
+        'generation_config': {
+            'temperature': 0.4,
+            'response_mime_type': 'application/json'
+        },
+        'cache_ttl': 3600,
+        'input_token_budget': 8000,
+        'fast_max_tokens': 8000,
+        'latency_target': 0
+    },
+    'identify_speakers': {
+        'model': 'gemini-1.5-pro',
+        'generation_config': {
+            'temperature': 0.3,
+            'response_mime_type': 'application/json'
+        },
+        'cache_ttl': 24 * 3600,
+        'input_token_budget': 16000,
+        'fast_max_tokens': 2000,
+        'latency_target': 10
+    },
+    'conversation': {
+        'model': 'gemini-1.5-pro',
+        'generation_config': {
+            'temperature': 0.4,
+            'response_mime_type': 'application/json',
+            'max_output_tokens': 8192
+        },
+        'cache_ttl': 24 * 3600,
+        'input_token_budget': 32000,
+        'fast_max_tokens': 1500,
+        'latency_target': 20
+    },
+    'response_impact': {
+        'model': 'gemini-1.5-pro',
+        'generation_config': {
+            'temperature': 0.5,
+            'response_mime_type': 'application/json',
+            'max_output_tokens': 4096
+        },
+        'cache_ttl': 3600,
+        'input_token_budget': 24000,
+        'fast_max_tokens': 3000,
+        'latency_target': 10
+    },
+    'profile': {
+        'model': 'gemini-1.5-pro',
+        'generation_config': {
+            'temperature': 0.4,
+            'response_mime_type': 'application/json',
+            'max_output_tokens': 8192
+        },
+        'cache_ttl': 6 * 3600,
+        'input_token_budget': 64000,
+        'fast_max_tokens': 0,
+        'latency_target': 0
+    },
+    'self_profile': {
+        'model': 'gemini-1.5-pro',
+        'generation_config': {
+            'temperature': 0.4,
+            'response_mime_type': 'application/json',
+            'max_output_tokens': 8192
+        },
+        'cache_ttl': 6 * 3600,
+        'input_token_budget': 64000,
+        'fast_max_tokens': 0,
+        'latency_target': 0
+    }
+}
 
-        # Call Gemini API for simple analysis
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        prompt = f"""Analyze this conversation and identify speakers with their emotional states.
 
-Return ONLY valid JSON in this exact format:
-{{
-    "speakers": [
-        {{
-            "label": "Speaker 1",
-            "likely_emotional_state": "emotion description",
-            "translation": "what they really mean in plain language",
-            "advice": "how to respond effectively"
-        }}
-    ]
-}}
+def build_model(model_name: str, generation_config: Dict[str, Any]):
+    return genai.GenerativeModel(
+        model_name,
+        generation_config=genai.types.GenerationConfig(**generation_config)
+    )
 
-Conversation:
-{text}
-"""
 
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.4,
-                response_mime_type="application/json"
-            )
-        )
+def warm_up_model(model) -> None:
+    # A token count is free and opens the shared API channel
+    model.count_tokens('warm-up')
 
-        # Parse response
-        try:
-            result = json.loads(response.text)
-            return jsonify(result), 200
-        except json.JSONDecodeError:
-            # Fallback if JSON parsing fails
-            return jsonify({
-                'speakers': [{
-                    'label': 'Speaker 1',
-                    'likely_emotional_state': 'Unable to analyze',
-                    'translation': 'The analysis could not be completed.',
-                    'advice': 'Please try again with clearer conversation text.'
-                }]
-            }), 200
 
-    except Exception as e:
-        logger.error(f"Analysis error: {str(e)}")
-        return jsonify({
-            'success': False,
-            'message': f'Analysis failed: {str(e)}'
-        }), 500
+async def warm_up_model_async(model) -> None:
+    await model.count_tokens_async('warm-up')
 
 
-@app.route('/api/v1/analyze/identify-speakers', methods=['POST'])
-@limiter.limit("30 per minute")
-#@validate_api_key
-def identify_speakers():
-    """
-    Identify speakers in a conversation text.
-    Users can then verify and correct the identification.
-    """
-    try:
-        data = request.get_json()
-        if not data or 'text' not in data:
-            return create_error_response(
-                "Missing required field",
-                "The 'text' field is required",
-                400
-            )
+# One pre-configured model object per endpoint configuration, built at
+# worker start and shared by every request
+model_registry = ModelRegistry(build_model)
+model_registry.preload(
+    (model, config['generation_config'])
+    for config in ANALYSIS_ENDPOINTS.values() for model in MODEL_TIERS.values()
+)
+if GEMINI_API_KEY:
+    model_registry.start_warm_up(warm_up_model, MODEL_KEEPALIVE_INTERVAL)
+
+# Chooses flash or pro per request from input size, the request's tier
+# preferences and live per-model latency and error rates
+model_router = ModelRouter(MODEL_TIERS, {
+    endpoint: RoutingPolicy(
+        default_tier=next(tier for tier, model in MODEL_TIERS.items() if model == config['model']),
+        fast_max_tokens=MODEL_ROUTING_THRESHOLDS.get(endpoint, config['fast_max_tokens']),
+        latency_target=config['latency_target']
+    )
+    for endpoint, config in ANALYSIS_ENDPOINTS.items()
+})
+
+# Analysis results keyed by hash of prompt, model and generation config,
+# optionally backed by a tier shared across workers and instances
+result_cache = create_result_cache(
+    max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024,
+    backend=RESULT_CACHE_BACKEND,
+    redis_url=REDIS_URL,
+    sqlite_path=os.path.join(LOCAL_STORE_DIR, 'result_cache.db')
+)
 
-        text = sanitize_input(data['text'])
-        if not text:
-            return create_error_response(
-                "Invalid input",
-                "Text cannot be empty after sanitization",
-                400
-            )
+# Analysis state per conversation fingerprint, for incremental re-analysis
+conversation_states = ConversationStateStore(result_cache, INCREMENTAL_STATE_TTL)
+
+# States are only reused while the prompt and model that produced them are unchanged
+CONVERSATION_STATE_SEED = hashlib.sha256(
+    (ANALYSIS_ENDPOINTS['conversation']['model'] + CONVERSATION_ANALYSIS_PROMPT).encode('utf-8')
+).hexdigest()
+
+# Rolling profile summaries for clients that opt in with a profile_hash.
+# They are only kept encrypted; without ENCRYPTION_KEY profile_hash is ignored.
+profile_states = None
+if cipher_suite is not None:
+    profile_states = ProfileStateStore(
+        os.path.join(LOCAL_STORE_DIR, 'profiles.db'),
+        cipher=cipher_suite,
+        ttl=PROFILE_STATE_TTL
+    )
+else:
+    logger.warning("No valid ENCRYPTION_KEY; profile_hash is ignored and profiles are analyzed in full")
+
+# Encrypted cross-device sync blobs, deduplicated by content.
+# Blobs are only kept encrypted; without ENCRYPTION_KEY sync is disabled.
+sync_store = None
+if cipher_suite is not None:
+    sync_store = SQLiteSyncStore(
+        os.path.join(LOCAL_STORE_DIR, 'sync.db'),
+        cipher=cipher_suite,
+        max_versions=SYNC_MAX_VERSIONS
+    )
+else:
+    logger.warning("No valid ENCRYPTION_KEY; sync upload and download are disabled")
+
+PROFILE_STATE_SEED = hashlib.sha256(
+    (ANALYSIS_ENDPOINTS['profile']['model'] + PROFILE_ANALYSIS_PROMPT).encode('utf-8')
+).hexdigest()
+
+# Identical in-flight analyses share one Gemini call; with a shared cache
+# tier, workers also coordinate through a lock in that store
+in_flight = SingleFlight(
+    backend=result_cache.backend
+    if SINGLE_FLIGHT_SHARED and isinstance(result_cache, TieredResultCache) else None
+)
 
-        # Call Gemini API
-        model = genai.GenerativeModel('gemini-1.5-pro')
 
-        prompt = SPEAKER_IDENTIFICATION_PROMPT + text
+def cache_bypass_requested() -> bool:
+    """Clients send 'Cache-Control: no-cache' to force a fresh analysis."""
+    return 'no-cache' in request.headers.get('Cache-Control', '')
 
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.3,
-                response_mime_type="application/json"
-            )
-        )
 
-        # Parse the response
-        try:
-            result = json.loads(response.text)
-        except json.JSONDecodeError:
-            # Try to extract JSON from response
-            result = {
-                "speakers_identified": ["Speaker 1", "Speaker 2"],
-                "messages": [],
-                "analysis_notes": response.text,
-                "confidence_overall": 0.5,
-                "raw_response": response.text
-            }
+def recovered_result(repaired: Optional[RepairedJson]) -> Optional[Any]:
+    """
+    The analysis object recovered from model output, or None if there is
+    none. Results recovered from cut-off output are marked 'partial'.
+    """
+    if repaired is None or not isinstance(repaired.value, dict):
+        return None
+    if repaired.partial:
+        if not repaired.value:
+            return None
+        repaired.value['partial'] = True
+    return repaired.value
 
-        return jsonify(create_accessible_response(
-            result,
-            f"Identified {len(result.get('speakers_identified', []))} speakers in the conversation"
-        ))
 
-    except Exception as e:
-        logger.error(f"Speaker identification error: {str(e)}")
-        return create_error_response(
-            "Analysis failed",
-            "Unable to process the conversation. Please try again.",
-            500
-        )
+def parse_model_json(text: str) -> Optional[Any]:
+    """Parse model output, recovering what it can when it is not valid JSON."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        result = recovered_result(repair_json(text))
+    if result is not None:
+        logger.info(f"Recovered {'a partial' if result.get('partial') else 'a'} result from invalid model JSON")
+    return result
 
 
-@app.route('/api/v1/analyze/conversation', methods=['POST'])
-@limiter.limit("20 per minute")
-#@validate_api_key
-def analyze_conversation():
+def cacheable_text(text: str) -> Optional[str]:
     """
-    Perform deep psychological analysis of a conversation.
-    Requires speakers to be identified first.
+    What to cache for model output: the text itself when it is valid JSON,
+    the repaired JSON when it could be recovered whole, otherwise None
+    (a retry may well get a complete answer).
     """
     try:
-        data = request.get_json()
-        required_fields = ['conversation', 'speakers']
+        json.loads(text)
+        return text
+    except json.JSONDecodeError:
+        repaired = repair_json(text)
+    if repaired is None or repaired.partial:
+        return None
+    return json.dumps(repaired.value)
 
-        for field in required_fields:
-            if field not in data:
-                return create_error_response(
-                    "Missing required field",
-                    f"The '{field}' field is required",
-                    400
-                )
 
-        conversation = sanitize_input(json.dumps(data['conversation']))
-        speakers = data['speakers']
+def generate_json(endpoint: str, prompt: str, bypass_cache: bool = False,
+                  model_name: Optional[str] = None) -> tuple:
+    """
+    Run a prompt through the endpoint's Gemini model, or model_name when
+    the request was routed to another one.
+    Returns (result, text): result is the parsed JSON, recovered where
+    possible from invalid output, or None if nothing could be recovered.
+    Only complete results are cached.
+    """
+    config = ANALYSIS_ENDPOINTS[endpoint]
+    model_name = model_name or config['model']
+    key = result_cache_key(model_name, config['generation_config'], prompt)
+
+    if not bypass_cache:
+        cached = result_cache.get(key, endpoint)
+        if cached is not None:
+            return json.loads(cached), cached
+
+    def call_model() -> str:
+        model = model_registry.get(model_name, config['generation_config'])
+        start = time.perf_counter()
+        try:
+            response = model.generate_content(prompt)
+        except Exception:
+            model_router.record(model_name, time.perf_counter() - start, False)
+            raise
+        model_router.record(model_name, time.perf_counter() - start, True)
+        # Raises ValueError for a blocked or empty response, which is not a model failure
+        text = response.text
+        cached_text = cacheable_text(text)
+        if cached_text is None:
+            return text
+        result_cache.set(key, cached_text, config['cache_ttl'], endpoint)
+        return cached_text
 
-        # Load behavior categories for reference
-        behavior_categories = get_behavior_categories()
+    lookup = None
+    if isinstance(result_cache, TieredResultCache):
+        lookup = lambda: result_cache.peek_shared(key, endpoint)
 
-        # Build the prompt (use replace to avoid conflict with JSON braces in template)
-        prompt = CONVERSATION_ANALYSIS_PROMPT.replace(
-            '{speakers}', json.dumps(speakers)
-        ).replace(
-            '{behavior_categories}', json.dumps(behavior_categories)
-        ).replace(
-            '{conversation}', conversation
-        )
+    text, _ = in_flight.do(key, call_model, lookup)
+    return parse_model_json(text), text
 
-        model = genai.GenerativeModel('gemini-1.5-pro')
 
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.4,
-                response_mime_type="application/json",
-                max_output_tokens=8192
-            )
-        )
+# Coalesces identical calls on the async server's event loop
+async_in_flight = AsyncSingleFlight()
 
-        try:
-            result = json.loads(response.text)
-        except json.JSONDecodeError:
-            result = {
-                "summary": "Analysis completed",
-                "raw_analysis": response.text,
-                "parse_error": True
-            }
 
-        return jsonify(create_accessible_response(
-            result,
-            "Conversation analysis complete"
-        ))
+async def generate_json_async(endpoint: str, prompt: str, bypass_cache: bool = False,
+                              model_name: Optional[str] = None) -> tuple:
+    """
+    Async counterpart of generate_json for the aiohttp server.
+    The model call does not hold a thread while waiting on Gemini.
+    """
+    config = ANALYSIS_ENDPOINTS[endpoint]
+    model_name = model_name or config['model']
+    key = result_cache_key(model_name, config['generation_config'], prompt)
+    # The shared cache tier does blocking I/O, so keep it off the event loop
+    shared_tier = isinstance(result_cache, TieredResultCache)
+
+    if not bypass_cache:
+        if shared_tier:
+            cached = await asyncio.to_thread(result_cache.get, key, endpoint)
+        else:
+            cached = result_cache.get(key, endpoint)
+        if cached is not None:
+            return json.loads(cached), cached
 
-    except Exception as e:
-        logger.error(f"Conversation analysis error: {str(e)}")
-        return create_error_response(
-            "Analysis failed",
-            "Unable to analyze the conversation. Please try again.",
-            500
-        )
+    async def call_model() -> str:
+        model = model_registry.get(model_name, config['generation_config'])
+        start = time.perf_counter()
+        try:
+            response = await model.generate_content_async(prompt)
+        except Exception:
+            model_router.record(model_name, time.perf_counter() - start, False)
+            raise
+        model_router.record(model_name, time.perf_counter() - start, True)
+        # Raises ValueError for a blocked or empty response, which is not a model failure
+        text = response.text
+        cached_text = cacheable_text(text)
+        if cached_text is None:
+            return text
+        if shared_tier:
+            await asyncio.to_thread(result_cache.set, key, cached_text, config['cache_ttl'], endpoint)
+        else:
+            result_cache.set(key, cached_text, config['cache_ttl'], endpoint)
+        return cached_text
 
+    text, _ = await async_in_flight.do(key, call_model)
+    return parse_model_json(text), text
 
-@app.route('/api/v1/analyze/response-impact', methods=['POST'])
-@limiter.limit("30 per minute")
-#@validate_api_key
-def analyze_response_impact():
+
+def stream_json(endpoint: str, prompt: str, bypass_cache: bool = False,
+                model_name: Optional[str] = None):
     """
-    Analyze how a drafted response might impact the conversation.
-    Provides alternatives and recommendations.
+    Streaming counterpart of generate_json: yields response text chunks as
+    Gemini produces them. A cached result is yielded as one chunk; the full
+    text is cached once the stream ends, if a complete result can be read from it.
     """
+    config = ANALYSIS_ENDPOINTS[endpoint]
+    model_name = model_name or config['model']
+    key = result_cache_key(model_name, config['generation_config'], prompt)
+
+    if not bypass_cache:
+        cached = result_cache.get(key, endpoint)
+        if cached is not None:
+            yield cached
+            return
+
+    model = model_registry.get(model_name, config['generation_config'])
+    start = time.perf_counter()
+    parts = []
     try:
-        data = request.get_json()
-        required_fields = ['conversation', 'user_speaker', 'draft_response']
-
-        for field in required_fields:
-            if field not in data:
-                return create_error_response(
-                    "Missing required field",
-                    f"The '{field}' field is required",
-                    400
-                )
+        for chunk in model.generate_content(prompt, stream=True):
+            text = chunk_text(chunk)
+            if text:
+                parts.append(text)
+                yield text
+    except Exception:
+        model_router.record(model_name, time.perf_counter() - start, False)
+        raise
+    model_router.record(model_name, time.perf_counter() - start, True)
+
+    text = cacheable_text(''.join(parts))
+    if text is not None:
+        result_cache.set(key, text, config['cache_ttl'], endpoint)
+
+
+async def stream_json_async(endpoint: str, prompt: str, bypass_cache: bool = False,
+                            model_name: Optional[str] = None):
+    """Async counterpart of stream_json for the aiohttp server."""
+    config = ANALYSIS_ENDPOINTS[endpoint]
+    model_name = model_name or config['model']
+    key = result_cache_key(model_name, config['generation_config'], prompt)
+    shared_tier = isinstance(result_cache, TieredResultCache)
+
+    if not bypass_cache:
+        if shared_tier:
+            cached = await asyncio.to_thread(result_cache.get, key, endpoint)
+        else:
+            cached = result_cache.get(key, endpoint)
+        if cached is not None:
+            yield cached
+            return
+
+    model = model_registry.get(model_name, config['generation_config'])
+    start = time.perf_counter()
+    parts = []
+    try:
+        async for chunk in await model.generate_content_async(prompt, stream=True):
+            text = chunk_text(chunk)
+            if text:
+                parts.append(text)
+                yield text
+    except Exception:
+        model_router.record(model_name, time.perf_counter() - start, False)
+        raise
+    model_router.record(model_name, time.perf_counter() - start, True)
+
+    text = cacheable_text(''.join(parts))
+    if text is None:
+        return
+    if shared_tier:
+        await asyncio.to_thread(result_cache.set, key, text, config['cache_ttl'], endpoint)
+    else:
+        result_cache.set(key, text, config['cache_ttl'], endpoint)
+
+
+def chunk_text(chunk) -> str:
+    """Text of a streamed chunk; chunks without text parts (e.g. the final one) give ''."""
+    try:
+        return chunk.text
+    except ValueError:
+        return ''
 
-        conversation = sanitize_input(json.dumps(data['conversation']))
-        user_speaker = sanitize_input(data['user_speaker'])
-        draft_response = sanitize_input(data['draft_response'])
 
-        prompt = RESPONSE_IMPACT_PROMPT.replace(
-            '{user_speaker}', user_speaker
-        ).replace(
-            '{draft_response}', draft_response
-        ).replace(
-            '{conversation}', conversation
-        )
+# =============================================================================
+# ANALYSIS REQUESTS
+# =============================================================================
+# Validation and prompt building shared by the Flask routes, the async
+# server (async_app.py) and other entry points that run analyses.
+
+class AnalysisInputError(ValueError):
+    """Raised when an analysis request body is missing or has invalid fields."""
+
+    def __init__(self, error: str, details: str):
+        super().__init__(details)
+        self.error = error
+        self.details = details
+
+
+class PreparedAnalysis:
+    """A validated analysis request, ready to send to Gemini."""
+
+    __slots__ = ('endpoint', 'prompt', 'fallback', 'message', 'tokens', 'windows', 'merge', 'record', 'model',
+                 'result')
+
+    def __init__(self, endpoint: str, prompt: Optional[str], fallback, message,
+                 tokens: Optional[Dict[str, Any]] = None,
+                 windows: Optional[List[str]] = None, merge=None, record=None,
+                 result: Optional[Dict[str, Any]] = None):
+        self.endpoint = endpoint
+        self.prompt = prompt
+        self.fallback = fallback
+        self.message = message
+        # Estimated prompt size, per slot
+        self.tokens = tokens
+        # Map-reduce: one prompt per window instead of prompt, and a function
+        # merging the per-window results (None for failed windows)
+        self.windows = windows
+        self.merge = merge
+        # Called with each successfully parsed result (e.g. to keep analysis state)
+        self.record = record
+        # Model chosen by routing (None: the endpoint's default)
+        self.model: Optional[str] = None
+        # Answer known without a model call; prompt and windows are unused
+        self.result = result
+
+    def finish(self, result: Optional[Any], response_text: str) -> tuple:
+        """Return (data, message), substituting the fallback for unparseable output."""
+        if result is None:
+            result = self.fallback(response_text)
+        elif self.record is not None and not (isinstance(result, dict) and result.get('partial')):
+            # A partial result is not a base to build later analyses on
+            self.record(result)
+        message = self.message(result) if callable(self.message) else self.message
+        return result, message
+
+
+# Top-level arrays streamed entry by entry rather than as one section
+STREAM_EXPANDED_SECTIONS = (
+    'speakers', 'messages', 'speaker_analyses', 'actionable_insights', 'alternative_responses'
+)
 
-        model = genai.GenerativeModel('gemini-1.5-pro')
+STREAM_MIMETYPES = {
+    'sse': 'text/event-stream',
+    'ndjson': 'application/x-ndjson'
+}
 
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.5,
-                response_mime_type="application/json",
-                max_output_tokens=4096
-            )
-        )
 
-        try:
-            result = json.loads(response.text)
-        except json.JSONDecodeError:
-            result = {
-                "impact_analysis": {"raw": response.text},
-                "parse_error": True
-            }
+def parse_stream_format(stream_param: Optional[str], accept: str = '') -> Optional[str]:
+    """
+    Streaming is opt-in: '?stream=sse', '?stream=ndjson' (or '?stream=1' for
+    SSE), or an Accept header of text/event-stream or application/x-ndjson.
+    Returns the format name, or None for a normal JSON response.
+    """
+    value = (stream_param or '').lower()
+    if value in STREAM_MIMETYPES:
+        return value
+    if value in ('1', 'true'):
+        return 'sse'
+    for name, mimetype in STREAM_MIMETYPES.items():
+        if mimetype in accept:
+            return name
+    return None
 
-        return jsonify(create_accessible_response(
-            result,
-            "Response impact analysis complete"
-        ))
 
-    except Exception as e:
-        logger.error(f"Response impact analysis error: {str(e)}")
-        return create_error_response(
-            "Analysis failed",
-            "Unable to analyze response impact. Please try again.",
-            500
-        )
+def format_stream_event(stream_format: str, event: str, data: Any) -> str:
+    """Encode one event as an SSE frame or an NDJSON line."""
+    if stream_format == 'sse':
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({'event': event, 'data': data}) + '\n'
 
 
-@app.route('/api/v1/analyze/profile', methods=['POST'])
-@limiter.limit("10 per minute")
-#@validate_api_key
-def analyze_profile():
+class AnalysisStream:
     """
-    Generate comprehensive profile analysis for a speaker.
-    Uses historical conversation data stored on device.
+    Turns streamed model text for a prepared analysis into events:
+    'start', then 'progress' per chunk, 'section' for each completed
+    top-level member and 'item' for each entry of an expanded array, and
+    finally 'complete' with the same body the non-streaming endpoint returns.
+    The complete result is parsed as the chunks arrive, tolerating broken
+    or cut-off JSON.
     """
-    try:
-        data = request.get_json()
-        if 'profile_data' not in data:
-            return create_error_response(
-                "Missing required field",
-                "The 'profile_data' field is required",
-                400
-            )
-
-        profile_data = sanitize_input(json.dumps(data['profile_data']))
 
-        prompt = PROFILE_ANALYSIS_PROMPT.replace('{profile_data}', profile_data)
+    def __init__(self, analysis: PreparedAnalysis):
+        self.analysis = analysis
+        self.parser = SectionStreamParser(expand=STREAM_EXPANDED_SECTIONS)
+        self.repair = JsonRepairParser()
 
-        model = genai.GenerativeModel('gemini-1.5-pro')
+    def start(self) -> tuple:
+        return 'start', {'endpoint': self.analysis.endpoint}
 
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.4,
-                response_mime_type="application/json",
-                max_output_tokens=8192
-            )
-        )
+    def feed(self, chunk: str) -> List[tuple]:
+        self.repair.feed(chunk)
+        events = []
+        for parsed in self.parser.feed(chunk):
+            payload = {key: value for key, value in parsed.items() if key != 'type'}
+            events.append((parsed['type'], payload))
+        events.append(('progress', {
+            'received_chars': len(self.parser.text),
+            'sections_completed': len(self.parser.completed)
+        }))
+        return events
 
-        try:
-            result = json.loads(response.text)
-        except json.JSONDecodeError:
-            result = {
-                "profile_summary": "Profile analysis completed",
-                "raw_analysis": response.text,
-                "parse_error": True
-            }
+    def finish(self) -> tuple:
+        result = recovered_result(self.repair.finish())
+        return 'complete', create_accessible_response(*self.analysis.finish(result, self.parser.text))
 
-        return jsonify(create_accessible_response(
-            result,
-            "Profile analysis complete"
-        ))
 
-    except Exception as e:
-        logger.error(f"Profile analysis error: {str(e)}")
-        return create_error_response(
-            "Analysis failed",
-            "Unable to generate profile analysis. Please try again.",
-            500
-        )
+# Estimated prompt sizes per endpoint, reported by /api/v1/stats
+prompt_stats = PromptStats()
 
 
-@app.route('/api/v1/analyze/self-profile', methods=['POST'])
-@limiter.limit("10 per minute")
-#@validate_api_key
-def analyze_self_profile():
+def fit_slot(endpoint: str, value: Any, serialize=json.dumps, template: Optional[str] = None,
+             **other_slots: str) -> tuple:
     """
-    Generate unbiased self-analysis profile for the user.
+    Fit a sanitized conversation-like value into what the endpoint's
+    token budget leaves after the template (the endpoint's own unless
+    named) and the other slots, dropping the oldest messages first, then
+    serialize it. Returns (slot text, Trimmed).
     """
-    try:
-        data = request.get_json()
-        if 'user_data' not in data:
-            return create_error_response(
-                "Missing required field",
-                "The 'user_data' field is required",
-                400
+    budget = PROMPT_TEMPLATES[template or endpoint].slot_budget(
+        ANALYSIS_ENDPOINTS[endpoint]['input_token_budget'], **other_slots
+    )
+    trimmed = fit_to_budget(value, budget)
+    if serialize is json.dumps and trimmed.text is not None:
+        return trimmed.text, trimmed
+    return serialize(trimmed.value), trimmed
+
+
+def build_prompt(endpoint: str, trimmed: Optional[Trimmed], **slots: str) -> tuple:
+    """Render the endpoint's prompt and record its estimated size. Returns (prompt, report)."""
+    prompt = PROMPT_TEMPLATES[endpoint].render(**slots)
+    prompt_stats.record(endpoint, prompt, trimmed)
+    report = prompt.report()
+    if trimmed is not None and trimmed.dropped:
+        report['trimmed'] = {'kept': trimmed.kept, 'total': trimmed.total, 'unit': trimmed.unit}
+    logger.info(f"{endpoint} prompt: ~{prompt.total_tokens} tokens {prompt.slot_tokens}")
+    return prompt.text, report
+
+
+def with_trim_note(message, trimmed: Trimmed):
+    """Tell the user when only the most recent part of their input was analyzed."""
+    if not trimmed.dropped:
+        return message
+    note = f" (analyzed the most recent {trimmed.kept} of {trimmed.total} {trimmed.unit})"
+    if callable(message):
+        return lambda result: message(result) + note
+    return message + note
+
+
+def require_fields(data: Any, fields: List[str]) -> Dict:
+    """Check the request body is an object containing every field."""
+    if not isinstance(data, dict):
+        raise AnalysisInputError("Missing required field", f"The '{fields[0]}' field is required")
+    for field in fields:
+        if field not in data:
+            raise AnalysisInputError("Missing required field", f"The '{field}' field is required")
+    return data
+
+
+def prepare_simple_analysis(data: Any) -> PreparedAnalysis:
+    if not isinstance(data, dict) or 'text' not in data:
+        raise AnalysisInputError("Missing required field", "Missing required field: text")
+
+    text, trimmed = fit_slot('simple', sanitize_payload(data['text']), serialize=str)
+    if not text:
+        raise AnalysisInputError("Invalid input", "Text cannot be empty")
+    prompt, tokens = build_prompt('simple', trimmed, text=text)
+
+    return PreparedAnalysis(
+        'simple',
+        prompt,
+        fallback=lambda response_text: {
+            'speakers': [{
+                'label': 'Speaker 1',
+                'likely_emotional_state': 'Unable to analyze',
+                'translation': 'The analysis could not be completed.',
+                'advice': 'Please try again with clearer conversation text.'
+            }]
+        },
+        message=with_trim_note("Analysis complete", trimmed),
+        tokens=tokens
+    )
+
+
+def prepare_speaker_identification(data: Any) -> PreparedAnalysis:
+    require_fields(data, ['text'])
+
+    text = sanitize_payload(data['text'])
+    if data.get('local_parse', True) is not False and isinstance(text, str):
+        parsed = parse_chat(text)
+        if parsed is not None and parsed.confidence >= CHAT_PARSER_MIN_CONFIDENCE:
+            # A recognised chat export names every sender; no model call needed
+            identification = parsed.as_identification()
+            return PreparedAnalysis(
+                'identify_speakers',
+                None,
+                fallback=None,
+                message=f"Identified {len(identification['speakers_identified'])} speakers in the conversation",
+                result=identification
             )
 
-        user_data = sanitize_input(json.dumps(data['user_data']))
+    text, trimmed = fit_slot('identify_speakers', text, serialize=str)
+    if not text:
+        raise AnalysisInputError("Invalid input", "Text cannot be empty after sanitization")
+    prompt, tokens = build_prompt('identify_speakers', trimmed, text=text)
+
+    return PreparedAnalysis(
+        'identify_speakers',
+        prompt,
+        fallback=lambda response_text: {
+            "speakers_identified": ["Speaker 1", "Speaker 2"],
+            "messages": [],
+            "analysis_notes": response_text,
+            "confidence_overall": 0.5,
+            "raw_response": response_text
+        },
+        message=with_trim_note(lambda result: (
+            f"Identified {len(result.get('speakers_identified', []))} speakers in the conversation"
+        ), trimmed),
+        tokens=tokens
+    )
 
-        prompt = SELF_PROFILE_PROMPT.replace('{user_data}', user_data)
 
-        model = genai.GenerativeModel('gemini-1.5-pro')
+def prepare_conversation_analysis(data: Any) -> PreparedAnalysis:
+    require_fields(data, ['conversation', 'speakers'])
 
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.4,
-                response_mime_type="application/json",
-                max_output_tokens=8192
-            )
-        )
+    speakers = json.dumps(sanitize_payload(data['speakers']))
+    library = behavior_library_store.current
 
-        try:
-            result = json.loads(response.text)
-        except json.JSONDecodeError:
-            result = {
-                "honest_summary": "Self-analysis completed",
-                "raw_analysis": response.text,
-                "parse_error": True
-            }
+    record = None
+    messages = sanitize_payload(data['conversation'])
+    if isinstance(messages, list) and messages and data.get('incremental', True) is not False:
+        chain = fingerprint_chain(messages, f"{CONVERSATION_STATE_SEED}\n{speakers}\n{library.etag}")
+        incremental = prepare_incremental_conversation(messages, chain, speakers, library)
+        if incremental is not None:
+            return incremental
+        record = lambda result: save_conversation_state(chain, result)
 
-        return jsonify(create_accessible_response(
-            result,
-            "Self-profile analysis complete"
-        ))
+    behaviors = behavior_slots(library, messages)
+    conversation, trimmed = fit_slot('conversation', messages, speakers=speakers, **behaviors)
+    if trimmed.dropped and isinstance(messages, list):
+        return prepare_long_conversation(messages, speakers, library, record)
 
-    except Exception as e:
-        logger.error(f"Self-profile analysis error: {str(e)}")
-        return create_error_response(
-            "Analysis failed",
-            "Unable to generate self-profile analysis. Please try again.",
-            500
-        )
+    prompt, tokens = build_prompt(
+        'conversation', trimmed, speakers=speakers, conversation=conversation, **behaviors
+    )
 
+    return PreparedAnalysis(
+        'conversation',
+        prompt,
+        fallback=conversation_fallback,
+        message=with_trim_note("Conversation analysis complete", trimmed),
+        tokens=tokens,
+        record=record
+    )
 
-@app.route('/api/v1/behaviors', methods=['GET'])
-@limiter.limit("60 per minute")
+
+def message_texts(conversation: Any) -> List[str]:
+    """The text of each message, for matching against the behavior library."""
+    if isinstance(conversation, str):
+        return conversation.splitlines()
+    if not isinstance(conversation, list):
+        return [json.dumps(conversation)]
+    texts = []
+    for message in conversation:
+        if isinstance(message, dict):
+            message = message.get('text', message.get('content'))
+        if isinstance(message, str):
+            texts.append(message)
+    return texts
+
+
+def behavior_slots(library: BehaviorLibrary, conversation: Any) -> Dict[str, str]:
+    """
+    The behavior library part of a conversation prompt: category names,
+    and the BEHAVIOR_CANDIDATES behaviors the local matcher scores highest
+    for these messages, so the model picks ids from a short, relevant list.
+    """
+    candidates = library.match_behaviors(message_texts(conversation), BEHAVIOR_CANDIDATES)
+    return {
+        'behavior_categories': json.dumps(library.category_names()),
+        'behavior_candidates': json.dumps([
+            {'behavior_id': entry.behavior['id'], 'name': entry.behavior['name']}
+            for entry, _ in candidates
+        ])
+    }
+
+
+def conversation_fallback(response_text: str) -> Dict[str, Any]:
+    return {
+        "summary": "Analysis completed",
+        "raw_analysis": response_text,
+        "parse_error": True
+    }
+
+
+def save_conversation_state(chain: List[str], result: Dict[str, Any]) -> None:
+    # State only saves future work; never fail the request over it
+    try:
+        conversation_states.save(chain, result)
+    except Exception as e:
+        logger.warning(f"Could not save conversation state: {str(e)}")
+
+
+def prepare_incremental_conversation(messages: List[Any], chain: List[str], speakers: str,
+                                     library: BehaviorLibrary) -> Optional[PreparedAnalysis]:
+    """
+    Plan an update of a stored analysis with only the messages appended
+    since it was made (plus a few earlier ones for context). A stored update
+    that already covers every message is returned as it is. Returns None
+    when there is no stored state for a shorter prefix of this conversation
+    (an unchanged conversation analyzed in full is left to the result
+    cache), or the new messages are too many to analyze incrementally.
+    """
+    try:
+        found = conversation_states.latest(chain)
+    except Exception as e:
+        logger.warning(f"Could not load conversation state: {str(e)}")
+        found = None
+    if found is None:
+        return None
+
+    base_count, prior = found
+    new_count = len(messages) - base_count
+    if not 0 <= new_count <= INCREMENTAL_MAX_NEW_MESSAGES or (not new_count and 'incremental' not in prior):
+        return None
+
+    details = {
+        'fingerprint': chain[-1],
+        'messages': len(messages),
+        'base_messages': base_count,
+        'new_messages': new_count
+    }
+    if not new_count:
+        # A retried update: its result came from the update prompt, so the
+        # result cache has nothing for the full conversation
+        return PreparedAnalysis(
+            'conversation',
+            None,
+            fallback=conversation_fallback,
+            message="Conversation analysis is up to date",
+            result=dict(prior, incremental=details)
+        )
+    context_start = max(base_count - LONG_CONVERSATION_OVERLAP, 0)
+    prior_text = json.dumps(compact_state(prior))
+    counts = {'context_count': str(base_count - context_start), 'new_count': str(new_count)}
+    behaviors = behavior_slots(library, messages[base_count:])
+    budget = PROMPT_TEMPLATES['conversation_update'].slot_budget(
+        ANALYSIS_ENDPOINTS['conversation']['input_token_budget'],
+        speakers=speakers, prior=prior_text, **behaviors, **counts
+    )
+    trimmed = fit_to_budget(messages[context_start:], budget)
+    if trimmed.dropped:
+        return None
+    prompt, tokens = build_prompt(
+        'conversation_update', None,
+        speakers=speakers,
+        conversation=trimmed.text,
+        prior=prior_text, **behaviors, **counts
+    )
+
+    def merge(results: List[Optional[Dict]]) -> Optional[Dict]:
+        if not isinstance(results[0], dict):
+            return None
+        merged = merge_window_analyses([prior, results[0]], [base_count, new_count], latest_summary=True)
+        merged['incremental'] = details
+        return merged
+
+    return PreparedAnalysis(
+        'conversation',
+        None,
+        fallback=conversation_fallback,
+        message=f"Conversation analysis updated with {new_count} new messages",
+        tokens=tokens,
+        windows=[prompt],
+        merge=merge,
+        record=lambda result: save_conversation_state(chain, result)
+    )
+
+
+def prepare_long_conversation(messages: List[Any], speakers: str,
+                              library: BehaviorLibrary, record=None) -> PreparedAnalysis:
+    """
+    Plan a map-reduce analysis for a conversation over the prompt budget:
+    overlapping windows of whole messages, analyzed in parallel and merged
+    into the usual schema. Beyond LONG_CONVERSATION_MAX_WINDOWS windows the
+    oldest messages are dropped. Each window gets the candidate behaviors
+    for its own messages.
+    """
+    template = PROMPT_TEMPLATES['conversation_window']
+    budget = template.slot_budget(
+        ANALYSIS_ENDPOINTS['conversation']['input_token_budget'],
+        speakers=speakers, **behavior_slots(library, messages),
+        window=f"{LONG_CONVERSATION_MAX_WINDOWS} of {LONG_CONVERSATION_MAX_WINDOWS} "
+               f"(messages {len(messages)}-{len(messages)} of {len(messages)})"
+    )
+    pieces = [json.dumps(message) for message in messages]
+    windows = split_windows(
+        [len(piece) for piece in pieces], budget * CHARS_PER_TOKEN, LONG_CONVERSATION_OVERLAP
+    )[-LONG_CONVERSATION_MAX_WINDOWS:]
+    first = windows[0][0]
+    trimmed = Trimmed(messages[first:], len(messages) - first, len(messages), 'messages')
+
+    prompts = []
+    reports = []
+    for number, (start, end) in enumerate(windows, 1):
+        prompt, report = build_prompt(
+            'conversation_window', None,
+            speakers=speakers,
+            conversation='[' + ', '.join(pieces[start:end]) + ']',
+            window=f"{number} of {len(windows)} (messages {start + 1}-{end} of {len(messages)})",
+            **behavior_slots(library, messages[start:end])
+        )
+        prompts.append(prompt)
+        reports.append(report)
+    weights = [end - start for start, end in windows]
+
+    def merge(results: List[Optional[Dict]]) -> Optional[Dict]:
+        merged = merge_window_analyses(results, weights)
+        if merged is not None:
+            merged['long_conversation'] = {
+                'windows': len(windows),
+                'windows_analyzed': sum(isinstance(result, dict) for result in results),
+                'messages_analyzed': trimmed.kept,
+                'overlap_messages': LONG_CONVERSATION_OVERLAP
+            }
+        return merged
+
+    return PreparedAnalysis(
+        'conversation',
+        None,
+        fallback=conversation_fallback,
+        message=with_trim_note(
+            f"Conversation analysis complete ({len(windows)} parts combined)", trimmed
+        ),
+        tokens={'windows': reports},
+        windows=prompts,
+        merge=merge,
+        record=record
+    )
+
+
+def prepare_response_impact(data: Any) -> PreparedAnalysis:
+    require_fields(data, ['conversation', 'user_speaker', 'draft_response'])
+
+    user_speaker = sanitize_input(data['user_speaker'])
+    draft_response = sanitize_input(data['draft_response'])
+
+    conversation, trimmed = fit_slot(
+        'response_impact', sanitize_payload(data['conversation']),
+        user_speaker=user_speaker, draft_response=draft_response
+    )
+    prompt, tokens = build_prompt(
+        'response_impact', trimmed,
+        user_speaker=user_speaker, draft_response=draft_response, conversation=conversation
+    )
+
+    return PreparedAnalysis(
+        'response_impact',
+        prompt,
+        fallback=lambda response_text: {
+            "impact_analysis": {"raw": response_text},
+            "parse_error": True
+        },
+        message=with_trim_note("Response impact analysis complete", trimmed),
+        tokens=tokens
+    )
+
+
+def profile_fallback(response_text: str) -> Dict:
+    return {
+        "profile_summary": "Profile analysis completed",
+        "raw_analysis": response_text,
+        "parse_error": True
+    }
+
+
+def prepare_profile_analysis(data: Any) -> PreparedAnalysis:
+    require_fields(data, ['profile_data'])
+
+    record = None
+    profile_data = sanitize_payload(data['profile_data'])
+    profile_hash = data.get('profile_hash')
+    conversations = profile_data.get('conversations') if isinstance(profile_data, dict) else None
+    if profile_hash is not None:
+        if not isinstance(profile_hash, str) or not profile_hash:
+            raise AnalysisInputError("Invalid field", "'profile_hash' must be a non-empty string")
+        profile_hash = profile_hash[:64]
+    if profile_hash and profile_states is not None and isinstance(conversations, list) and conversations:
+        chain = fingerprint_chain(conversations, PROFILE_STATE_SEED)
+        incremental = prepare_profile_update(profile_data, profile_hash, chain)
+        if incremental is not None:
+            return incremental
+        record = lambda result: save_profile_state(
+            profile_hash, ProfileState(result, len(chain), chain[-1])
+        )
+
+    profile_text, trimmed = fit_slot('profile', profile_data)
+    prompt, tokens = build_prompt('profile', trimmed, profile_data=profile_text)
+
+    return PreparedAnalysis(
+        'profile',
+        prompt,
+        fallback=profile_fallback,
+        message=with_trim_note("Profile analysis complete", trimmed),
+        tokens=tokens,
+        record=record
+    )
+
+
+def save_profile_state(profile_hash: str, state: ProfileState) -> None:
+    try:
+        profile_states.save(profile_hash, state)
+    except Exception as e:
+        logger.warning(f"Could not save profile state: {str(e)}")
+
+
+def prepare_profile_update(profile_data: Dict, profile_hash: str,
+                           chain: List[str]) -> Optional[PreparedAnalysis]:
+    """
+    Fold the conversations added since the stored profile was made into
+    it. Returns None when there is no stored profile for an earlier part
+    of this history (e.g. past conversations were edited or removed).
+    """
+    try:
+        state = profile_states.get(profile_hash)
+    except Exception as e:
+        logger.warning(f"Could not load profile state: {str(e)}")
+        state = None
+    if state is None or not 0 < state.conversations <= len(chain):
+        return None
+    if chain[state.conversations - 1] != state.fingerprint:
+        return None
+
+    new_conversations = profile_data['conversations'][state.conversations:]
+    details = {
+        'conversations': len(chain),
+        'base_conversations': state.conversations,
+        'new_conversations': len(new_conversations)
+    }
+    record = lambda result: save_profile_state(
+        profile_hash, ProfileState(result, len(chain), chain[-1])
+    )
+
+    if not new_conversations:
+        return PreparedAnalysis(
+            'profile',
+            None,
+            fallback=profile_fallback,
+            message="Profile is up to date",
+            record=record,
+            result=dict(state.analysis, incremental=details)
+        )
+
+    prior = json.dumps({key: value for key, value in state.analysis.items() if key != 'incremental'})
+    profile_text, trimmed = fit_slot(
+        'profile', {**profile_data, 'conversations': new_conversations},
+        template='profile_update', prior=prior
+    )
+    prompt, tokens = build_prompt('profile_update', trimmed, profile_data=profile_text, prior=prior)
+
+    return PreparedAnalysis(
+        'profile',
+        None,
+        fallback=profile_fallback,
+        message=with_trim_note(
+            f"Profile updated with {len(new_conversations)} new conversations", trimmed
+        ),
+        tokens=tokens,
+        windows=[prompt],
+        merge=lambda results: dict(results[0], incremental=details) if isinstance(results[0], dict) else None,
+        record=record
+    )
+
+
+def prepare_self_profile(data: Any) -> PreparedAnalysis:
+    require_fields(data, ['user_data'])
+
+    user_data, trimmed = fit_slot('self_profile', sanitize_payload(data['user_data']))
+    prompt, tokens = build_prompt('self_profile', trimmed, user_data=user_data)
+
+    return PreparedAnalysis(
+        'self_profile',
+        prompt,
+        fallback=lambda response_text: {
+            "honest_summary": "Self-analysis completed",
+            "raw_analysis": response_text,
+            "parse_error": True
+        },
+        message=with_trim_note("Self-profile analysis complete", trimmed),
+        tokens=tokens
+    )
+
+
+# Request preparers by endpoint name, for callers that dispatch dynamically
+ANALYSIS_PREPARERS = {
+    'simple': prepare_simple_analysis,
+    'identify_speakers': prepare_speaker_identification,
+    'conversation': prepare_conversation_analysis,
+    'response_impact': prepare_response_impact,
+    'profile': prepare_profile_analysis,
+    'self_profile': prepare_self_profile
+}
+
+
+def input_tokens(analysis: PreparedAnalysis) -> int:
+    """Estimated tokens of request input in the analysis' largest prompt."""
+    reports = (analysis.tokens or {}).get('windows') or [analysis.tokens or {}]
+    return max(
+        (report.get('estimated_tokens', 0) - report.get('static_tokens', 0) for report in reports),
+        default=0
+    )
+
+
+def route_analysis(analysis: PreparedAnalysis, data: Any) -> None:
+    """
+    Choose the model for a prepared analysis. Requests may set 'model_tier'
+    ('flash' or 'pro'), 'exclude_model_tiers' and 'depth' ('quick',
+    'standard' or 'deep'); otherwise input size and live model stats decide.
+    """
+    if analysis.result is not None:
+        return  # Answered without a model call
+    options = data if isinstance(data, dict) else {}
+    exclude = options.get('exclude_model_tiers') or []
+    if not isinstance(exclude, list):
+        raise AnalysisInputError("Invalid field", "'exclude_model_tiers' must be a list")
+    try:
+        decision = model_router.route(
+            analysis.endpoint, input_tokens(analysis),
+            tier=options.get('model_tier'), depth=options.get('depth'), exclude=exclude
+        )
+    except ValueError as e:
+        raise AnalysisInputError("Invalid field", str(e))
+    analysis.model = decision.model
+
+
+def prepare_analysis(kind: str, data: Any) -> PreparedAnalysis:
+    """Validate a request for the named endpoint, build its prompts and route it to a model."""
+    analysis = ANALYSIS_PREPARERS[kind](data)
+    route_analysis(analysis, data)
+    return analysis
+
+
+# Windows of long conversations; separate from the batch pool, whose items may
+# themselves be long conversations waiting on their windows
+window_executor = ThreadPoolExecutor(
+    max_workers=LONG_CONVERSATION_CONCURRENCY, thread_name_prefix='window'
+)
+
+
+def run_windows(analysis: PreparedAnalysis, bypass_cache: bool = False):
+    """Analyze a map-reduce plan's windows in parallel, yielding (index, result, text) as each finishes."""
+    futures = {
+        window_executor.submit(generate_json, analysis.endpoint, prompt, bypass_cache, analysis.model): index
+        for index, prompt in enumerate(analysis.windows)
+    }
+    errors = []
+    for future in as_completed(futures):
+        try:
+            result, response_text = future.result()
+        except Exception as e:
+            logger.error(f"Conversation window {futures[future] + 1} error: {str(e)}")
+            errors.append(e)
+            result, response_text = None, ''
+        yield futures[future], result, response_text
+    if errors and len(errors) == len(futures):
+        raise errors[-1]
+
+
+def merge_windows(analysis: PreparedAnalysis, outcomes: List[tuple]) -> tuple:
+    """Merge (index, result, text) window outcomes into (data, message)."""
+    results: List[Optional[Dict]] = [None] * len(analysis.windows)
+    texts = [''] * len(analysis.windows)
+    for index, result, response_text in outcomes:
+        results[index] = result
+        texts[index] = response_text
+    return analysis.finish(analysis.merge(results), texts[-1] if texts else '')
+
+
+def execute_analysis(analysis: PreparedAnalysis, bypass_cache: bool = False) -> tuple:
+    """Run a prepared analysis, single prompt or map-reduce. Returns (data, message)."""
+    if analysis.result is not None:
+        return analysis.finish(analysis.result, '')
+    if analysis.windows is None:
+        result, response_text = generate_json(analysis.endpoint, analysis.prompt, bypass_cache, analysis.model)
+        return analysis.finish(result, response_text)
+    return merge_windows(analysis, list(run_windows(analysis, bypass_cache)))
+
+
+async def execute_analysis_async(analysis: PreparedAnalysis, bypass_cache: bool = False) -> tuple:
+    """
+    Async counterpart of execute_analysis; windows run concurrently on the
+    event loop, at most LONG_CONVERSATION_CONCURRENCY at a time. Finishing
+    (merging, and recording state in SQLite or Redis) blocks, so it runs in
+    a thread.
+    """
+    if analysis.result is not None:
+        return await asyncio.to_thread(analysis.finish, analysis.result, '')
+    if analysis.windows is None:
+        result, response_text = await generate_json_async(
+            analysis.endpoint, analysis.prompt, bypass_cache, analysis.model
+        )
+        return await asyncio.to_thread(analysis.finish, result, response_text)
+
+    slots = asyncio.Semaphore(LONG_CONVERSATION_CONCURRENCY)
+
+    async def run_window(prompt: str) -> tuple:
+        async with slots:
+            return await generate_json_async(analysis.endpoint, prompt, bypass_cache, analysis.model)
+
+    outcomes = await asyncio.gather(
+        *(run_window(prompt) for prompt in analysis.windows),
+        return_exceptions=True
+    )
+    errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+    if errors and len(errors) == len(outcomes):
+        raise errors[-1]
+    for error in errors:
+        logger.error(f"Conversation window error: {str(error)}")
+    return await asyncio.to_thread(merge_windows, analysis, [
+        (index, None, '') if isinstance(outcome, BaseException) else (index, *outcome)
+        for index, outcome in enumerate(outcomes)
+    ])
+
+
+# Shared by all batch requests, so concurrent batches stay within one bound per worker
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_CONCURRENCY, thread_name_prefix='batch')
+
+
+def analyze_batch_item(index: int, item: Any, bypass_cache: bool) -> Dict[str, Any]:
+    """Analyze one conversation of a batch; failures become the item's error."""
+    outcome: Dict[str, Any] = {'index': index}
+    if isinstance(item, dict) and 'id' in item:
+        outcome['id'] = item['id']
+    try:
+        analysis = prepare_analysis('conversation', item)
+        data, message = execute_analysis(analysis, bypass_cache)
+        outcome.update({'success': True, 'message': message, 'data': data})
+
+    except AnalysisInputError as e:
+        outcome.update({'success': False, 'error': e.error, 'details': e.details})
+
+    except Exception as e:
+        logger.error(f"Batch item {index} error: {str(e)}")
+        outcome.update({
+            'success': False,
+            'error': "Analysis failed",
+            'details': "Unable to analyze the conversation. Please try again."
+        })
+    return outcome
+
+
+def run_batch(items: List[Any], concurrency: int, bypass_cache: bool):
+    """Yield item outcomes as they complete, with at most `concurrency` in flight."""
+    queue = iter(enumerate(items))
+    pending = set()
+
+    def submit_next() -> None:
+        entry = next(queue, None)
+        if entry is not None:
+            pending.add(batch_executor.submit(analyze_batch_item, entry[0], entry[1], bypass_cache))
+
+    for _ in range(concurrency):
+        submit_next()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            submit_next()
+            yield future.result()
+
+
+def run_analysis_job(kind: str, payload: Any) -> Dict[str, Any]:
+    """Job handler: run a queued analysis and return the endpoint's response body."""
+    analysis = prepare_analysis(kind, payload)
+    return create_accessible_response(*execute_analysis(analysis))
+
+
+# Long analyses can run as background jobs (?mode=async); the queue lives in
+# a local store shared by this instance's workers and survives restarts.
+# Queued payloads hold whole conversations, so jobs need ENCRYPTION_KEY.
+job_queue = None
+if cipher_suite is not None:
+    job_queue = JobQueue(
+        os.path.join(LOCAL_STORE_DIR, 'jobs.db'),
+        run_analysis_job,
+        cipher_suite,
+        result_ttl=JOB_RESULT_TTL
+    )
+    job_queue.start(JOB_WORKERS)
+else:
+    logger.warning("No valid ENCRYPTION_KEY; background analysis jobs (?mode=async) are disabled")
+
+
+def job_mode_requested() -> bool:
+    """Clients opt in with '?mode=async' or 'Prefer: respond-async'."""
+    return (
+        request.args.get('mode') == 'async'
+        or 'respond-async' in request.headers.get('Prefer', '')
+    )
+
+
+def job_status_body(job: Dict[str, Any]) -> Dict[str, Any]:
+    body = dict(job)
+    body['status_url'] = url_for('get_job', job_id=job['id'])
+    return body
+
+
+# =============================================================================
+# API ENDPOINTS
+# =============================================================================
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint for Cloud Run."""
+    return jsonify({
+        'status': 'healthy',
+        'service': 'text-decoder-api',
+        'version': '1.0.0-mvp',
+        'timestamp': datetime.utcnow().isoformat(),
+        'behavior_library': behavior_library_store.status()
+    })
+
+
+@app.route('/api/v1/stats', methods=['GET'])
+def get_stats():
+    """Operational counters for this worker (no user data)."""
+    return jsonify(create_accessible_response(
+        {
+            'result_cache': result_cache.stats(),
+            'single_flight': in_flight.stats(),
+            'jobs': job_queue.stats() if job_queue is not None else None,
+            'profile_states': profile_states.stats() if profile_states is not None else None,
+            'sync': sync_store.stats() if sync_store is not None else None,
+            'models': model_registry.stats(),
+            'routing': {**model_router.stats(), 'recent': model_router.decisions()},
+            'prompts': prompt_stats.stats()
+        },
+        "Service statistics"
+    ))
+
+
+@app.route('/analyze', methods=['POST'])
+@limiter.limit("30 per minute")
+def analyze_simple():
+    """
+    Simple analysis endpoint for Expo app backward compatibility.
+    Returns basic speaker analysis without requiring authentication.
+    """
+    try:
+        analysis = prepare_analysis('simple', request.get_json(silent=True))
+        data, _ = execute_analysis(analysis, cache_bypass_requested())
+        return jsonify(data), 200
+
+    except AnalysisInputError as e:
+        return jsonify({
+            'success': False,
+            'message': e.details
+        }), 400
+
+    except Exception as e:
+        logger.error(f"Analysis error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'Analysis failed: {str(e)}'
+        }), 500
+
+
+def run_analysis_view(kind: str, error_details: str, log_label: str, allow_jobs: bool = False):
+    """
+    Shared body of the structured analysis endpoints.
+    With allow_jobs, clients may queue the analysis as a background job.
+    """
+    try:
+        data = request.get_json(silent=True)
+        analysis = prepare_analysis(kind, data)
+        if allow_jobs and job_mode_requested():
+            if job_queue is None:
+                return create_error_response(
+                    "Background jobs unavailable",
+                    "Background analysis is not enabled on this server. Retry without mode=async.",
+                    503
+                )
+            job_id = job_queue.submit(analysis.endpoint, data)
+            response = jsonify(create_accessible_response(
+                job_status_body(job_queue.get(job_id)),
+                "Analysis queued. Check the status URL for the result."
+            ))
+            response.status_code = 202
+            response.headers['Location'] = url_for('get_job', job_id=job_id)
+            return response
+        stream_format = parse_stream_format(request.args.get('stream'), request.headers.get('Accept', ''))
+        if stream_format:
+            return stream_analysis_response(analysis, stream_format, error_details, log_label)
+        return jsonify(create_accessible_response(*execute_analysis(analysis, cache_bypass_requested())))
+
+    except AnalysisInputError as e:
+        return create_error_response(e.error, e.details, 400)
+
+    except Exception as e:
+        logger.error(f"{log_label} error: {str(e)}")
+        return create_error_response("Analysis failed", error_details, 500)
+
+
+def stream_analysis_response(analysis: PreparedAnalysis, stream_format: str,
+                             error_details: str, log_label: str) -> Response:
+    """Stream an analysis as SSE or NDJSON while Gemini generates it."""
+    bypass_cache = cache_bypass_requested()
+
+    def generate():
+        stream = AnalysisStream(analysis)
+        yield format_stream_event(stream_format, *stream.start())
+        try:
+            if analysis.result is not None:
+                yield format_stream_event(
+                    stream_format, 'complete', create_accessible_response(*execute_analysis(analysis))
+                )
+                return
+            if analysis.windows is not None:
+                # Parts finish whole; report each, then the combined result
+                outcomes = []
+                for outcome in run_windows(analysis, bypass_cache):
+                    outcomes.append(outcome)
+                    yield format_stream_event(stream_format, 'progress', {
+                        'windows_completed': len(outcomes),
+                        'windows': len(analysis.windows)
+                    })
+                yield format_stream_event(
+                    stream_format, 'complete',
+                    create_accessible_response(*merge_windows(analysis, outcomes))
+                )
+                return
+            for chunk in stream_json(analysis.endpoint, analysis.prompt, bypass_cache, analysis.model):
+                for event, data in stream.feed(chunk):
+                    yield format_stream_event(stream_format, event, data)
+            yield format_stream_event(stream_format, *stream.finish())
+        except Exception as e:
+            logger.error(f"{log_label} stream error: {str(e)}")
+            yield format_stream_event(
+                stream_format, 'error', create_error_body("Analysis failed", error_details)
+            )
+
+    return event_stream_response(generate(), stream_format)
+
+
+def event_stream_response(events, stream_format: str) -> Response:
+    """Wrap an iterator of encoded events in an unbuffered streaming response."""
+    return Response(
+        stream_with_context(events),
+        mimetype=STREAM_MIMETYPES[stream_format],
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop reverse proxies from buffering the stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@app.route('/api/v1/analyze/identify-speakers', methods=['POST'])
+@limiter.limit("30 per minute")
+#@validate_api_key
+def identify_speakers():
+    """
+    Identify speakers in a conversation text.
+    Users can then verify and correct the identification.
+    """
+    return run_analysis_view(
+        'identify_speakers',
+        "Unable to process the conversation. Please try again.",
+        "Speaker identification"
+    )
+
+
+@app.route('/api/v1/analyze/conversation', methods=['POST'])
+@limiter.limit("20 per minute")
+#@validate_api_key
+def analyze_conversation():
+    """
+    Perform deep psychological analysis of a conversation.
+    Requires speakers to be identified first.
+    """
+    return run_analysis_view(
+        'conversation',
+        "Unable to analyze the conversation. Please try again.",
+        "Conversation analysis"
+    )
+
+
+@app.route('/api/v1/analyze/response-impact', methods=['POST'])
+@limiter.limit("30 per minute")
+#@validate_api_key
+def analyze_response_impact():
+    """
+    Analyze how a drafted response might impact the conversation.
+    Provides alternatives and recommendations.
+    """
+    return run_analysis_view(
+        'response_impact',
+        "Unable to analyze response impact. Please try again.",
+        "Response impact analysis"
+    )
+
+
+@app.route('/api/v1/analyze/profile', methods=['POST'])
+@limiter.limit("10 per minute")
+#@validate_api_key
+def analyze_profile():
+    """
+    Generate comprehensive profile analysis for a speaker.
+    Uses historical conversation data stored on device.
+    """
+    return run_analysis_view(
+        'profile',
+        "Unable to generate profile analysis. Please try again.",
+        "Profile analysis",
+        allow_jobs=True
+    )
+
+
+@app.route('/api/v1/analyze/self-profile', methods=['POST'])
+@limiter.limit("10 per minute")
+#@validate_api_key
+def analyze_self_profile():
+    """
+    Generate unbiased self-analysis profile for the user.
+    """
+    return run_analysis_view(
+        'self_profile',
+        "Unable to generate self-profile analysis. Please try again.",
+        "Self-profile analysis",
+        allow_jobs=True
+    )
+
+
+@app.route('/api/v1/analyze/batch', methods=['POST'])
+@limiter.limit("10 per minute")
+#@validate_api_key
+def analyze_batch():
+    """
+    Analyze many conversations in one request (e.g. an import).
+    Items run concurrently, bounded by 'concurrency'; each item gets its own
+    result or error. With streaming requested, results are sent as they
+    complete; otherwise they are returned together in input order.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return create_error_response(
+            "Missing required field",
+            "The 'items' field must be a non-empty list of conversations",
+            400
+        )
+    if len(items) > BATCH_MAX_ITEMS:
+        return create_error_response(
+            "Batch too large",
+            f"A batch can contain at most {BATCH_MAX_ITEMS} conversations",
+            400
+        )
+
+    concurrency = data.get('concurrency', BATCH_MAX_CONCURRENCY)
+    if not isinstance(concurrency, int) or isinstance(concurrency, bool) or concurrency < 1:
+        return create_error_response("Invalid input", "'concurrency' must be a positive integer", 400)
+    concurrency = min(concurrency, BATCH_MAX_CONCURRENCY)
+
+    bypass_cache = cache_bypass_requested()
+    stream_format = parse_stream_format(request.args.get('stream'), request.headers.get('Accept', ''))
+    if stream_format:
+        def generate():
+            succeeded = 0
+            for outcome in run_batch(items, concurrency, bypass_cache):
+                succeeded += outcome['success']
+                yield format_stream_event(stream_format, 'result', outcome)
+            yield format_stream_event(stream_format, 'complete', {
+                'total': len(items),
+                'succeeded': succeeded,
+                'failed': len(items) - succeeded
+            })
+        return event_stream_response(generate(), stream_format)
+
+    results = sorted(run_batch(items, concurrency, bypass_cache), key=lambda outcome: outcome['index'])
+    succeeded = sum(outcome['success'] for outcome in results)
+    return jsonify(create_accessible_response(
+        {
+            'results': results,
+            'total': len(items),
+            'succeeded': succeeded,
+            'failed': len(items) - succeeded
+        },
+        f"Analyzed {succeeded} of {len(items)} conversations"
+    ))
+
+
+@app.route('/api/v1/jobs/<job_id>', methods=['GET'])
+@limiter.limit("120 per minute")
+def get_job(job_id: str):
+    """
+    Status of a background analysis job. Once finished, 'result' holds the
+    same body the endpoint returns synchronously. '?wait=N' long-polls for
+    up to N seconds (max 30) until the job finishes.
+    """
+    try:
+        wait_seconds = min(max(float(request.args.get('wait', 0)), 0), JOB_MAX_WAIT)
+    except ValueError:
+        return create_error_response("Invalid input", "'wait' must be a number of seconds", 400)
+
+    if job_queue is None:
+        job = None
+    else:
+        job = job_queue.wait(job_id, wait_seconds) if wait_seconds else job_queue.get(job_id)
+    if job is None:
+        return create_error_response(
+            "Job not found",
+            "The job does not exist or its result has expired",
+            404
+        )
+    return jsonify(create_accessible_response(job_status_body(job), f"Job {job['status']}"))
+
+
+@app.route('/api/v1/behaviors', methods=['GET'])
+@limiter.limit("60 per minute")
 def get_behaviors():
     """
     Get the complete behavior/trait library.
     Available offline after initial fetch.
+    Served from the pre-encoded snapshot; conditional GETs get a 304. The
+    ETag is weak because every body carries its own timestamp.
+
+    Any of ?category=, ?subcategory=, ?fields=, ?limit= or ?cursor= switches
+    to a paginated list of behaviors instead of the whole library.
     """
     try:
-        # Load from file
-        behaviors_path = os.path.join(
-            os.path.dirname(__file__),
-            'data',
-            'behavior_library.json'
-        )
+        library = behavior_library_store.current
 
-        if os.path.exists(behaviors_path):
-            with open(behaviors_path, 'r') as f:
-                behaviors = json.load(f)
-        else:
-            behaviors = get_default_behavior_library()
+        if any(param in request.args for param in BEHAVIOR_LIST_PARAMS):
+            return list_behaviors(library)
 
-        return jsonify(create_accessible_response(
-            behaviors,
-            f"Loaded {count_behaviors(behaviors)} behaviors and traits"
-        ))
+        response = app.response_class(library.body, mimetype='application/json')
+        response.set_etag(library.etag, weak=True)
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
 
     except Exception as e:
         logger.error(f"Behavior library error: {str(e)}")
@@ -873,13 +2144,175 @@ def get_behaviors():
         )
 
 
+@app.route('/api/v1/behaviors/manifest', methods=['GET'])
+@limiter.limit("60 per minute")
+def get_behavior_manifest():
+    """
+    List per-category shard hashes and URLs.
+    Clients compare hashes and download only the shards that changed.
+    """
+    library = behavior_library_store.current
+    manifest = library.manifest()
+    for entry in manifest['shards']:
+        entry['url'] = url_for(
+            'get_behavior_shard',
+            category_id=entry['id'],
+            shard_hash=entry['hash']
+        )
+
+    response = jsonify(create_accessible_response(
+        manifest,
+        f"Behavior library has {len(manifest['shards'])} category shards"
+    ))
+    response.set_etag(library.etag, weak=True)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route('/api/v1/behaviors/shards/<category_id>/<shard_hash>', methods=['GET'])
+@limiter.exempt
+def get_behavior_shard(category_id: str, shard_hash: str):
+    """
+    Serve one precompressed, content-addressed category shard.
+    Shards never change at a given URL, so they are cached as immutable.
+    """
+    shard = behavior_library_store.current.shards.get(category_id)
+    if shard is None or shard.hash != shard_hash:
+        return create_error_response(
+            "Shard not found",
+            "The requested shard does not exist. Refresh the manifest.",
+            404
+        )
+
+    encoding = shard.select_encoding(request.accept_encodings.quality)
+    response = app.response_class(shard.encodings[encoding], mimetype='application/json')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(shard.hash)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+
 @app.route('/api/v1/behaviors/categories', methods=['GET'])
 def get_behavior_categories():
-    """Get just the category names for reference."""
-    behaviors = get_default_behavior_library()
-    categories = [cat['category'] for cat in behaviors.get('categories', [])]
-    return categories if request.method != 'GET' else jsonify(
-        create_accessible_response({'categories': categories}, "Categories loaded")
+    """Get just the category names for reference. Served pre-encoded."""
+    library = behavior_library_store.current
+    response = app.response_class(library.categories_body, mimetype='application/json')
+    response.set_etag(library.etag, weak=True)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route('/api/v1/behaviors/search', methods=['GET'])
+@limiter.limit("120 per minute")
+def search_behaviors():
+    """
+    Full-text search over behavior names, definitions, examples and indicators.
+    Results are BM25-ranked. Supports ?category=, ?fields= and ?limit=.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return create_error_response(
+            "Missing required parameter",
+            "The 'q' query parameter is required",
+            400
+        )
+
+    library = behavior_library_store.current
+    category_id = request.args.get('category')
+    if category_id is not None and not library.has_category(category_id):
+        return create_error_response(
+            "Category not found",
+            f"No category with id '{category_id}' exists in the library.",
+            404
+        )
+
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), BEHAVIOR_PAGE_SIZE_MAX)
+    except ValueError:
+        return create_error_response("Invalid limit", "'limit' must be a whole number", 400)
+
+    fields = parse_fields(request.args.get('fields'))
+    results = []
+    for entry, score in library.search(query[:200], limit, category_id):
+        behavior = entry.to_dict(fields)
+        behavior['score'] = score
+        results.append(behavior)
+
+    return jsonify(create_accessible_response(
+        {'query': query, 'results': results},
+        f"Found {len(results)} matching behaviors"
+    ))
+
+
+@app.route('/api/v1/behaviors/suggest', methods=['GET'])
+@limiter.limit("300 per minute")
+def suggest_behaviors():
+    """Type-ahead suggestions of behavior names for a prefix (?q=)."""
+    prefix = request.args.get('q', '').strip()
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 10)
+    except ValueError:
+        return create_error_response("Invalid limit", "'limit' must be a whole number", 400)
+
+    suggestions = behavior_library_store.current.suggest(prefix[:100], limit) if prefix else []
+    return jsonify(create_accessible_response(
+        {'query': prefix, 'suggestions': suggestions},
+        f"{len(suggestions)} suggestions"
+    ))
+
+
+@app.route('/api/v1/behaviors/<behavior_id>', methods=['GET'])
+@limiter.limit("120 per minute")
+def get_behavior(behavior_id: str):
+    """
+    Get a single behavior by id.
+    Supports ?fields= projection and conditional GETs. Whole behaviors are
+    served pre-encoded.
+    """
+    library = behavior_library_store.current
+    entry = library.get_behavior(behavior_id)
+    if entry is None:
+        return create_error_response(
+            "Behavior not found",
+            f"No behavior with id '{behavior_id}' exists in the library.",
+            404
+        )
+
+    fields = parse_fields(request.args.get('fields'))
+    if fields:
+        response = jsonify(create_accessible_response(
+            entry.to_dict(fields),
+            f"Loaded behavior: {entry.behavior['name']}"
+        ))
+    else:
+        response = app.response_class(library.behavior_body(behavior_id), mimetype='application/json')
+    response.set_etag(entry.etag, weak=True)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def sync_version_data(version: SyncVersion) -> Dict[str, Any]:
+    """Response fields describing a stored sync version."""
+    return {
+        'sync_id': version.content_hash[:32],
+        'version': version.version,
+        'size': version.size,
+        'last_sync': datetime.utcfromtimestamp(version.created_at).isoformat()
+    }
+
+
+def sync_unavailable_response():
+    return create_error_response(
+        "Sync unavailable",
+        "Cross-device sync is not enabled on this server.",
+        503
     )
 
 
@@ -890,7 +2323,7 @@ def sync_upload():
     """
     Upload encrypted, anonymized data for cross-device sync.
     Data is encrypted client-side before transmission.
-    Server stores only encrypted blobs.
+    Server stores only encrypted blobs, keeping the last few versions.
     """
     try:
         data = request.get_json()
@@ -901,21 +2334,36 @@ def sync_upload():
                 "Both 'encrypted_data' and 'user_hash' are required",
                 400
             )
+        if not isinstance(data['encrypted_data'], str) or not isinstance(data['user_hash'], str):
+            return create_error_response(
+                "Invalid fields",
+                "The 'encrypted_data' and 'user_hash' fields must be strings",
+                400
+            )
+
+        if sync_store is None:
+            return sync_unavailable_response()
+
+        blob = data['encrypted_data'].encode('utf-8')
+        if len(blob) > SYNC_MAX_BLOB_BYTES:
+            return create_error_response(
+                "Sync data too large",
+                f"Encrypted data must be at most {SYNC_MAX_BLOB_BYTES} bytes",
+                413
+            )
 
-        # In production, store to Cloud Storage or database
-        # For MVP, we acknowledge receipt
         user_hash = data['user_hash'][:64]  # Truncate for safety
+        version, created = sync_store.put(user_hash, blob)
 
         # Log sync (no actual data logged)
-        logger.info(f"Sync upload received for user hash: {user_hash[:8]}...")
+        logger.info(f"Sync upload for user hash {user_hash[:8]}...: version {version.version}"
+                    f"{'' if created else ' (unchanged)'}")
 
         return jsonify(create_accessible_response(
             {
-                'sync_id': hashlib.sha256(
-                    f"{user_hash}{datetime.utcnow().isoformat()}".encode()
-                ).hexdigest()[:32],
+                **sync_version_data(version),
                 'timestamp': datetime.utcnow().isoformat(),
-                'status': 'stored'
+                'status': 'stored' if created else 'unchanged'
             },
             "Data synced successfully"
         ))
@@ -934,7 +2382,9 @@ def sync_upload():
 #@validate_api_key
 def sync_download():
     """
-    Download encrypted sync data for a user.
+    Download encrypted sync data for a user: the latest version, or the
+    one given by 'version'. A client that sends the 'sync_id' it already
+    has gets status 'unchanged' without the data.
     """
     try:
         data = request.get_json()
@@ -945,16 +2395,42 @@ def sync_download():
                 "The 'user_hash' field is required",
                 400
             )
+        requested = data.get('version')
+        if not isinstance(data['user_hash'], str) or (
+                requested is not None and (not isinstance(requested, int) or isinstance(requested, bool))):
+            return create_error_response(
+                "Invalid fields",
+                "The 'user_hash' field must be a string and 'version' an integer",
+                400
+            )
+
+        if sync_store is None:
+            return sync_unavailable_response()
 
-        # In production, retrieve from Cloud Storage
-        # For MVP, return empty
+        user_hash = data['user_hash'][:64]
+        if requested is None and data.get('sync_id'):
+            latest = sync_store.latest(user_hash)
+            if latest is not None and latest.content_hash[:32] == data['sync_id']:
+                return jsonify(create_accessible_response(
+                    {**sync_version_data(latest), 'encrypted_data': None, 'status': 'unchanged'},
+                    "Sync data is up to date"
+                ))
+
+        stored = sync_store.get(user_hash, requested)
+        if stored is None:
+            return jsonify(create_accessible_response(
+                {
+                    'encrypted_data': None,
+                    'last_sync': None,
+                    'status': 'no_data'
+                },
+                "No sync data found"
+            ))
+
+        version, blob = stored
         return jsonify(create_accessible_response(
-            {
-                'encrypted_data': None,
-                'last_sync': None,
-                'status': 'no_data'
-            },
-            "No sync data found"
+            {**sync_version_data(version), 'encrypted_data': blob.decode('utf-8'), 'status': 'found'},
+            "Sync data retrieved"
         ))
 
     except Exception as e:
@@ -971,8 +2447,17 @@ def sync_download():
 #@validate_api_key
 def delete_user_data():
     """
-    Delete all server-side data for a user.
+    Delete the server-side data stored for a user.
     Compliant with Australian Privacy Act data deletion requirements.
+
+    Background jobs are not tied to a user hash: the client lists the ids of
+    its jobs in 'job_ids'. Any other job keeps its request only until it
+    finishes and its result for JOB_RESULT_TTL seconds after that.
+
+    Cached analyses are keyed by prompt content and conversation states by
+    message fingerprints, not by user, so neither can be deleted here. They
+    expire after their endpoint's cache_ttl and INCREMENTAL_STATE_TTL, which
+    the response reports as 'expires_within' (seconds).
     """
     try:
         data = request.get_json()
@@ -986,19 +2471,55 @@ def delete_user_data():
 
         user_hash = data['user_hash'][:64]
 
-        # In production, delete from all storage
+        profile_hashes = data.get('profile_hashes') or []
+        if not isinstance(profile_hashes, list):
+            return create_error_response(
+                "Invalid field",
+                "The 'profile_hashes' field must be a list",
+                400
+            )
+        deleted_states = 0
+        for profile_hash in profile_hashes:
+            if isinstance(profile_hash, str) and profile_states is not None:
+                deleted_states += profile_states.delete(profile_hash[:64])
+
+        job_ids = data.get('job_ids') or []
+        if not isinstance(job_ids, list):
+            return create_error_response(
+                "Invalid field",
+                "The 'job_ids' field must be a list",
+                400
+            )
+        deleted_jobs = 0
+        for job_id in job_ids:
+            if isinstance(job_id, str) and job_queue is not None:
+                deleted_jobs += job_queue.delete(job_id)
+
+        sync_versions = sync_store.delete_user(user_hash) if sync_store is not None else 0
+        expires_within = {
+            'cached_analyses': max(config['cache_ttl'] for config in ANALYSIS_ENDPOINTS.values()),
+            'conversation_states': INCREMENTAL_STATE_TTL
+        }
+
         # Log deletion for compliance
-        logger.info(f"User data deletion requested for hash: {user_hash[:8]}...")
+        logger.info(f"User data deletion requested for hash: {user_hash[:8]}..."
+                    f" ({sync_versions} sync versions)")
 
         return jsonify(create_accessible_response(
             {
                 'deleted': True,
+                'sync_versions': sync_versions,
+                'profile_states': deleted_states,
+                'jobs': deleted_jobs,
+                'expires_within': expires_within,
                 'timestamp': datetime.utcnow().isoformat(),
                 'confirmation_code': hashlib.sha256(
                     f"deleted_{user_hash}_{datetime.utcnow().isoformat()}".encode()
                 ).hexdigest()[:16]
             },
-            "All your data has been permanently deleted from our servers"
+            "Your stored data has been permanently deleted from our servers. Cached analyses "
+            "and conversation states are not linked to your account and expire within "
+            f"{max(expires_within.values()) // 3600} hours"
         ))
 
     except Exception as e:
@@ -1014,13 +2535,65 @@ def delete_user_data():
 # HELPER FUNCTIONS
 # =============================================================================
 
-def count_behaviors(library: Dict) -> int:
-    """Count total behaviors in library."""
-    count = 0
-    for category in library.get('categories', []):
-        for subcategory in category.get('subcategories', []):
-            count += len(subcategory.get('behaviors', []))
-    return count
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated ?fields= projection."""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
+
+def list_behaviors(library) -> tuple:
+    """Paginated, filtered and projected behavior listing for get_behaviors."""
+    category_id = request.args.get('category')
+    subcategory_id = request.args.get('subcategory')
+    fields = parse_fields(request.args.get('fields'))
+
+    try:
+        limit = int(request.args.get('limit', BEHAVIOR_PAGE_SIZE))
+    except ValueError:
+        return create_error_response("Invalid limit", "'limit' must be a whole number", 400)
+    if not 1 <= limit <= BEHAVIOR_PAGE_SIZE_MAX:
+        return create_error_response(
+            "Invalid limit",
+            f"'limit' must be between 1 and {BEHAVIOR_PAGE_SIZE_MAX}",
+            400
+        )
+
+    if category_id is not None and not library.has_category(category_id):
+        return create_error_response(
+            "Category not found",
+            f"No category with id '{category_id}' exists in the library.",
+            404
+        )
+    if subcategory_id is not None and not library.has_subcategory(subcategory_id):
+        return create_error_response(
+            "Subcategory not found",
+            f"No subcategory with id '{subcategory_id}' exists in the library.",
+            404
+        )
+
+    try:
+        entries, next_cursor = library.list_behaviors(
+            category_id=category_id,
+            subcategory_id=subcategory_id,
+            cursor=request.args.get('cursor'),
+            limit=limit
+        )
+    except ValueError:
+        return create_error_response(
+            "Invalid cursor",
+            "The pagination cursor is not valid. Start again without a cursor.",
+            400
+        )
+
+    return jsonify(create_accessible_response(
+        {
+            'behaviors': [entry.to_dict(fields) for entry in entries],
+            'next_cursor': next_cursor,
+            'library_version': library.version
+        },
+        f"Loaded {len(entries)} behaviors"
+    ))
 
 
 def get_default_behavior_library() -> Dict:
@@ -1034,6 +2607,22 @@ def get_default_behavior_library() -> Dict:
     }
 
 
+# Behavior library listing parameters
+BEHAVIOR_LIST_PARAMS = ('category', 'subcategory', 'fields', 'limit', 'cursor')
+BEHAVIOR_PAGE_SIZE = 50
+BEHAVIOR_PAGE_SIZE_MAX = 200
+
+# Behavior library snapshot, loaded and validated once per worker and
+# hot-reloaded in the background when the file changes
+BEHAVIOR_LIBRARY_PATH = os.path.join(os.path.dirname(__file__), 'data', 'behavior_library.json')
+behavior_library_store = BehaviorLibraryStore(
+    BEHAVIOR_LIBRARY_PATH,
+    default=get_default_behavior_library,
+    envelope=create_accessible_response
+)
+behavior_library_store.start_watcher(BEHAVIOR_LIBRARY_RELOAD_INTERVAL)
+
+
 # =============================================================================
 # ERROR HANDLERS
 # =============================================================================
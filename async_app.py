@@ -0,0 +1,296 @@
+"""
+Text Decoder MVP - Async analysis server
+
+Serves the Gemini-bound analyze endpoints on aiohttp so a worker waits on
+hundreds of concurrent upstream calls without holding a thread for each.
+Routes, request validation, prompts, caching and response bodies are the
+same as the Flask app (app.py), which keeps serving everything else.
+
+Run alongside (or instead of) the Flask service for /analyze,
+/api/v1/analyze/* and /api/v1/jobs/*:
+    gunicorn async_app:create_app --bind :$PORT \
+        --worker-class aiohttp.GunicornWebWorker --workers 2 --timeout 120
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+from aiohttp import web
+from limits import parse as parse_rate_limit
+from limits.storage import MemoryStorage
+from limits.strategies import MovingWindowRateLimiter
+
+import app as api
+
+logger = logging.getLogger(__name__)
+
+ASYNC_MAX_CONCURRENT_ANALYSES = int(os.environ.get('ASYNC_MAX_CONCURRENT_ANALYSES', '500'))
+
+# path -> (endpoint, rate limit, error details, log label); mirrors app.py
+ANALYZE_ROUTES = {
+    '/api/v1/analyze/identify-speakers': (
+        'identify_speakers', "30 per minute",
+        "Unable to process the conversation. Please try again.",
+        "Speaker identification"
+    ),
+    '/api/v1/analyze/conversation': (
+        'conversation', "20 per minute",
+        "Unable to analyze the conversation. Please try again.",
+        "Conversation analysis"
+    ),
+    '/api/v1/analyze/response-impact': (
+        'response_impact', "30 per minute",
+        "Unable to analyze response impact. Please try again.",
+        "Response impact analysis"
+    ),
+    '/api/v1/analyze/profile': (
+        'profile', "10 per minute",
+        "Unable to generate profile analysis. Please try again.",
+        "Profile analysis"
+    ),
+    '/api/v1/analyze/self-profile': (
+        'self_profile', "10 per minute",
+        "Unable to generate self-profile analysis. Please try again.",
+        "Self-profile analysis"
+    ),
+}
+
+SIMPLE_ANALYSIS_LIMIT = "30 per minute"
+JOB_STATUS_LIMIT = "120 per minute"
+
+# Endpoints that may run as background jobs (?mode=async), as on the Flask routes
+JOB_ENDPOINTS = ('profile', 'self_profile')
+
+# Same limits as Flask-Limiter applies on the Flask routes, per client address
+_rate_limiter = MovingWindowRateLimiter(MemoryStorage())
+
+ANALYSIS_SEMAPHORE = web.AppKey('analysis_semaphore', asyncio.Semaphore)
+WARM_UP_TASK = web.AppKey('warm_up_task', asyncio.Task)
+
+
+def error_response(error: str, details: str, status: int) -> web.Response:
+    return web.json_response(api.create_error_body(error, details), status=status)
+
+
+def client_address(request: web.Request) -> str:
+    return request.remote or 'unknown'
+
+
+def rate_limited(request: web.Request, limit: str, scope: str) -> bool:
+    """Return True if this client has exceeded limit for scope."""
+    return not _rate_limiter.hit(parse_rate_limit(limit), scope, client_address(request))
+
+
+async def read_json(request: web.Request) -> Optional[Dict]:
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+def cache_bypass_requested(request: web.Request) -> bool:
+    return 'no-cache' in request.headers.get('Cache-Control', '')
+
+
+def job_mode_requested(request: web.Request) -> bool:
+    """Clients opt in with '?mode=async' or 'Prefer: respond-async'."""
+    return (
+        request.query.get('mode') == 'async'
+        or 'respond-async' in request.headers.get('Prefer', '')
+    )
+
+
+def job_status_body(request: web.Request, job: Dict) -> Dict:
+    body = dict(job)
+    body['status_url'] = str(request.app.router['get_job'].url_for(job_id=job['id']))
+    return body
+
+
+async def queue_job(request: web.Request, endpoint: str, data) -> web.Response:
+    """Queue a validated analysis as a background job; 202 with its status URL."""
+    if api.job_queue is None:
+        return error_response(
+            "Background jobs unavailable",
+            "Background analysis is not enabled on this server. Retry without mode=async.",
+            503
+        )
+    job = await asyncio.to_thread(lambda: api.job_queue.get(api.job_queue.submit(endpoint, data)))
+    body = job_status_body(request, job)
+    return web.json_response(
+        api.create_accessible_response(body, "Analysis queued. Check the status URL for the result."),
+        status=202,
+        headers={'Location': body['status_url']}
+    )
+
+
+async def run_prepared(request: web.Request, analysis) -> tuple:
+    """Run a prepared analysis under the worker's concurrency bound."""
+    async with request.app[ANALYSIS_SEMAPHORE]:
+        return await api.execute_analysis_async(analysis, cache_bypass_requested(request))
+
+
+async def stream_prepared(request: web.Request, analysis, stream_format: str,
+                          error_details: str, log_label: str) -> web.StreamResponse:
+    """Stream an analysis as SSE or NDJSON while Gemini generates it."""
+    response = web.StreamResponse(headers={
+        'Content-Type': api.STREAM_MIMETYPES[stream_format],
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    await response.prepare(request)
+
+    async def send(event: str, data) -> None:
+        await response.write(api.format_stream_event(stream_format, event, data).encode())
+
+    stream = api.AnalysisStream(analysis)
+    await send(*stream.start())
+    try:
+        if analysis.result is not None or analysis.windows is not None:
+            # Known answers and parts of a long conversation finish whole; send the result
+            result, message = await run_prepared(request, analysis)
+            await send('complete', api.create_accessible_response(result, message))
+            await response.write_eof()
+            return response
+        async with request.app[ANALYSIS_SEMAPHORE]:
+            async for chunk in api.stream_json_async(
+                analysis.endpoint, analysis.prompt, cache_bypass_requested(request), analysis.model
+            ):
+                for event, data in stream.feed(chunk):
+                    await send(event, data)
+        # Finishing may record state in SQLite or Redis; keep it off the event loop
+        await send(*(await asyncio.to_thread(stream.finish)))
+    except Exception as e:
+        logger.error(f"{log_label} stream error: {str(e)}")
+        await send('error', api.create_error_body("Analysis failed", error_details))
+    await response.write_eof()
+    return response
+
+
+def make_analysis_handler(endpoint: str, limit: str, error_details: str, log_label: str):
+    async def handler(request: web.Request) -> web.StreamResponse:
+        if rate_limited(request, limit, endpoint):
+            return error_response(
+                "Rate Limit Exceeded",
+                "Too many requests. Please wait before trying again.",
+                429
+            )
+        try:
+            data = await read_json(request)
+            # Sanitizing large inputs is CPU work; keep it off the event loop
+            analysis = await asyncio.to_thread(api.prepare_analysis, endpoint, data)
+            if endpoint in JOB_ENDPOINTS and job_mode_requested(request):
+                return await queue_job(request, analysis.endpoint, data)
+            stream_format = api.parse_stream_format(
+                request.query.get('stream'), request.headers.get('Accept', '')
+            )
+            if stream_format:
+                return await stream_prepared(request, analysis, stream_format, error_details, log_label)
+            result, message = await run_prepared(request, analysis)
+            return web.json_response(api.create_accessible_response(result, message))
+
+        except api.AnalysisInputError as e:
+            return error_response(e.error, e.details, 400)
+
+        except Exception as e:
+            logger.error(f"{log_label} error: {str(e)}")
+            return error_response("Analysis failed", error_details, 500)
+
+    handler.__name__ = f"analyze_{endpoint}"
+    return handler
+
+
+async def analyze_simple(request: web.Request) -> web.Response:
+    """Async /analyze, with the Expo app's response format."""
+    if rate_limited(request, SIMPLE_ANALYSIS_LIMIT, 'simple'):
+        return web.json_response(
+            {'success': False, 'message': 'Too many requests. Please wait before trying again.'},
+            status=429
+        )
+    try:
+        data = await read_json(request)
+        analysis = await asyncio.to_thread(api.prepare_analysis, 'simple', data)
+        result, _ = await run_prepared(request, analysis)
+        return web.json_response(result)
+
+    except api.AnalysisInputError as e:
+        return web.json_response({'success': False, 'message': e.details}, status=400)
+
+    except Exception as e:
+        logger.error(f"Analysis error: {str(e)}")
+        return web.json_response(
+            {'success': False, 'message': f'Analysis failed: {str(e)}'},
+            status=500
+        )
+
+
+async def get_job(request: web.Request) -> web.Response:
+    """Async /api/v1/jobs/<job_id>; '?wait=N' long-polls in a thread."""
+    if rate_limited(request, JOB_STATUS_LIMIT, 'jobs'):
+        return error_response(
+            "Rate Limit Exceeded",
+            "Too many requests. Please wait before trying again.",
+            429
+        )
+    try:
+        wait_seconds = min(max(float(request.query.get('wait', 0)), 0), api.JOB_MAX_WAIT)
+    except ValueError:
+        return error_response("Invalid input", "'wait' must be a number of seconds", 400)
+
+    job_id = request.match_info['job_id']
+    job = None
+    if api.job_queue is not None and wait_seconds:
+        job = await asyncio.to_thread(api.job_queue.wait, job_id, wait_seconds)
+    elif api.job_queue is not None:
+        job = await asyncio.to_thread(api.job_queue.get, job_id)
+    if job is None:
+        return error_response(
+            "Job not found",
+            "The job does not exist or its result has expired",
+            404
+        )
+    return web.json_response(
+        api.create_accessible_response(job_status_body(request, job), f"Job {job['status']}")
+    )
+
+
+async def health_check(request: web.Request) -> web.Response:
+    return web.json_response({
+        'status': 'healthy',
+        'service': 'text-decoder-api',
+        'version': '1.0.0-mvp',
+        'mode': 'async',
+        'in_flight': api.async_in_flight.stats(),
+        'behavior_library': api.behavior_library_store.status()
+    })
+
+
+async def warm_up_models(application: web.Application) -> None:
+    """Connect the async Gemini client before the first request needs it."""
+    if api.GEMINI_API_KEY:
+        # Keep a reference so the task is not garbage collected mid-run
+        application[WARM_UP_TASK] = asyncio.create_task(
+            api.model_registry.warm_up_async(api.warm_up_model_async)
+        )
+
+
+async def create_app(max_concurrent: int = ASYNC_MAX_CONCURRENT_ANALYSES) -> web.Application:
+    """aiohttp application factory (gunicorn entry point)."""
+    application = web.Application(client_max_size=2 * 1024 * 1024)
+    application[ANALYSIS_SEMAPHORE] = asyncio.Semaphore(max_concurrent)
+    application.on_startup.append(warm_up_models)
+
+    application.router.add_get('/health', health_check)
+    application.router.add_post('/analyze', analyze_simple)
+    application.router.add_get('/api/v1/jobs/{job_id}', get_job, name='get_job')
+    for path, (endpoint, limit, error_details, log_label) in ANALYZE_ROUTES.items():
+        application.router.add_post(
+            path, make_analysis_handler(endpoint, limit, error_details, log_label)
+        )
+    return application
+
+
+if __name__ == '__main__':
+    web.run_app(create_app(), port=int(os.environ.get('PORT', 8080)))
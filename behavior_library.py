@@ -0,0 +1,591 @@
+"""
+Behavior library loading for the Text Decoder API.
+
+The library is loaded and validated once per worker into an immutable
+snapshot. The snapshot carries an ETag (content hash) and the
+pre-serialized response body so the library endpoint does no file I/O or
+JSON encoding on the request path. The envelope's 'timestamp' is left as
+a slot in the encoded body and filled in per response, so it is always
+the time of the response, not of the snapshot; responses therefore send
+the ETag as a weak validator. The category list and single-behavior
+responses are encoded once per snapshot as well, the latter on first use.
+
+Each category is also built into a content-addressed shard, precompressed
+with gzip and (when available) brotli, so clients can fetch only the
+categories that changed.
+
+A BehaviorLibraryStore watches the library file and, when it changes,
+validates and indexes the new version on a background thread before
+swapping it in with a single reference assignment. Requests read the
+current snapshot once and keep using it, so a reload never drops or
+mixes versions within a request.
+
+Build shards for a CDN or static bucket:
+    python behavior_library.py build-shards --out dist/behaviors
+"""
+
+import argparse
+import base64
+import binascii
+import bisect
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+from behavior_matcher import BehaviorMatcher
+from behavior_search import BehaviorSearch
+from json_provider import encode
+
+logger = logging.getLogger(__name__)
+
+SHARD_HASH_LENGTH = 16
+
+
+class BehaviorLibraryError(ValueError):
+    """Raised when the behavior library file is missing or malformed."""
+
+
+def count_behaviors(library: Dict) -> int:
+    """Count total behaviors in library."""
+    count = 0
+    for category in library.get('categories', []):
+        for subcategory in category.get('subcategories', []):
+            count += len(subcategory.get('behaviors', []))
+    return count
+
+
+def validate_library(library: Any) -> None:
+    """Check the library structure, raising BehaviorLibraryError on problems."""
+    if not isinstance(library, dict):
+        raise BehaviorLibraryError("Library root must be an object")
+    categories = library.get('categories')
+    if not isinstance(categories, list):
+        raise BehaviorLibraryError("Library must contain a 'categories' list")
+
+    category_ids = set()
+    behavior_ids = set()
+    for index, category in enumerate(categories):
+        if not isinstance(category, dict) or not category.get('id'):
+            raise BehaviorLibraryError(f"Category {index} is missing an 'id'")
+        if category['id'] in category_ids:
+            raise BehaviorLibraryError(f"Duplicate category id: {category['id']}")
+        category_ids.add(category['id'])
+
+        for subcategory in category.get('subcategories', []):
+            if not isinstance(subcategory, dict):
+                raise BehaviorLibraryError(
+                    f"Category '{category['id']}' has a malformed subcategory"
+                )
+            for behavior in subcategory.get('behaviors', []):
+                if not isinstance(behavior, dict) or not behavior.get('id') or not behavior.get('name'):
+                    raise BehaviorLibraryError(
+                        f"Category '{category['id']}' has a behavior without 'id' or 'name'"
+                    )
+                if behavior['id'] in behavior_ids:
+                    raise BehaviorLibraryError(f"Duplicate behavior id: {behavior['id']}")
+                behavior_ids.add(behavior['id'])
+
+    declared = library.get('total_behaviors')
+    if declared is not None and declared != len(behavior_ids):
+        logger.warning(
+            f"Behavior library declares {declared} behaviors but contains {len(behavior_ids)}"
+        )
+
+
+def canonical_json(data: Any) -> bytes:
+    """Serialize data deterministically for hashing."""
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def content_hash(data: Any) -> str:
+    """Return the hex SHA-256 of the canonical JSON form of data."""
+    return hashlib.sha256(canonical_json(data)).hexdigest()
+
+
+# Stands in for the envelope's timestamp while a body is encoded
+_TIMESTAMP_SLOT = f"timestamp-{uuid.uuid4().hex}"
+
+
+class EncodedEnvelope(NamedTuple):
+    """A pre-encoded response body, split where the per-response timestamp goes."""
+    head: bytes
+    tail: Optional[bytes] = None
+
+    def render(self) -> bytes:
+        if self.tail is None:
+            return self.head
+        return b''.join((self.head, datetime.utcnow().isoformat().encode(), self.tail))
+
+
+def encode_envelope(enveloped: Dict) -> EncodedEnvelope:
+    """Encode an enveloped response once, leaving its 'timestamp' (if any) to render()."""
+    if 'timestamp' not in enveloped:
+        return EncodedEnvelope(encode(enveloped))
+    head, tail = encode({**enveloped, 'timestamp': _TIMESTAMP_SLOT}).split(_TIMESTAMP_SLOT.encode(), 1)
+    return EncodedEnvelope(head, tail)
+
+
+class BehaviorShard:
+    """One category of the library, encoded and precompressed once."""
+
+    __slots__ = ('category_id', 'category', 'hash', 'behavior_count', 'encodings')
+
+    def __init__(self, category: Dict):
+        body = canonical_json(category)
+        self.category_id = category['id']
+        self.category = category.get('category', category['id'])
+        self.hash = hashlib.sha256(body).hexdigest()[:SHARD_HASH_LENGTH]
+        self.behavior_count = sum(
+            len(subcategory.get('behaviors', []))
+            for subcategory in category.get('subcategories', [])
+        )
+        self.encodings = {
+            'identity': body,
+            'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+        }
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(body, quality=11)
+
+    @property
+    def filename(self) -> str:
+        """Content-addressed file name, e.g. 'communication_styles.1a2b3c4d5e6f7a8b.json'."""
+        return f"{self.category_id}.{self.hash}.json"
+
+    def select_encoding(self, accepted: Callable[[str], float]) -> str:
+        """Pick the smallest encoding the client accepts."""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and accepted(encoding) > 0:
+                return encoding
+        return 'identity'
+
+    def manifest_entry(self) -> Dict:
+        return {
+            'id': self.category_id,
+            'category': self.category,
+            'hash': self.hash,
+            'behavior_count': self.behavior_count,
+            'size': len(self.encodings['identity']),
+            'encodings': sorted(self.encodings),
+        }
+
+
+def build_shards(library: Dict) -> Dict[str, BehaviorShard]:
+    """Build one shard per category, keyed by category id."""
+    return {
+        category['id']: BehaviorShard(category)
+        for category in library.get('categories', [])
+    }
+
+
+class BehaviorEntry:
+    """A behavior together with its position in the category hierarchy."""
+
+    __slots__ = ('behavior', 'category_id', 'category', 'subcategory_id', 'subcategory', 'etag')
+
+    def __init__(self, behavior: Dict, category: Dict, subcategory: Dict):
+        self.behavior = behavior
+        self.category_id = category['id']
+        self.category = category.get('category', category['id'])
+        self.subcategory_id = subcategory.get('id')
+        self.subcategory = subcategory.get('name')
+        self.etag = content_hash(behavior)[:SHARD_HASH_LENGTH]
+
+    def to_dict(self, fields: Optional[Iterable[str]] = None) -> Dict:
+        """
+        Return a new dict for the response, optionally projected to fields.
+        The behavior id is always included.
+        """
+        result = dict(self.behavior)
+        result.update({
+            'category_id': self.category_id,
+            'category': self.category,
+            'subcategory_id': self.subcategory_id,
+            'subcategory': self.subcategory,
+        })
+        if fields:
+            wanted = set(fields) | {'id'}
+            result = {key: value for key, value in result.items() if key in wanted}
+        return result
+
+
+def encode_cursor(behavior_id: str) -> str:
+    """Encode the last behavior id of a page as an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(behavior_id.encode('utf-8')).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> str:
+    """Decode a pagination cursor, raising ValueError if it is malformed."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        return base64.urlsafe_b64decode(padded.encode()).decode('utf-8')
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+class BehaviorLibrary:
+    """Immutable, pre-serialized and indexed snapshot of the behavior library."""
+
+    __slots__ = (
+        '_data', '_etag', '_body', '_categories_body', '_entry_bodies', '_envelope',
+        '_behavior_count', '_source', '_shards',
+        '_entries', '_by_id', '_positions', '_by_category', '_by_subcategory', '_search', '_matcher',
+    )
+
+    def __init__(self, data: Dict, envelope: Optional[Callable[[Dict, str], Dict]] = None,
+                 source: Optional[str] = None):
+        behavior_count = count_behaviors(data)
+        envelope = envelope or (lambda payload, message: payload)
+        categories = [category.get('category', category['id']) for category in data.get('categories', [])]
+
+        entries = []
+        by_category: Dict[str, List[int]] = {}
+        by_subcategory: Dict[str, List[int]] = {}
+        for category in data.get('categories', []):
+            by_category.setdefault(category['id'], [])
+            for subcategory in category.get('subcategories', []):
+                for behavior in subcategory.get('behaviors', []):
+                    position = len(entries)
+                    entries.append(BehaviorEntry(behavior, category, subcategory))
+                    by_category[category['id']].append(position)
+                    if subcategory.get('id'):
+                        by_subcategory.setdefault(subcategory['id'], []).append(position)
+
+        self._freeze(
+            _data=data,
+            _etag=content_hash(data),
+            _body=encode_envelope(envelope(data, f"Loaded {behavior_count} behaviors and traits")),
+            _categories_body=encode_envelope(envelope({'categories': categories}, "Categories loaded")),
+            # Behavior id -> EncodedEnvelope, filled on first request
+            _entry_bodies={},
+            _envelope=envelope,
+            _behavior_count=behavior_count,
+            _source=source,
+            _shards=build_shards(data),
+            _entries=tuple(entries),
+            _by_id={entry.behavior['id']: entry for entry in entries},
+            _positions={entry.behavior['id']: position for position, entry in enumerate(entries)},
+            _by_category={key: tuple(value) for key, value in by_category.items()},
+            _by_subcategory={key: tuple(value) for key, value in by_subcategory.items()},
+            _search=BehaviorSearch([entry.behavior for entry in entries]),
+            _matcher=BehaviorMatcher([entry.behavior for entry in entries]),
+        )
+
+    def _freeze(self, **attributes):
+        for name, value in attributes.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BehaviorLibrary snapshots are immutable")
+
+    @property
+    def data(self) -> Dict:
+        """The parsed library. Treat as read-only; it is shared by all requests."""
+        return self._data
+
+    @property
+    def etag(self) -> str:
+        """Strong ETag: content hash of the library."""
+        return self._etag
+
+    @property
+    def body(self) -> bytes:
+        """Pre-encoded JSON response body for the full library, stamped now."""
+        return self._body.render()
+
+    @property
+    def categories_body(self) -> bytes:
+        """Pre-encoded JSON response body for the category names, stamped now."""
+        return self._categories_body.render()
+
+    def behavior_body(self, behavior_id: str) -> Optional[bytes]:
+        """Pre-encoded JSON response body for one whole behavior, or None if unknown."""
+        body = self._entry_bodies.get(behavior_id)
+        if body is None:
+            entry = self._by_id.get(behavior_id)
+            if entry is None:
+                return None
+            # Racing requests encode the same bytes; either may be kept
+            body = self._entry_bodies[behavior_id] = encode_envelope(
+                self._envelope(entry.to_dict(), f"Loaded behavior: {entry.behavior['name']}")
+            )
+        return body.render()
+
+    @property
+    def behavior_count(self) -> int:
+        return self._behavior_count
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._data.get('version')
+
+    @property
+    def last_updated(self) -> Optional[str]:
+        return self._data.get('last_updated')
+
+    @property
+    def source(self) -> Optional[str]:
+        """Path the snapshot was loaded from, or None for the default library."""
+        return self._source
+
+    @property
+    def shards(self) -> Dict[str, BehaviorShard]:
+        """Per-category shards keyed by category id."""
+        return self._shards
+
+    def category_names(self) -> List[str]:
+        """Category display names in library order."""
+        return [category.get('category', category['id']) for category in self._data.get('categories', [])]
+
+    def has_category(self, category_id: str) -> bool:
+        return category_id in self._by_category
+
+    def has_subcategory(self, subcategory_id: str) -> bool:
+        return subcategory_id in self._by_subcategory
+
+    def get_behavior(self, behavior_id: str) -> Optional[BehaviorEntry]:
+        """Look up a single behavior by id."""
+        return self._by_id.get(behavior_id)
+
+    def list_behaviors(self, category_id: Optional[str] = None, subcategory_id: Optional[str] = None,
+                       cursor: Optional[str] = None, limit: int = 50) -> Tuple[List[BehaviorEntry], Optional[str]]:
+        """
+        Page through behaviors, optionally filtered by category and/or subcategory.
+        Returns the page and the cursor for the next page (None on the last page).
+        """
+        if subcategory_id is not None:
+            positions = self._by_subcategory.get(subcategory_id, ())
+            if category_id is not None:
+                positions = tuple(
+                    p for p in positions if self._entries[p].category_id == category_id
+                )
+        elif category_id is not None:
+            positions = self._by_category.get(category_id, ())
+        else:
+            positions = range(len(self._entries))
+
+        start = 0
+        if cursor:
+            after = self._positions.get(decode_cursor(cursor))
+            if after is None:
+                raise ValueError("Invalid cursor")
+            start = bisect.bisect_right(positions, after)
+
+        page = [self._entries[p] for p in positions[start:start + limit]]
+        next_cursor = None
+        if page and start + limit < len(positions):
+            next_cursor = encode_cursor(page[-1].behavior['id'])
+        return page, next_cursor
+
+    def search(self, query: str, limit: int = 10,
+               category_id: Optional[str] = None) -> List[Tuple[BehaviorEntry, float]]:
+        """BM25-ranked full-text search, optionally within one category."""
+        allowed = None
+        if category_id is not None:
+            allowed = [self._entries[p].behavior['id'] for p in self._by_category.get(category_id, ())]
+        return [
+            (self._by_id[behavior_id], score)
+            for behavior_id, score in self._search.search(query, limit, allowed)
+        ]
+
+    def match_behaviors(self, messages: List[str], limit: int = 15) -> List[Tuple[BehaviorEntry, float]]:
+        """Behaviors the messages most resemble, best first."""
+        return [
+            (self._by_id[behavior_id], score)
+            for behavior_id, score in self._matcher.match(messages, limit)
+        ]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, str]]:
+        """Type-ahead suggestions of behavior names."""
+        return self._search.suggest(prefix, limit)
+
+    def manifest(self) -> Dict:
+        """Shard hashes so clients can fetch only changed categories."""
+        return {
+            'version': self.version,
+            'last_updated': self.last_updated,
+            'etag': self.etag,
+            'shards': [shard.manifest_entry() for shard in self._shards.values()],
+        }
+
+
+def read_library_file(path: str) -> Dict:
+    """Read and validate a library file."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            library = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise BehaviorLibraryError(f"Unable to read behavior library: {e}") from e
+    validate_library(library)
+    return library
+
+
+def load_behavior_library(path: str, default: Callable[[], Dict],
+                          envelope: Optional[Callable[[Dict, str], Dict]] = None) -> BehaviorLibrary:
+    """
+    Load the library at path into a snapshot.
+    Falls back to the default library if the file is missing or invalid.
+    """
+    if os.path.exists(path):
+        try:
+            return BehaviorLibrary(read_library_file(path), envelope, source=path)
+        except BehaviorLibraryError as e:
+            logger.error(f"Behavior library error: {str(e)}")
+    else:
+        logger.warning(f"Behavior library not found at {path}, using default library")
+    return BehaviorLibrary(default(), envelope)
+
+
+class BehaviorLibraryStore:
+    """
+    Holds the current library snapshot for a worker and hot-reloads it.
+    The file is re-read only when its mtime or size changes, and swapped in
+    only when its content hash differs and it passes validation.
+    """
+
+    def __init__(self, path: str, default: Callable[[], Dict],
+                 envelope: Optional[Callable[[Dict, str], Dict]] = None):
+        self.path = path
+        self._default = default
+        self._envelope = envelope
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._signature = self._stat()
+        self._current = load_behavior_library(path, default, envelope)
+        self.loaded_at = datetime.utcnow().isoformat()
+        self.reload_count = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def current(self) -> BehaviorLibrary:
+        """The active snapshot. Read it once per request."""
+        return self._current
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self) -> bool:
+        """
+        Reload the library if the file changed. Returns True if a new
+        snapshot was swapped in. Invalid files leave the current one active.
+        """
+        with self._reload_lock:
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                return False
+            self._signature = signature
+
+            try:
+                data = read_library_file(self.path)
+            except BehaviorLibraryError as e:
+                self.last_error = str(e)
+                logger.error(f"Behavior library reload rejected: {str(e)}")
+                return False
+
+            if content_hash(data) == self._current.etag:
+                return False
+
+            snapshot = BehaviorLibrary(data, self._envelope, source=self.path)
+            previous = self._current
+            self._current = snapshot
+            self.loaded_at = datetime.utcnow().isoformat()
+            self.reload_count += 1
+            self.last_error = None
+            logger.info(
+                f"Behavior library reloaded: version {previous.version} -> {snapshot.version}, "
+                f"{snapshot.behavior_count} behaviors"
+            )
+            return True
+
+    def start_watcher(self, interval: float) -> None:
+        """Poll the library file every interval seconds on a daemon thread."""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(interval):
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.error(f"Behavior library watcher error: {str(e)}")
+
+        self._watcher = threading.Thread(target=watch, name='behavior-library-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        self._stop.clear()
+
+    def status(self) -> Dict:
+        """Loaded version details for the health check."""
+        library = self._current
+        return {
+            'version': library.version,
+            'last_updated': library.last_updated,
+            'etag': library.etag,
+            'behavior_count': library.behavior_count,
+            'loaded_at': self.loaded_at,
+            'reload_count': self.reload_count,
+            'last_error': self.last_error,
+        }
+
+
+def write_shards(library: BehaviorLibrary, out_dir: str) -> List[str]:
+    """
+    Write every shard (plain, .gz and .br) plus manifest.json to out_dir.
+    Returns the paths written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    suffixes = {'identity': '', 'gzip': '.gz', 'br': '.br'}
+    written = []
+    for shard in library.shards.values():
+        for encoding, body in shard.encodings.items():
+            path = os.path.join(out_dir, shard.filename + suffixes[encoding])
+            with open(path, 'wb') as f:
+                f.write(body)
+            written.append(path)
+
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(library.manifest(), f, indent=2)
+    written.append(manifest_path)
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Behavior library build tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build-shards', help="Write precompressed category shards")
+    build.add_argument(
+        '--library',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'behavior_library.json')
+    )
+    build.add_argument('--out', required=True)
+    args = parser.parse_args(argv)
+
+    library = BehaviorLibrary(read_library_file(args.library), source=args.library)
+    written = write_shards(library, args.out)
+    print(f"Wrote {len(written)} files for {len(library.shards)} shards to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,131 @@
+"""
+Local matching of conversation messages against the behavior library.
+
+Asking the model to find matches in the whole library makes prompts large
+and behavior_id output unreliable. Instead, each library snapshot builds a
+matcher once. The matcher has two parts:
+
+- A TF-IDF matrix over each behavior's name, definition and examples.
+  Features are hashed word unigrams and bigrams, so the matrix has a fixed
+  width however large the vocabulary is.
+- A phrase index of the behaviors' example sentences and names, looked up
+  by their first two words.
+
+Scoring a conversation gathers the matrix rows of the features its
+messages contain, and then scans the messages once for phrases. The
+best-scoring behaviors are passed to the model as candidates.
+"""
+
+import zlib
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from behavior_search import STOPWORDS, TOKEN_PATTERN, field_text
+
+# Width of the hashed feature space
+FEATURES = 1 << 12
+
+# Fields matched, with their TF weights
+MATCH_FIELDS = {
+    'name': 2.0,
+    'definition': 1.0,
+    'examples': 1.5,
+}
+
+# Added to a behavior's score when a message contains one of its phrases
+PHRASE_BOOST = 0.5
+# Shortest example (in words) used as a phrase; shorter ones match too loosely
+MIN_PHRASE_WORDS = 3
+# Scores below this are noise, not candidates
+MIN_SCORE = 0.1
+
+
+def words(text: str) -> List[str]:
+    """Lowercase words, keeping stopwords (phrases need them)."""
+    return TOKEN_PATTERN.findall(text.replace('\u2019', "'").lower())
+
+
+def features(text: str) -> List[int]:
+    """Hashed unigram and bigram feature indices of text."""
+    terms = [word for word in words(text) if word not in STOPWORDS]
+    grams = terms + [f"{first} {second}" for first, second in zip(terms, terms[1:])]
+    return [zlib.crc32(gram.encode('utf-8')) % FEATURES for gram in grams]
+
+
+class BehaviorMatcher:
+    """TF-IDF and phrase matcher for one library snapshot. Read-only after construction."""
+
+    def __init__(self, behaviors: Sequence[Dict]):
+        self.ids = [behavior['id'] for behavior in behaviors]
+
+        counts = np.zeros((len(behaviors), FEATURES), dtype=np.float32)
+        for row, behavior in enumerate(behaviors):
+            for field, weight in MATCH_FIELDS.items():
+                indices = features(field_text(behavior.get(field)))
+                np.add.at(counts[row], indices, weight)
+
+        document_frequency = np.count_nonzero(counts, axis=0)
+        self.idf = (np.log((1 + len(behaviors)) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix = counts * self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        # (features x behaviors), so a message's features select rows
+        self.matrix = (matrix / np.where(norms == 0, 1, norms)).T.copy()
+
+        # First two words -> [(phrase words, behavior row)]
+        self.phrases: Dict[Tuple[str, str], List[Tuple[Tuple[str, ...], int]]] = {}
+        for row, behavior in enumerate(behaviors):
+            name = tuple(words(field_text(behavior.get('name'))))
+            examples = [tuple(words(example)) for example in behavior.get('examples') or []
+                        if isinstance(example, str)]
+            phrases = ([name] if len(name) >= 2 else []) + [
+                example for example in examples if len(example) >= MIN_PHRASE_WORDS
+            ]
+            for phrase in phrases:
+                self.phrases.setdefault(phrase[:2], []).append((phrase, row))
+
+    def score(self, messages: Sequence[str]) -> np.ndarray:
+        """Per-behavior score: best message similarity, plus a boost for phrase matches."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        if not self.ids or not messages:
+            return scores
+
+        # Sparse query vectors: one entry per distinct (message, feature)
+        keys = np.fromiter(
+            (row * FEATURES + index for row, message in enumerate(messages) for index in features(message)),
+            dtype=np.int64
+        )
+        if len(keys):
+            keys, counts = np.unique(keys, return_counts=True)
+            rows, columns = keys // FEATURES, keys % FEATURES
+            values = counts * self.idf[columns]
+            norms = np.sqrt(np.bincount(rows, weights=values * values))
+            values = (values / norms[rows]).astype(np.float32)
+            # Keys are sorted, so each message's entries are contiguous
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            similarity = np.add.reduceat(values[:, None] * self.matrix[columns], starts, axis=0)
+            scores = similarity.max(axis=0)
+
+        matched = set()
+        for message in messages:
+            tokens = words(message)
+            for start in range(len(tokens) - 1):
+                for phrase, row in self.phrases.get((tokens[start], tokens[start + 1]), ()):
+                    if tuple(tokens[start:start + len(phrase)]) == phrase:
+                        matched.add(row)
+        if matched:
+            scores[list(matched)] += PHRASE_BOOST
+        return scores
+
+    def match(self, messages: Sequence[str], limit: int = 15) -> List[Tuple[str, float]]:
+        """Up to limit (behavior_id, score) pairs, best first."""
+        scores = self.score(messages)
+        if not len(scores) or limit <= 0:
+            return []
+        limit = min(limit, len(scores))
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.lexsort((best, -scores[best]))]
+        return [
+            (self.ids[row], round(float(scores[row]), 4))
+            for row in best if scores[row] >= MIN_SCORE
+        ]
@@ -0,0 +1,161 @@
+"""
+Full-text search over the behavior library.
+
+An inverted index with BM25 ranking is built once per library snapshot from
+each behavior's text fields, and a prefix trie over behavior names serves
+type-ahead suggestions. Both are read-only after construction and safe to
+share between request threads.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Fields indexed for search, with their BM25F weights
+SEARCH_FIELDS = {
+    'name': 3.0,
+    'definition': 2.0,
+    'examples': 1.0,
+    'healthy_indicators': 1.0,
+    'unhealthy_indicators': 1.0,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SUGGESTIONS_PER_NODE = 10
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i if in is it its me my not of on or
+so that the their them they this to was we were what when with you your
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split into words and drop stopwords and possessives."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token.endswith("'s"):
+            token = token[:-2]
+        if token and token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def field_text(value) -> str:
+    """Flatten a string or list-of-strings field to text."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return ' '.join(item for item in value if isinstance(item, str))
+    return ''
+
+
+class SearchIndex:
+    """Inverted index with BM25F-style field weighting."""
+
+    def __init__(self, documents: Sequence[Tuple[str, Dict]]):
+        """documents is a sequence of (behavior_id, behavior) pairs."""
+        self.doc_ids: List[str] = []
+        self.doc_lengths: List[float] = []
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+
+        for doc_index, (doc_id, behavior) in enumerate(documents):
+            weighted_tf: Counter = Counter()
+            length = 0.0
+            for field, weight in SEARCH_FIELDS.items():
+                tokens = tokenize(field_text(behavior.get(field)))
+                length += weight * len(tokens)
+                for token in tokens:
+                    weighted_tf[token] += weight
+            self.doc_ids.append(doc_id)
+            self.doc_lengths.append(length)
+            for token, tf in weighted_tf.items():
+                self.postings.setdefault(token, []).append((doc_index, tf))
+
+        count = len(self.doc_ids)
+        self.average_length = (sum(self.doc_lengths) / count) if count else 0.0
+        self.idf = {
+            token: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self.postings.items()
+        }
+
+    def search(self, query: str, limit: int = 10,
+               allowed: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Return up to limit (behavior_id, score) pairs, best first.
+        allowed restricts results to the given behavior ids.
+        """
+        allowed_set = set(allowed) if allowed is not None else None
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = self.idf[token]
+            for doc_index, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_index] / self.average_length)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        if allowed_set is not None:
+            scores = {d: s for d, s in scores.items() if self.doc_ids[d] in allowed_set}
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(self.doc_ids[doc_index], round(score, 4)) for doc_index, score in best]
+
+
+class PrefixTrie:
+    """
+    Prefix trie over behavior names for type-ahead.
+    Each name is inserted from every word boundary, so 'treat' matches
+    'Silent Treatment'. Nodes keep their best suggestions precomputed,
+    making a lookup O(len(prefix)).
+    """
+
+    def __init__(self, names: Sequence[Tuple[str, str]]):
+        """names is a sequence of (behavior_id, display_name) pairs."""
+        self.root: Dict = {}
+        for rank, (behavior_id, name) in enumerate(names):
+            words = name.lower().split()
+            for start in range(len(words)):
+                self._insert(' '.join(words[start:]), (start, rank, behavior_id, name))
+
+    def _insert(self, key: str, suggestion: Tuple[int, int, str, str]) -> None:
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+            bucket = node.setdefault('', [])
+            if suggestion[2] not in (s[2] for s in bucket):
+                bucket.append(suggestion)
+                # Prefer matches at the start of the name, then library order
+                bucket.sort()
+                del bucket[SUGGESTIONS_PER_NODE:]
+
+    def suggest(self, prefix: str, limit: int = SUGGESTIONS_PER_NODE) -> List[Dict[str, str]]:
+        node = self.root
+        for char in ' '.join(prefix.lower().split()):
+            node = node.get(char)
+            if node is None:
+                return []
+        return [
+            {'id': behavior_id, 'name': name}
+            for _, _, behavior_id, name in node.get('', [])[:limit]
+        ]
+
+
+class BehaviorSearch:
+    """Search index and suggestion trie for one library snapshot."""
+
+    def __init__(self, behaviors: Sequence[Dict]):
+        self.index = SearchIndex([(behavior['id'], behavior) for behavior in behaviors])
+        self.trie = PrefixTrie([(behavior['id'], behavior['name']) for behavior in behaviors])
+
+    def search(self, query: str, limit: int = 10,
+               allowed: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        return self.index.search(query, limit, allowed)
+
+    def suggest(self, prefix: str, limit: int = SUGGESTIONS_PER_NODE) -> List[Dict[str, str]]:
+        return self.trie.suggest(prefix, limit)
@@ -0,0 +1,106 @@
+"""
+Microbenchmark: response encoding with Flask's stdlib provider vs. orjson.
+
+Encodes the behavior library envelope and a large sample analysis (about
+the size of an 8192-token model result) through each provider's
+response(), and reports the best time and the peak memory allocated
+while encoding. The pre-encoded library body costs neither.
+
+Run: python benchmarks/bench_json.py [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from json_provider import OrjsonProvider, orjson  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def envelope(data, message):
+    return {
+        'success': True,
+        'message': message,
+        'timestamp': '2024-03-12T14:23:45.000000',
+        'data': data,
+        'accessibility': {'screen_reader_summary': message, 'data_type': type(data).__name__}
+    }
+
+
+def sample_analysis():
+    """A conversation analysis of about 28KB, close to a full 8192-token result."""
+    quote = "I told you I'd be home by eight, and you said that was fine — don't do this again."
+    return {
+        'summary': 'A tense exchange about plans that escalated and then de-escalated. ' * 3,
+        'power_dynamics': {'assessment': 'Mostly balanced', 'indicators': [quote] * 8, 'balance_score': 6},
+        'speaker_analyses': [
+            {
+                'speaker': f'Speaker {n}',
+                'communication_style': {'primary': 'assertive', 'examples': [quote] * 6, 'effectiveness_score': 7},
+                'emotional_state': 'frustrated but engaged',
+                'behaviors': [
+                    {'behavior_id': f'behavior_{i}', 'name': f'Behavior {i}', 'evidence': [quote] * 3,
+                     'confidence': 0.82, 'severity': 'low'}
+                    for i in range(30)
+                ],
+            }
+            for n in range(2)
+        ],
+        'red_flags': [{'flag': 'Raised voice', 'evidence': quote}] * 10,
+        'green_flags': [{'flag': 'Apology offered', 'evidence': quote}] * 10,
+        'suggestions': [f'Suggestion {i}: name the feeling before the request.' for i in range(20)],
+    }
+
+
+def measure(app, payload, repeat):
+    with app.app_context():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = app.json.response(payload).get_data()
+            best = min(best, time.perf_counter() - start)
+        tracemalloc.start()
+        app.json.response(payload).get_data()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return best, peak, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    if orjson is None:
+        sys.exit("orjson is not installed")
+
+    with open(os.path.join(ROOT, 'data', 'behavior_library.json'), encoding='utf-8') as f:
+        library = json.load(f)
+    payloads = {
+        'behavior library': envelope(library, 'Loaded behaviors and traits'),
+        'sample analysis': envelope(sample_analysis(), 'Conversation analysis complete'),
+    }
+
+    stdlib_app, orjson_app = Flask('stdlib'), Flask('orjson')
+    stdlib_app.json = DefaultJSONProvider(stdlib_app)
+    orjson_app.json = OrjsonProvider(orjson_app)
+
+    print(f"{'payload':<17} {'size KB':>8}  {'stdlib ms':>9} {'orjson ms':>9} {'speedup':>7}  "
+          f"{'stdlib peak KB':>14} {'orjson peak KB':>14}")
+    for name, payload in payloads.items():
+        slow, slow_peak, size = measure(stdlib_app, payload, args.repeat)
+        fast, fast_peak, _ = measure(orjson_app, payload, args.repeat)
+        print(f"{name:<17} {size / 1024:>8.1f}  {slow * 1000:>9.3f} {fast * 1000:>9.3f} {slow / fast:>6.1f}x  "
+              f"{slow_peak / 1024:>14.1f} {fast_peak / 1024:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
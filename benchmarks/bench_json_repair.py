@@ -0,0 +1,69 @@
+"""
+Microbenchmark: recovering model output with the JSON repair parser.
+
+Valid output is still parsed with json.loads; the repair parser only runs
+when that fails, or incrementally while a response streams. Compares
+json.loads, one-shot repair and chunked repair on a large sample
+analysis, whole and cut off at several points.
+
+Run: python benchmarks/bench_json_repair.py [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_json import sample_analysis  # noqa: E402
+from json_stream import JsonRepairParser, repair_json  # noqa: E402
+
+
+def chunked(text, size):
+    parser = JsonRepairParser()
+    for start in range(0, len(text), size):
+        parser.feed(text[start:start + size])
+    return parser.finish()
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    text = json.dumps(sample_analysis(), indent=2)
+    # Lines ending in a bare string close an object or array; give them a trailing comma
+    broken = '```json\n' + text.replace('"\n', '",\n') + '\n```'
+    inputs = {'valid': text, 'fenced + trailing commas': broken}
+    for fraction in (0.5, 0.9):
+        inputs[f'cut at {fraction:.0%}'] = text[:int(len(text) * fraction)]
+
+    print(f"{len(text) / 1024:.1f} KB analysis\n")
+    print(f"{'input':<25} {'json.loads ms':>13} {'repair ms':>10} {'64-char chunks ms':>18} {'kept keys':>10}")
+    for name, sample in inputs.items():
+        try:
+            json.loads(sample)
+            loads = f"{best_of(lambda: json.loads(sample), args.repeat):.3f}"
+        except json.JSONDecodeError:
+            loads = 'fails'
+        whole = best_of(lambda: repair_json(sample), args.repeat)
+        streamed = best_of(lambda: chunked(sample, 64), args.repeat)
+        repaired = repair_json(sample)
+        assert chunked(sample, 64) == repaired
+        print(f"{name:<25} {loads:>13} {whole:>10.3f} {streamed:>18.3f} "
+              f"{len(repaired.value):>5}{' (partial)' if repaired.partial else ''}")
+
+
+if __name__ == '__main__':
+    main()
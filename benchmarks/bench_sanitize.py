@@ -0,0 +1,68 @@
+"""
+Microbenchmark: sanitizer fast path vs. bleach on every call.
+
+Chat transcripts rarely contain markup, so most fields skip the HTML
+parse entirely. The markup cases show the cost when they don't.
+
+Run: python benchmarks/bench_sanitize.py [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sanitizer import clean, sanitize  # noqa: E402
+
+LINE = "Alice: are we still on for dinner tonight? I booked the place at 8\n"
+SIZES = (200, 2_000, 10_000, 50_000)
+
+
+def bleach_every_call(text, max_length=50_000):
+    return clean(text)[:max_length]
+
+
+def inputs(size):
+    plain = (LINE * (size // len(LINE) + 1))[:size]
+    half = size // 2
+    return {
+        'plain': plain,
+        'markup at end': plain[:size - 10] + '<b>hi</b>!',
+        'markup at middle': plain[:half] + '<b>hi</b>' + plain[half + 9:],
+    }
+
+
+def best_of(func, text, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text, 50_000)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'size':>7}  {'input':<17} {'bleach ms':>10} {'fast ms':>9} {'speedup':>8}")
+    for size in SIZES:
+        for name, text in inputs(size).items():
+            assert sanitize(text, 50_000) == bleach_every_call(text)
+            slow = best_of(bleach_every_call, text, args.repeat)
+            fast = best_of(sanitize, text, args.repeat)
+            print(f"{size:>7}  {name:<17} {slow * 1000:>10.3f} {fast * 1000:>9.3f} {slow / fast:>7.0f}x")
+
+    # analyze_response_impact sanitizes three fields per request
+    fields = [inputs(2_000)['plain'], 'Alice', 'Sounds good, see you at 8!']
+    slow = sum(best_of(bleach_every_call, text, args.repeat) for text in fields)
+    fast = sum(best_of(sanitize, text, args.repeat) for text in fields)
+    print(f"\nresponse_impact request (3 fields): {slow * 1000:.3f} ms -> {fast * 1000:.3f} ms "
+          f"CPU per request")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark: sync store upload throughput and latest-version lookups.
+
+Uploads come from several threads at once, as from a threaded worker.
+Download time should stay flat as the number of users grows.
+
+Run: python benchmarks/bench_sync_store.py [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.fernet import Fernet  # noqa: E402
+
+from sync_store import SQLiteSyncStore  # noqa: E402
+
+BLOB_SIZE = 16 * 1024
+THREADS = (1, 4, 16)
+USER_COUNTS = (1_000, 10_000, 50_000)
+
+
+def upload_rate(store, threads, uploads):
+    payload = os.urandom(BLOB_SIZE)
+
+    def upload(worker):
+        for i in range(uploads // threads):
+            store.put(f'user{worker}-{i % 50}', payload + f'{worker}-{i}'.encode())
+
+    workers = [threading.Thread(target=upload, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return uploads / (time.perf_counter() - start)
+
+
+def lookup_time(store, users, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(0, users, users // 100):
+            store.get(f'user{i}')
+        best = min(best, (time.perf_counter() - start) / 100)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--uploads', type=int, default=2_000)
+    args = parser.parse_args()
+    cipher = Fernet(Fernet.generate_key())
+
+    print(f"Uploads of {BLOB_SIZE // 1024} KiB blobs, encrypted at rest")
+    for threads in THREADS:
+        with tempfile.TemporaryDirectory() as directory:
+            store = SQLiteSyncStore(os.path.join(directory, 'sync.db'), cipher=cipher)
+            rate = upload_rate(store, threads, args.uploads)
+        print(f"  {threads:>3} threads: {rate:>8,.0f} uploads/s")
+
+    print("Latest-version download by user count")
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteSyncStore(os.path.join(directory, 'sync.db'), cipher=cipher)
+        users = 0
+        for target in USER_COUNTS:
+            for i in range(users, target):
+                store.put(f'user{i}', f'blob {i}'.encode())
+            users = target
+            print(f"  {users:>7,} users: {lookup_time(store, users, args.repeat) * 1e6:>7.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+Deterministic parsers for exported chat transcripts.
+
+Most text sent to speaker identification is pasted from a chat export in
+which every message already names its sender: WhatsApp, SMS backup tools,
+iMessage exporters, Discord, a Messenger JSON download, or plain
+'Name: message' lines. Parsing those locally takes milliseconds and needs
+no model call. The format is detected from the first lines, then the
+whole text is read in a single pass. Lines without a header continue the
+previous message, and system lines are skipped.
+
+parse_chat returns the speaker identification structure with a
+confidence score, or None when the text does not look like any known
+format. Callers send anything they are not confident about to the model.
+"""
+
+import json
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern
+
+# Lines sampled to detect the format
+DETECT_LINES = 50
+
+_DATE = r'\d{1,4}[./-]\d{1,2}[./-]\d{1,4}'
+_TIME = r'\d{1,2}[:.]\d{2}(?:[:.]\d{2})?(?:\s?[APap]\.?\s?[Mm]\.?)?'
+_SPEAKER = r'(?P<speaker>[^:\n]{1,60}?)'
+
+_PHONE = re.compile(r'^\+?[\d\s()-]{6,}$')
+_NOT_IN_NAMES = re.compile(r'[!?;"<>{}\[\]=|\\]|://')
+# "https://..." splits at its first colon into a "speaker" and text
+_URL_SCHEMES = frozenset({'http', 'https', 'ftp', 'file', 'mailto'})
+
+
+class ChatFormat(NamedTuple):
+    name: str
+    label: str
+    # Matches the line that starts a message
+    header: Pattern
+    # Confidence of each message whose header matched
+    confidence: float
+    # Messages may continue over following lines (otherwise such lines lower confidence)
+    multiline: bool = True
+    # The sender is on the line after the header rather than in it
+    speaker_on_next_line: bool = False
+    # Lines to skip, e.g. "Messages and calls are end-to-end encrypted"
+    system: Optional[Pattern] = None
+
+
+# Most specific first; detection ties go to the earlier format
+FORMATS = (
+    ChatFormat(
+        'whatsapp', 'WhatsApp export',
+        re.compile(
+            rf'^\u200e?(?:\[(?P<ios>{_DATE},? {_TIME})\] |(?P<android>{_DATE},? {_TIME}) - )'
+            rf'\u200e?~?\s?{_SPEAKER}: ?(?P<text>.*)$'
+        ),
+        0.98,
+        system=re.compile(rf'^\u200e?{_DATE},? {_TIME} - [^:]*$')
+    ),
+    ChatFormat(
+        'sms', 'SMS backup',
+        re.compile(
+            rf'^\[?(?P<timestamp>\d{{4}}-\d{{2}}-\d{{2}}[ T]{_TIME})\]?:? (?:- )?{_SPEAKER}: ?(?P<text>.*)$'
+        ),
+        0.97
+    ),
+    ChatFormat(
+        'discord', 'Discord',
+        re.compile(
+            rf'^(?:\[(?P<exported>{_DATE},? {_TIME})\] (?P<exporter_speaker>[^\n]{{1,60}})'
+            rf'|(?P<speaker>[^\n]{{1,60}}?) (?:— |- )?(?P<timestamp>(?:Today|Yesterday) at {_TIME}'
+            rf'|{_DATE},? {_TIME}))$'
+        ),
+        0.95
+    ),
+    ChatFormat(
+        'imessage', 'iMessage export',
+        re.compile(
+            r'^(?P<timestamp>[A-Z][a-z]{2} \d{1,2}, \d{4}\s+\d{1,2}:\d{2}(?::\d{2})?\s?[AP]M)(?: \(.*\))?$'
+        ),
+        0.95,
+        speaker_on_next_line=True
+    ),
+    ChatFormat(
+        'plain', '"Name:" prefix',
+        re.compile(rf'^{_SPEAKER}:\s?(?P<text>.*)$'),
+        0.9,
+        multiline=False
+    ),
+)
+
+
+class ParsedChat(NamedTuple):
+    format: str
+    messages: List[Dict[str, Any]]
+    confidence: float
+
+    def speakers(self) -> List[str]:
+        """Speakers in order of first appearance."""
+        return list(dict.fromkeys(message['speaker'] for message in self.messages))
+
+    def as_identification(self) -> Dict[str, Any]:
+        """The structure speaker identification returns."""
+        label = next((fmt.label for fmt in FORMATS if fmt.name == self.format), 'Messenger export')
+        return {
+            'speakers_identified': self.speakers(),
+            'messages': self.messages,
+            'analysis_notes': f"Parsed locally as a {label} ({len(self.messages)} messages)",
+            'confidence_overall': self.confidence,
+            'parser': self.format
+        }
+
+
+def plausible_speaker(name: str) -> bool:
+    """Whether a header's sender looks like a name or phone number rather than prose."""
+    if not name or len(name) > 40 or len(name.split()) > 4:
+        return False
+    if _NOT_IN_NAMES.search(name):
+        return False
+    return any(char.isalpha() for char in name) or bool(_PHONE.match(name))
+
+
+def _header(fmt: ChatFormat, line: str) -> Optional[Dict[str, Optional[str]]]:
+    """The header fields of line in this format, or None."""
+    match = fmt.header.match(line)
+    if match is None:
+        return None
+    groups = match.groupdict()
+    timestamp = groups.get('timestamp') or groups.get('ios') or groups.get('android') or groups.get('exported')
+    if fmt.speaker_on_next_line:
+        return {'speaker': None, 'text': None, 'timestamp': timestamp}
+    speaker = (groups.get('speaker') or groups.get('exporter_speaker') or '').strip()
+    if not plausible_speaker(speaker):
+        return None
+    text = groups.get('text')
+    if speaker.lower() in _URL_SCHEMES or (text is not None and text.startswith('//')):
+        # A URL, not a header
+        return None
+    return {'speaker': speaker, 'text': text, 'timestamp': timestamp}
+
+
+def detect_format(lines: List[str]) -> Optional[ChatFormat]:
+    """The format whose headers match the most of the first non-empty lines."""
+    sample = [line for line in lines[:DETECT_LINES * 4] if line.strip()][:DETECT_LINES]
+    best, best_count = None, 0
+    for fmt in FORMATS:
+        count = sum(1 for line in sample if _header(fmt, line) is not None)
+        if count > best_count:
+            best, best_count = fmt, count
+    return best
+
+
+def parse_lines(lines: List[str], fmt: ChatFormat) -> Optional[ParsedChat]:
+    """Read every line in one pass with a known format."""
+    messages: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    # Timestamp of a header whose sender is on the next line
+    pending: Optional[List[Optional[str]]] = None
+    orphans = 0
+    continuations = 0
+
+    def finish() -> None:
+        if current is None:
+            return
+        text = '\n'.join(current.pop('lines')).strip()
+        if text:
+            messages.append(current)
+            current['text'] = text
+
+    for line in lines:
+        header = _header(fmt, line)
+        if header is not None:
+            finish()
+            if fmt.speaker_on_next_line:
+                current, pending = None, [header['timestamp']]
+                continue
+            current = {
+                'speaker': header['speaker'],
+                'lines': [header['text']] if header['text'] else [],
+                'timestamp': header['timestamp']
+            }
+            continue
+        if fmt.system is not None and fmt.system.match(line):
+            finish()
+            current = None
+            continue
+        stripped = line.strip()
+        if pending is not None:
+            if stripped:
+                current = {'speaker': stripped, 'lines': [], 'timestamp': pending[0]}
+                pending = None
+            continue
+        if current is None:
+            orphans += bool(stripped)
+            continue
+        if current['lines'] and stripped:
+            continuations += 1
+        current['lines'].append(line)
+    finish()
+
+    if len(messages) < 2:
+        return None
+
+    reasoning = f"Sender named in {fmt.label} header"
+    for message in messages:
+        timestamp = message.pop('timestamp')
+        message['confidence'] = fmt.confidence
+        message['reasoning'] = reasoning
+        if timestamp:
+            message['timestamp'] = timestamp
+
+    # Text outside any message (and, for one-line formats, lines without a
+    # sender) means the format only fits part of the input
+    unexplained = orphans + (0 if fmt.multiline else continuations)
+    confidence = fmt.confidence * len(messages) / (len(messages) + unexplained)
+    speakers = len({message['speaker'] for message in messages})
+    if not fmt.multiline and speakers > 2 and speakers * 2 > len(messages):
+        # "Note: ...", "Tip: ..." prose rather than a conversation
+        confidence *= 0.5
+    return ParsedChat(fmt.name, messages, round(confidence, 2))
+
+
+def _fix_mojibake(text: str) -> str:
+    """Messenger exports escape UTF-8 bytes as Latin-1 code points."""
+    try:
+        return text.encode('latin-1').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return text
+
+
+def _timestamp_ms(value: Any) -> Optional[int]:
+    """A Messenger timestamp as an int, also when exported as a string; None if unusable."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def parse_messenger_json(text: str) -> Optional[ParsedChat]:
+    """A Facebook Messenger JSON download ({"participants": ..., "messages": [...]})."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get('messages'), list):
+        return None
+
+    entries = [
+        entry for entry in data['messages']
+        if isinstance(entry, dict) and isinstance(entry.get('sender_name'), str)
+        and isinstance(entry.get('content'), str)
+    ]
+    timed = [(_timestamp_ms(entry.get('timestamp_ms')), entry) for entry in entries]
+    # Exports list the newest message first
+    timed.sort(key=lambda item: item[0] or 0)
+    messages = []
+    for timestamp_ms, entry in timed:
+        message = {
+            'speaker': _fix_mojibake(entry['sender_name']),
+            'text': _fix_mojibake(entry['content']),
+            'confidence': 1.0,
+            'reasoning': "Sender named in Messenger export"
+        }
+        if timestamp_ms is not None:
+            try:
+                message['timestamp'] = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).isoformat()
+            except (OverflowError, OSError, ValueError):
+                pass
+        messages.append(message)
+    if len(messages) < 2:
+        return None
+    return ParsedChat('messenger', messages, 1.0)
+
+
+def parse_chat(text: str) -> Optional[ParsedChat]:
+    """Parse an exported chat, or return None if its format is not recognized."""
+    if text.lstrip().startswith('{'):
+        parsed = parse_messenger_json(text)
+        if parsed is not None:
+            return parsed
+    lines = text.splitlines()
+    fmt = detect_format(lines)
+    if fmt is None:
+        return None
+    return parse_lines(lines, fmt)
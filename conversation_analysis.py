@@ -0,0 +1,331 @@
+"""
+Map-reduce analysis of conversations longer than one prompt budget.
+
+The conversation is split into overlapping windows of whole messages, each
+window is analyzed on its own (in parallel), and the per-window results
+are merged into the normal conversation analysis schema:
+
+- scores are averaged, weighted by window size
+- findings lists are unioned without duplicates, keeping the most recent
+  entries when a list is over its cap
+- categorical labels take the weighted majority, except the manipulation
+  check, which keeps the most serious finding of any window
+- per-speaker analyses and behaviors are merged by speaker and behavior
+- descriptions come from the most recent window, i.e. the current state
+
+The same merge powers incremental re-analysis: a conversation's analysis
+is kept as state keyed by a hash chain over its messages, and when
+messages are appended only the new ones are analyzed and merged in.
+"""
+
+import hashlib
+import json
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LIST_LIMIT = 10
+
+FREQUENCY_ORDER = ('rare', 'occasional', 'frequent')
+SEVERITY_ORDER = ('none', 'mild', 'moderate', 'severe')
+
+
+def split_windows(sizes: Sequence[int], window_chars: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Split messages (given by serialized size) into [start, end) windows of
+    at most window_chars each, every window repeating the last `overlap`
+    messages of the one before for context. A message larger than a whole
+    window gets a window to itself.
+    """
+    windows = []
+    start = 0
+    count = len(sizes)
+    while start < count:
+        end = start
+        used = 2  # '[' and ']'
+        while end < count and (end == start or used + sizes[end] + 2 <= window_chars):
+            used += sizes[end] + 2
+            end += 1
+        windows.append((start, end))
+        if end >= count:
+            break
+        start = max(end - overlap, start + 1)
+    return windows
+
+
+def _dedupe(lists: Iterable[Any], limit: int = LIST_LIMIT) -> List[Any]:
+    """Union lists (oldest first) without duplicates, keeping the newest `limit` items."""
+    seen = set()
+    merged = []
+    for items in lists:
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            key = item.strip().lower() if isinstance(item, str) else repr(item)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(item)
+    return merged[-limit:]
+
+
+def _weighted_mean(values: Iterable[Tuple[Any, int]], digits: int = 1) -> Optional[float]:
+    total = weight_sum = 0.0
+    for value, weight in values:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            total += value * weight
+            weight_sum += weight
+    if not weight_sum:
+        return None
+    mean = round(total / weight_sum, digits)
+    return int(mean) if digits == 0 else mean
+
+
+def _majority(values: Iterable[Tuple[Any, int]]) -> Optional[str]:
+    votes: Counter = Counter()
+    for value, weight in values:
+        if isinstance(value, str) and value:
+            votes[value] += weight
+    return votes.most_common(1)[0][0] if votes else None
+
+
+def _most_serious(values: Iterable[Any], order: Sequence[str]) -> Optional[str]:
+    ranked = [value for value in values if isinstance(value, str) and value.lower() in order]
+    return max(ranked, key=lambda value: order.index(value.lower())) if ranked else None
+
+
+def _latest(values: Iterable[Any]) -> Any:
+    found = None
+    for value in values:
+        if value:
+            found = value
+    return found
+
+
+def _sections(results: Sequence[Tuple[Dict, int]], key: str) -> List[Tuple[Dict, int]]:
+    return [(result[key], weight) for result, weight in results if isinstance(result.get(key), dict)]
+
+
+def _merge_behaviors(entries: Sequence[Tuple[List, int]], windows_present: int) -> List[Dict]:
+    grouped: Dict[str, List[Tuple[Dict, int]]] = {}
+    for behaviors, weight in entries:
+        for behavior in behaviors if isinstance(behaviors, list) else []:
+            if not isinstance(behavior, dict):
+                continue
+            key = str(behavior.get('behavior_id') or behavior.get('behavior_name') or '').lower()
+            if key:
+                grouped.setdefault(key, []).append((behavior, weight))
+
+    merged = []
+    for observations in grouped.values():
+        frequency = _most_serious((b.get('frequency') for b, _ in observations), FREQUENCY_ORDER)
+        # Seen across most of the speaker's windows: frequent however each window rated it
+        if len(observations) >= 2 and len(observations) * 2 >= windows_present:
+            frequency = 'frequent'
+        first = observations[0][0]
+        merged.append({
+            'behavior_id': first.get('behavior_id'),
+            'behavior_name': _latest(b.get('behavior_name') for b, _ in observations),
+            'examples': _dedupe(b.get('examples') for b, _ in observations),
+            'frequency': frequency,
+            'impact': _majority((b.get('impact'), w) for b, w in observations)
+        })
+    merged.sort(
+        key=lambda b: FREQUENCY_ORDER.index(b['frequency']) if b['frequency'] in FREQUENCY_ORDER else -1,
+        reverse=True
+    )
+    return merged
+
+
+def _merge_speaker(entries: Sequence[Tuple[Dict, int]]) -> Dict:
+    style = _sections(entries, 'communication_style')
+    emotional = _sections(entries, 'emotional_patterns')
+    attachment = _sections(entries, 'attachment_indicators')
+    return {
+        'speaker': entries[-1][0].get('speaker'),
+        'communication_style': {
+            'primary': _majority((s.get('primary'), w) for s, w in style),
+            'examples': _dedupe(s.get('examples') for s, _ in style),
+            'effectiveness_score': _weighted_mean((s.get('effectiveness_score'), w) for s, w in style)
+        },
+        'emotional_patterns': {
+            'regulation_level': _majority((e.get('regulation_level'), w) for e, w in emotional),
+            'triggers_observed': _dedupe(e.get('triggers_observed') for e, _ in emotional),
+            'coping_mechanisms': _dedupe(e.get('coping_mechanisms') for e, _ in emotional)
+        },
+        'attachment_indicators': {
+            'likely_style': _majority((a.get('likely_style'), w) for a, w in attachment),
+            'evidence': _dedupe(a.get('evidence') for a, _ in attachment)
+        },
+        'behaviors_exhibited': _merge_behaviors(
+            [(s.get('behaviors_exhibited'), w) for s, w in entries], len(entries)
+        ),
+        'strengths': _dedupe(s.get('strengths') for s, _ in entries),
+        'growth_areas': _dedupe(s.get('growth_areas') for s, _ in entries),
+        'red_flags': _dedupe(s.get('red_flags') for s, _ in entries),
+        'green_flags': _dedupe(s.get('green_flags') for s, _ in entries)
+    }
+
+
+def merge_window_analyses(results: Sequence[Optional[Dict]], weights: Sequence[int],
+                          latest_summary: bool = False) -> Optional[Dict]:
+    """
+    Reduce per-window analyses (oldest first; None for windows that failed)
+    into one analysis in the conversation schema. weights are the windows'
+    message counts. Returns None if no window produced a result.
+
+    The window summaries are joined, unless latest_summary is set: then the
+    newest one is used, so an analysis merged into over and over (incremental
+    updates) keeps a summary of constant size.
+    """
+    valid = [
+        (result, weight) for result, weight in zip(results, weights) if isinstance(result, dict)
+    ]
+    if not valid:
+        return None
+
+    speakers: Dict[str, List[Tuple[Dict, int]]] = {}
+    for result, weight in valid:
+        for analysis in result.get('speaker_analyses') or []:
+            if isinstance(analysis, dict) and analysis.get('speaker'):
+                speakers.setdefault(str(analysis['speaker']).strip().lower(), []).append((analysis, weight))
+
+    power = _sections(valid, 'power_dynamics')
+    relationship = _sections(valid, 'relationship_dynamics')
+    manipulation = _sections(valid, 'manipulation_check')
+
+    insights = []
+    seen_insights = set()
+    for result, _ in reversed(valid):
+        for insight in result.get('actionable_insights') or []:
+            if not isinstance(insight, dict):
+                continue
+            key = (str(insight.get('for_speaker')).lower(), str(insight.get('insight')).strip().lower())
+            if key not in seen_insights and len(insights) < LIST_LIMIT:
+                seen_insights.add(key)
+                insights.append(insight)
+
+    summaries = [result.get('summary') for result, _ in valid if isinstance(result.get('summary'), str)]
+    if latest_summary:
+        summaries = summaries[-1:]
+
+    return {
+        'summary': ' '.join(_dedupe([summaries], limit=len(summaries) or 1)),
+        'power_dynamics': {
+            'assessment': _latest(p.get('assessment') for p, _ in power),
+            'indicators': _dedupe(p.get('indicators') for p, _ in power),
+            'balance_score': _weighted_mean((p.get('balance_score'), w) for p, w in power)
+        },
+        'speaker_analyses': [_merge_speaker(entries) for entries in speakers.values()],
+        'relationship_dynamics': {
+            'overall_health': _majority((r.get('overall_health'), w) for r, w in relationship),
+            'patterns': _dedupe(r.get('patterns') for r, _ in relationship),
+            'conflict_style': _latest(r.get('conflict_style') for r, _ in relationship),
+            'resolution_potential': _majority((r.get('resolution_potential'), w) for r, w in relationship)
+        },
+        'manipulation_check': {
+            'detected': any(m.get('detected') is True for m, _ in manipulation),
+            'types': _dedupe(m.get('types') for m, _ in manipulation),
+            'examples': _dedupe(m.get('examples') for m, _ in manipulation),
+            'severity': _most_serious((m.get('severity') for m, _ in manipulation), SEVERITY_ORDER) or 'none'
+        },
+        # Most recent windows first: they describe where things stand now
+        'actionable_insights': insights,
+        'conversation_health_score': _weighted_mean(
+            ((result.get('conversation_health_score'), weight) for result, weight in valid), digits=0
+        ),
+        'follow_up_questions': _dedupe(result.get('follow_up_questions') for result, _ in valid)
+    }
+
+
+# =============================================================================
+# Incremental analysis state
+# =============================================================================
+
+def fingerprint_chain(messages: Sequence[Any], seed: str) -> List[str]:
+    """
+    Prefix hash chain: entry i fingerprints the first i+1 messages (and the
+    seed, e.g. speakers and prompt version), so a conversation with
+    messages appended shares every earlier entry.
+    """
+    chain = []
+    digest = hashlib.sha256(seed.encode('utf-8')).hexdigest()
+    for message in messages:
+        canonical = json.dumps(message, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        digest = hashlib.sha256(f"{digest}\n{canonical}".encode('utf-8')).hexdigest()
+        chain.append(digest)
+    return chain
+
+
+def compact_state(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of a prior analysis the model needs as context for new messages."""
+    speakers = []
+    for speaker in analysis.get('speaker_analyses') or []:
+        if not isinstance(speaker, dict):
+            continue
+        style = speaker.get('communication_style') or {}
+        attachment = speaker.get('attachment_indicators') or {}
+        speakers.append({
+            'speaker': speaker.get('speaker'),
+            'communication_style': style.get('primary') if isinstance(style, dict) else None,
+            'attachment_style': attachment.get('likely_style') if isinstance(attachment, dict) else None,
+            'behaviors': [
+                behavior.get('behavior_name') or behavior.get('behavior_id')
+                for behavior in speaker.get('behaviors_exhibited') or []
+                if isinstance(behavior, dict)
+            ][:LIST_LIMIT]
+        })
+    manipulation = analysis.get('manipulation_check') or {}
+    return {
+        'summary': analysis.get('summary'),
+        'speakers': speakers,
+        'manipulation_severity': manipulation.get('severity') if isinstance(manipulation, dict) else None,
+        'conversation_health_score': analysis.get('conversation_health_score')
+    }
+
+
+class ConversationStateStore:
+    """
+    Analysis state per conversation fingerprint, kept in the result cache
+    (and so in its shared tier when one is configured).
+
+    Each state is stored under the fingerprint of the conversation it
+    covers. A head pointer, keyed by the fingerprint of the first message,
+    records the latest state for that conversation. Finding the state for a
+    conversation with new messages then takes two lookups, however long the
+    conversation is.
+    """
+
+    ENDPOINT = 'conversation_state'
+
+    def __init__(self, cache, ttl: float):
+        self.cache = cache
+        self.ttl = ttl
+
+    def latest(self, chain: Sequence[str]) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """Return (message_count, analysis) of the newest stored prefix of chain, if any."""
+        if not chain:
+            return None
+        head = self.cache.get(f"conversation-head:{chain[0]}", self.ENDPOINT)
+        if head is None:
+            return None
+        pointer = json.loads(head)
+        count = pointer['messages']
+        # The pointer may belong to another conversation with the same first message
+        if count > len(chain) or chain[count - 1] != pointer['fingerprint']:
+            return None
+        state = self.cache.get(f"conversation-state:{pointer['fingerprint']}", self.ENDPOINT)
+        if state is None:
+            return None
+        return count, json.loads(state)
+
+    def save(self, chain: Sequence[str], analysis: Dict[str, Any]) -> None:
+        if not chain:
+            return
+        self.cache.set(
+            f"conversation-state:{chain[-1]}", json.dumps(analysis), self.ttl, self.ENDPOINT
+        )
+        self.cache.set(
+            f"conversation-head:{chain[0]}",
+            json.dumps({'messages': len(chain), 'fingerprint': chain[-1]}),
+            self.ttl, self.ENDPOINT
+        )
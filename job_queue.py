@@ -0,0 +1,281 @@
+"""
+Background jobs for long-running analyses.
+
+A request enqueues a job and returns its id at once; a pool of worker
+threads runs the job and the client polls (or long-polls) for the result.
+Jobs live in a local SQLite file (WAL mode), so every worker process on
+the instance shares the queue and queued jobs survive restarts. A running
+job holds a lease; if its worker dies, the lease expires and another
+worker picks the job up again.
+
+Payloads and results are encrypted at rest (see sqlite_store). Request
+payloads are removed once a job finishes, and results are kept only until
+result_ttl expires; delete() removes a job before then.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from sqlite_store import SQLiteDatabase, require_cipher
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+TERMINAL_STATUSES = (SUCCEEDED, FAILED)
+
+# Reported for failed jobs; details are only logged
+JOB_ERROR = "Analysis failed. Please try again."
+
+
+class JobQueue:
+    """Persistent job queue with a worker pool and a TTL-bounded result store."""
+
+    PURGE_INTERVAL = 60.0
+
+    def __init__(self, path: str, handler: Callable[[str, Any], Any], cipher,
+                 result_ttl: float = 3600.0, lease: float = 300.0,
+                 max_attempts: int = 2, poll_interval: float = 0.5):
+        """
+        handler(kind, payload) runs a job and returns its JSON-serializable
+        result; an exception marks the job failed. lease must exceed the
+        longest job. cipher encrypts payloads and results.
+        """
+        self.path = path
+        self.handler = handler
+        self.result_ttl = result_ttl
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.cipher = require_cipher(cipher, 'JobQueue')
+        self.poll_interval = poll_interval
+
+        self._db = SQLiteDatabase(path)
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._workers = []
+        self._last_purge = 0.0
+        self._counts = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'retried': 0}
+        self._counts_lock = threading.Lock()
+
+        self._db.connection().execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload BLOB, "
+            "status TEXT NOT NULL, result BLOB, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+            "lease_expires REAL, expires_at REAL)"
+        )
+        self._db.connection().execute(
+            "CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, created_at)"
+        )
+
+    def _count(self, name: str) -> None:
+        with self._counts_lock:
+            self._counts[name] += 1
+
+    def _encode(self, value: Any) -> bytes:
+        return self.cipher.encrypt(json.dumps(value).encode('utf-8'))
+
+    def _decode(self, blob: bytes) -> Any:
+        return json.loads(self.cipher.decrypt(blob))
+
+    # -- Producer side -------------------------------------------------------
+
+    def submit(self, kind: str, payload: Any) -> str:
+        """Queue a job and return its id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._db.connection().execute(
+            "INSERT INTO jobs (id, kind, payload, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, self._encode(payload), QUEUED, now, now)
+        )
+        self._count('submitted')
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job's status (and result or error once finished), or None."""
+        row = self._db.connection().execute(
+            "SELECT kind, status, result, error, created_at, updated_at, lease_expires, expires_at "
+            "FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        kind, status, result, error, created_at, updated_at, lease_expires, expires_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            return None
+        if status == RUNNING and lease_expires is not None and lease_expires <= now:
+            # Its worker died; the job is waiting to be picked up again
+            status = QUEUED
+
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'status': status,
+            'created_at': created_at,
+            'updated_at': updated_at
+        }
+        if status == SUCCEEDED:
+            job['result'] = self._decode(result)
+        elif status == FAILED:
+            job['error'] = error
+        if expires_at is not None:
+            job['expires_at'] = expires_at
+        return job
+
+    def delete(self, job_id: str) -> bool:
+        """Remove a job with its payload and result, whatever its status."""
+        cursor = self._db.connection().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return cursor.rowcount > 0
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: return the job once it finishes or timeout passes."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in TERMINAL_STATUSES or remaining <= 0:
+                return job
+            # Woken early by jobs finishing in this process; polls for other processes
+            with self._wakeup:
+                self._wakeup.wait(min(remaining, self.poll_interval))
+
+    # -- Worker side ---------------------------------------------------------
+
+    def claim(self) -> Optional[tuple]:
+        """
+        Atomically take the oldest runnable job: queued, or running with an
+        expired lease. Returns (job_id, kind, encoded payload) or None.
+        """
+        conn = self._db.connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts FROM jobs "
+                "WHERE status = ? OR (status = ? AND lease_expires <= ?) "
+                "ORDER BY created_at LIMIT 1",
+                (QUEUED, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            job_id, kind, payload, attempts = row
+            if attempts >= self.max_attempts:
+                # Its workers kept dying; do not let it take down more of them
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, payload = NULL, updated_at = ?, "
+                    "lease_expires = NULL, expires_at = ? WHERE id = ?",
+                    (FAILED, "Job was interrupted too many times", now, now + self.result_ttl, job_id)
+                )
+                conn.execute("COMMIT")
+                self._count('failed')
+                return self.claim()
+
+            if attempts:
+                self._count('retried')
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ?, "
+                "lease_expires = ? WHERE id = ?",
+                (RUNNING, now, now + self.lease, job_id)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id, kind, payload
+
+    def run_job(self, job_id: str, kind: str, payload: bytes) -> None:
+        """Run a claimed job and store its outcome."""
+        try:
+            result = self._encode(self.handler(kind, self._decode(payload)))
+        except Exception as e:
+            logger.error(f"Job {job_id} ({kind}) failed: {str(e)}")
+            self._finish(job_id, FAILED, error=JOB_ERROR)
+            self._count('failed')
+        else:
+            self._finish(job_id, SUCCEEDED, result=result)
+            self._count('succeeded')
+
+    def _finish(self, job_id: str, status: str, result: Optional[bytes] = None,
+                error: Optional[str] = None) -> None:
+        now = time.time()
+        self._db.connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, "
+            "updated_at = ?, lease_expires = NULL, expires_at = ? WHERE id = ?",
+            (status, result, error, now, now + self.result_ttl, job_id)
+        )
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def purge_expired(self) -> int:
+        """Delete finished jobs whose results have expired."""
+        cursor = self._db.connection().execute(
+            "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+    def _work(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() - self._last_purge > self.PURGE_INTERVAL:
+                    self._last_purge = time.monotonic()
+                    self.purge_expired()
+                claimed = self.claim()
+            except Exception as e:
+                logger.error(f"Job queue error: {str(e)}")
+                claimed = None
+
+            if claimed is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            try:
+                self.run_job(*claimed)
+            except Exception as e:
+                # Storing the outcome failed (e.g. the database is locked); keep the worker alive
+                logger.error(f"Job {claimed[0]} could not be completed: {str(e)}")
+                try:
+                    self._finish(claimed[0], FAILED, error=JOB_ERROR)
+                    self._count('failed')
+                except Exception as e:
+                    logger.error(f"Job {claimed[0]} left to its lease: {str(e)}")
+
+    def start(self, workers: int) -> None:
+        """Start worker threads (none when workers <= 0)."""
+        for index in range(max(workers, 0)):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self._workers.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._workers:
+            thread.join(timeout)
+        self._workers = []
+        self._stopping.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self._db.connection().execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        ).fetchall()
+        with self._counts_lock:
+            counts = dict(self._counts)
+        return {
+            'workers': len(self._workers),
+            'by_status': {status: count for status, count in rows},
+            **counts
+        }
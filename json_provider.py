@@ -0,0 +1,83 @@
+"""
+Fast JSON encoding for Flask responses.
+
+Every response body goes through app.json. OrjsonProvider swaps the
+stdlib encoder for orjson. It keeps Flask's output conventions: sorted
+keys, dates as HTTP dates, dataclasses as objects, indentation in debug
+mode. Values orjson cannot encode (integers over 64 bits) fall back to
+the stdlib encoder. Without orjson installed, or with JSON_PROVIDER=stdlib,
+Flask's own provider is used.
+
+encode() gives the same bytes for payloads that are encoded once and
+served many times, such as the behavior library snapshot.
+"""
+
+import json
+from typing import Any
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+PROVIDERS = ('orjson', 'stdlib')
+
+
+def encode(obj: Any) -> bytes:
+    """Compact UTF-8 JSON of a plain (json-compatible) value."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson."""
+
+    ensure_ascii = False
+
+    def _options(self, indent: bool = False) -> int:
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def _encode(self, obj: Any, indent: bool = False) -> bytes:
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options(indent))
+        except TypeError:
+            # orjson rejects some values json accepts, e.g. integers over 64 bits
+            text = super().dumps(obj, indent=2) if indent else super().dumps(obj, separators=(',', ':'))
+            return text.encode('utf-8')
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            # json.dumps options (indent, separators, cls...) need the stdlib encoder
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode('utf-8')
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._encode(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+def create_json_provider(app: Flask, name: str = 'orjson') -> DefaultJSONProvider:
+    """The named provider for app; stdlib when orjson is not installed."""
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown JSON provider '{name}'; use one of: {', '.join(PROVIDERS)}")
+    if name == 'orjson' and orjson is not None:
+        return OrjsonProvider(app)
+    return DefaultJSONProvider(app)
@@ -0,0 +1,464 @@
+"""
+Incremental parsing of streamed model output.
+
+Gemini streams a single JSON object in arbitrary text chunks. The
+SectionStreamParser scans the chunks as they arrive and reports each
+top-level member as soon as its value is complete, so the client can render
+`summary`, `power_dynamics`, ... while the rest is still being generated.
+Members named in `expand` (arrays such as `speaker_analyses`) are reported
+element by element instead of all at once.
+
+When the output is not valid JSON, JsonRepairParser recovers what it can
+rather than losing the whole result. It handles:
+
+- prose or code fences around the JSON, even prose with brackets in it;
+- trailing and missing commas;
+- quotes the model forgot to escape inside strings;
+- raw control characters and invalid escapes in strings;
+- output cut off at max_output_tokens.
+
+Truncated output gives the largest valid prefix: open objects and arrays
+are closed, and a value, key or element that was cut off is dropped. It
+parses incrementally, so a stream can be fed chunk by chunk as it arrives.
+"""
+
+import json
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+WHITESPACE = ' \t\r\n'
+
+
+class SectionStreamParser:
+    """Feed text chunks; get back completed top-level sections."""
+
+    def __init__(self, expand: Iterable[str] = ()):
+        self.expand = frozenset(expand)
+        self.text = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        # Top-level member state: 'key' -> 'colon' -> 'value'
+        self._member_state = 'key'
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        # Expanded array state
+        self._expanding = False
+        self._element_start: Optional[int] = None
+        self._element_index = 0
+        self.completed: List[str] = []
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Consume a chunk and return events for members completed by it:
+        {'type': 'section', 'key': ..., 'value': ...} or
+        {'type': 'item', 'key': ..., 'index': ..., 'value': ...}.
+        """
+        self.text += chunk
+        events: List[Dict[str, Any]] = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._member_state == 'key' and self._key_start is not None:
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._key_start = None
+                        self._member_state = 'colon'
+                continue
+
+            if not self._started:
+                if char == '{':
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._depth == 1:
+                if self._member_state == 'key':
+                    if char == '"':
+                        self._in_string = True
+                        self._key_start = i
+                    elif char == '}':
+                        self._depth = 0
+                    continue
+                if self._member_state == 'colon':
+                    if char == ':':
+                        self._member_state = 'value'
+                    continue
+                if self._value_start is None and char not in WHITESPACE:
+                    self._value_start = i
+                    if char == '[' and self._key in self.expand:
+                        self._expanding = True
+                        self._element_start = None
+                        self._element_index = 0
+
+            if self._expanding and self._depth == 2:
+                if self._element_start is None and char not in WHITESPACE + ',]':
+                    self._element_start = i
+                if char in ',]' and self._element_start is not None:
+                    event = self._complete_element(text[self._element_start:i])
+                    if event is not None:
+                        events.append(event)
+                    self._element_start = None
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    events.extend(self._complete_member(text[self._value_start:i] if self._value_start is not None else None))
+            elif char == ',' and self._depth == 1:
+                events.extend(self._complete_member(text[self._value_start:i]))
+
+        self._pos = len(text)
+        return events
+
+    def _complete_element(self, raw: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        event = {'type': 'item', 'key': self._key, 'index': self._element_index, 'value': value}
+        self._element_index += 1
+        return event
+
+    def _complete_member(self, raw: Optional[str]) -> List[Dict[str, Any]]:
+        key, expanding = self._key, self._expanding
+        self._member_state = 'key'
+        self._key = None
+        self._value_start = None
+        self._expanding = False
+        if key is None or raw is None:
+            return []
+        self.completed.append(key)
+        if expanding:
+            # Elements were already reported one by one
+            return []
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return []
+        return [{'type': 'section', 'key': key, 'value': value}]
+
+    @property
+    def finished(self) -> bool:
+        """True once the top-level object has closed."""
+        return self._started and self._depth == 0
+
+
+_SKIP_WHITESPACE = re.compile(r'[ \t\r\n]*')
+_ROOT_START = re.compile(r'[{\[]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_LITERAL = re.compile(r'[^ \t\r\n,:\]}"\[{]*')
+_ESCAPE = re.compile(r'\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})?')
+_VALUE_START = '"{[-0123456789tfnTFN'
+# A key on the same line, up to where its closing quote should be
+_KEY_AHEAD = re.compile(r'"(?:[^"\\\n]|\\.)*')
+_PYTHON_LITERALS = {'True': True, 'False': False, 'None': None}
+
+# Parse positions waiting for more input
+_WAIT = -1
+_INVALID = object()
+
+
+class RepairedJson(NamedTuple):
+    value: Any
+    # The input ended before the value did; its unfinished parts were dropped
+    partial: bool
+
+
+class JsonRepairParser:
+    """Feed text chunks of possibly broken JSON; finish() returns what was recovered."""
+
+    def __init__(self):
+        self.text = ''
+        self._pos = 0
+        self._root: Any = None
+        self._root_start = 0
+        self._done = False
+        # Open containers, innermost last: [container, pending key, expected token]
+        self._stack: List[list] = []
+        # String in progress: position of its opening quote, and unescaped quotes inside it
+        self._string_start: Optional[int] = None
+        self._string_quotes: List[int] = []
+
+    def feed(self, chunk: str) -> None:
+        self.text += chunk
+        self._parse(final=False)
+
+    def finish(self) -> Optional[RepairedJson]:
+        """
+        The recovered object, or None if the text contained none. An array
+        is returned only when no object follows its start: a bracket in
+        prose before the JSON ("Here is [the] analysis: {...}") would
+        otherwise hide the object the caller wants.
+        """
+        self._parse(final=True)
+        if self._root is None:
+            return None
+        repaired = RepairedJson(self._root, bool(self._stack))
+        if not isinstance(self._root, dict):
+            brace = self.text.find('{', self._root_start + 1)
+            if brace != -1:
+                retry = JsonRepairParser()
+                retry.feed(self.text[brace:])
+                candidate = retry.finish()
+                if candidate is not None and isinstance(candidate.value, dict):
+                    return candidate
+        return repaired
+
+    @property
+    def finished(self) -> bool:
+        """True once the top-level value has closed."""
+        return self._done
+
+    def _parse(self, final: bool) -> None:
+        text = self.text
+        end = len(text)
+        pos = self._pos
+        while pos < end and not self._done:
+            if self._string_start is not None:
+                pos = self._scan_string(pos, final)
+                if pos == _WAIT:
+                    return
+                continue
+            pos = _SKIP_WHITESPACE.match(text, pos).end()
+            if pos >= end:
+                break
+            if not self._stack:
+                # Skip prose and code fences before the value
+                match = _ROOT_START.search(text, pos)
+                if match is None:
+                    pos = end
+                    break
+                pos = match.start()
+                self._root_start = pos
+                self._open({} if text[pos] == '{' else [])
+                pos += 1
+                continue
+            pos = self._step(pos, final)
+            if pos == _WAIT:
+                return
+        self._pos = pos
+
+    def _step(self, pos: int, final: bool) -> int:
+        """Handle the structural token at pos; returns the next position."""
+        text = self.text
+        char = text[pos]
+        frame = self._stack[-1]
+        in_object = isinstance(frame[0], dict)
+        expect = frame[2]
+
+        if char in '}]':
+            self._close()
+            return pos + 1
+
+        if expect == 'comma':
+            if char == ',':
+                frame[2] = 'key' if in_object else 'value'
+                return pos + 1
+            # A missing comma: read the next member or element
+            if in_object and char == '"':
+                frame[2] = 'key'
+                return pos
+            if not in_object and char in _VALUE_START:
+                frame[2] = 'value'
+                return pos
+            return pos + 1
+
+        if expect == 'key':
+            if char == '"':
+                self._start_string(pos)
+            return pos + 1
+
+        if expect == 'colon':
+            if char == ':':
+                frame[2] = 'value'
+                return pos + 1
+            # A missing colon
+            frame[2] = 'value'
+            return pos
+
+        # expect == 'value'
+        if char == '"':
+            self._start_string(pos)
+            return pos + 1
+        if char in '{[':
+            self._open({} if char == '{' else [])
+            return pos + 1
+        if char in ',:':
+            if char == ',':
+                # A missing value
+                frame[1] = None
+                frame[2] = 'key' if in_object else 'value'
+            return pos + 1
+        literal_end = _LITERAL.match(text, pos).end()
+        if literal_end == len(text):
+            if not final:
+                self._pos = pos
+                return _WAIT
+            # Cut off: the number or literal may be incomplete
+            self._drop()
+            return literal_end
+        token = text[pos:literal_end]
+        try:
+            value = json.loads(token)
+        except ValueError:
+            value = _PYTHON_LITERALS.get(token, _INVALID)
+        if value is _INVALID:
+            self._drop()
+        else:
+            self._add(value)
+        return literal_end
+
+    def _open(self, container) -> None:
+        if self._stack:
+            self._add(container)
+        else:
+            self._root = container
+        self._stack.append([container, None, 'key' if isinstance(container, dict) else 'value'])
+
+    def _close(self) -> None:
+        self._stack.pop()
+        if not self._stack:
+            self._done = True
+
+    def _add(self, value: Any) -> None:
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict):
+            frame[0][frame[1]] = value
+            frame[1] = None
+        else:
+            frame[0].append(value)
+        frame[2] = 'comma'
+
+    def _drop(self) -> None:
+        """Skip an unusable value, and the key it belonged to."""
+        frame = self._stack[-1]
+        frame[1] = None
+        frame[2] = 'comma'
+
+    def _start_string(self, pos: int) -> None:
+        self._string_start = pos
+        self._string_quotes = []
+
+    def _scan_string(self, pos: int, final: bool) -> int:
+        text = self.text
+        end = len(text)
+        while True:
+            match = _STRING_SPECIAL.search(text, pos)
+            if match is None or (text[match.start()] == '\\' and match.start() + 1 >= end):
+                if not final:
+                    self._pos = match.start() if match is not None else end
+                    return _WAIT
+                # Cut off inside the string
+                self._string_start = None
+                self._drop()
+                return end
+            quote = match.start()
+            if text[quote] == '\\':
+                pos = quote + 2
+                continue
+            closes = self._closes_string(quote + 1, final)
+            if closes is None:
+                self._pos = quote
+                return _WAIT
+            if closes:
+                self._end_string(quote)
+                return quote + 1
+            # An unescaped quote inside the string
+            self._string_quotes.append(quote)
+            pos = quote + 1
+
+    def _closes_string(self, pos: int, final: bool) -> Optional[bool]:
+        """Whether the quote before pos ends the string; None until that can be told."""
+        text = self.text
+        start = pos
+        pos = _SKIP_WHITESPACE.match(text, pos).end()
+        if pos >= len(text):
+            return True if final else None
+        char = text[pos]
+        frame = self._stack[-1]
+        if frame[2] == 'key':
+            # Also a key directly followed by its value (a missing colon)
+            return char in ':,}' or char in _VALUE_START
+        if char in '}]':
+            return True
+        if char == '"' and pos > start:
+            # A missing comma before the next member or element
+            if isinstance(frame[0], dict):
+                return self._key_follows(pos, final)
+            return True
+        if char != ',':
+            return False
+        pos = _SKIP_WHITESPACE.match(text, pos + 1).end()
+        if pos >= len(text):
+            return True if final else None
+        if isinstance(frame[0], dict):
+            return text[pos] in '"}'
+        return text[pos] in _VALUE_START or text[pos] == ']'
+
+    def _key_follows(self, pos: int, final: bool) -> Optional[bool]:
+        """Whether a `"key":` starts at pos; None until that can be told."""
+        text = self.text
+        close = _KEY_AHEAD.match(text, pos).end()
+        if close >= len(text) or (text[close] == '\\' and close + 1 >= len(text)):
+            return False if final else None
+        if text[close] != '"':
+            return False
+        colon = _SKIP_WHITESPACE.match(text, close + 1).end()
+        if colon >= len(text):
+            return False if final else None
+        return text[colon] == ':'
+
+    def _end_string(self, quote: int) -> None:
+        start = self._string_start + 1
+        self._string_start = None
+        pieces = []
+        for inner in self._string_quotes:
+            pieces.append(self.text[start:inner])
+            pieces.append('\\"')
+            start = inner + 1
+        pieces.append(self.text[start:quote])
+        raw = ''.join(pieces)
+
+        value: Any = raw
+        if '\\' in raw:
+            try:
+                value = json.loads(f'"{raw}"', strict=False)
+            except ValueError:
+                try:
+                    value = json.loads('"' + _ESCAPE.sub(_fix_escape, raw) + '"', strict=False)
+                except ValueError:
+                    self._drop()
+                    return
+
+        frame = self._stack[-1]
+        if frame[2] == 'key':
+            frame[1] = value
+            frame[2] = 'colon'
+        else:
+            self._add(value)
+
+
+def _fix_escape(match) -> str:
+    """Keep valid escapes; make a lone backslash literal."""
+    return match.group() if len(match.group()) > 1 else '\\\\'
+
+
+def repair_json(text: str) -> Optional[RepairedJson]:
+    """Recover the JSON object (or else array) in text; None if there is none."""
+    parser = JsonRepairParser()
+    parser.feed(text)
+    return parser.finish()
@@ -0,0 +1,146 @@
+"""
+Registry of pre-built Gemini model clients.
+
+Building a GenerativeModel and its GenerationConfig on every request is
+wasted work, and a model's first call also sets up the underlying API
+client (gRPC channel, TLS handshake). The registry builds one model object
+per (model name, generation config) when the worker starts and hands the
+same objects to every request. All of them share the process-wide API
+client, which a warm-up probe connects ahead of the first real request
+and can keep alive while the worker is idle.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Thread-safe cache of model objects keyed by (model name, generation config)."""
+
+    def __init__(self, factory: Callable[[str, Dict[str, Any]], Any]):
+        """factory(model_name, generation_config) builds a model object."""
+        self.factory = factory
+        self._models: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._warm_thread: Optional[threading.Thread] = None
+        self._counts = {'built': 0, 'reused': 0, 'warmups': 0, 'warmup_errors': 0}
+        self._warmup_ms: Dict[str, float] = {}
+
+    @staticmethod
+    def key(model_name: str, generation_config: Dict[str, Any]) -> Tuple[str, str]:
+        return model_name, json.dumps(generation_config, sort_keys=True)
+
+    def get(self, model_name: str, generation_config: Dict[str, Any]) -> Any:
+        """Return the shared model object for this configuration, building it once."""
+        key = self.key(model_name, generation_config)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._counts['reused'] += 1
+                return model
+            model = self._models[key] = self.factory(model_name, generation_config)
+            self._counts['built'] += 1
+            return model
+
+    def preload(self, configs: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Build the models for every (model name, generation config) up front.
+        A configuration that fails to build is logged and left to get(), so
+        the error surfaces on the requests that use it.
+        """
+        for model_name, generation_config in configs:
+            key = self.key(model_name, generation_config)
+            with self._lock:
+                if key in self._models:
+                    continue
+                try:
+                    self._models[key] = self.factory(model_name, generation_config)
+                except Exception as e:
+                    logger.warning(f"Could not pre-build model {model_name}: {str(e)}")
+                    continue
+                self._counts['built'] += 1
+
+    def warm_up(self, probe: Callable[[Any], Any]) -> None:
+        """
+        Run probe (a cheap call such as count_tokens) once per model name,
+        connecting the shared API client before real traffic needs it.
+        """
+        for model_name, model in self._models_by_name().items():
+            start = time.perf_counter()
+            try:
+                probe(model)
+            except Exception as e:
+                self._record_warm_up(model_name, None, e)
+                continue
+            self._record_warm_up(model_name, start)
+
+    async def warm_up_async(self, probe: Callable[[Any], Awaitable[Any]]) -> None:
+        """warm_up for the async API client used by the aiohttp server."""
+        for model_name, model in self._models_by_name().items():
+            start = time.perf_counter()
+            try:
+                await probe(model)
+            except Exception as e:
+                self._record_warm_up(model_name, None, e)
+                continue
+            self._record_warm_up(model_name, start)
+
+    def _models_by_name(self) -> Dict[str, Any]:
+        with self._lock:
+            by_name: Dict[str, Any] = {}
+            for (model_name, _), model in self._models.items():
+                by_name.setdefault(model_name, model)
+            return by_name
+
+    def _record_warm_up(self, model_name: str, start: Optional[float],
+                        error: Optional[Exception] = None) -> None:
+        with self._lock:
+            if error is not None:
+                logger.warning(f"Model warm-up failed for {model_name}: {str(error)}")
+                self._counts['warmup_errors'] += 1
+                return
+            self._counts['warmups'] += 1
+            self._warmup_ms[model_name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def start_warm_up(self, probe: Callable[[Any], Any], keepalive_interval: float = 0) -> None:
+        """
+        Warm up in the background so worker start is not delayed. With a
+        keepalive interval, repeat the probe so idle connections stay open.
+        """
+        if self._warm_thread is not None:
+            return
+
+        def run() -> None:
+            self.warm_up(probe)
+            while keepalive_interval > 0 and not self._stop.wait(keepalive_interval):
+                self.warm_up(probe)
+
+        self._warm_thread = threading.Thread(target=run, name='model-warm-up', daemon=True)
+        self._warm_thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._warm_thread is not None:
+            self._warm_thread.join(timeout=5)
+            self._warm_thread = None
+        self._stop.clear()
+
+    def clear(self) -> None:
+        """Drop every model (e.g. after the API client is reconfigured)."""
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'models': len(self._models),
+                'model_names': sorted({name for name, _ in self._models}),
+                'warmup_ms': dict(self._warmup_ms),
+                **self._counts
+            }
@@ -0,0 +1,210 @@
+"""
+Per-request routing between the fast and the thorough Gemini model.
+
+Each endpoint has a default tier and an input size up to which the fast
+tier is good enough. A request can ask for a tier, exclude tiers, or give
+a depth ('quick' or 'deep'). Live per-model statistics then adjust the
+choice:
+
+- when the chosen model keeps failing, the route moves to a healthy one.
+  Its error rate decays while no new errors come in, so it is back in
+  rotation once it has been quiet for a while;
+- when the slow model is running over the endpoint's latency target, the
+  route moves borderline inputs to the fast model.
+
+Every decision is logged and kept in a bounded in-memory log, so the
+thresholds can be tuned from real traffic.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Requested depth -> tier
+DEPTH_TIERS = {'quick': 'flash', 'deep': 'pro'}
+DEPTHS = ('quick', 'standard', 'deep')
+
+
+class RoutingPolicy(NamedTuple):
+    default_tier: str
+    # Inputs up to this many estimated tokens go to the fast tier
+    fast_max_tokens: int = 0
+    # Seconds; above this EWMA latency, borderline inputs go to the fast tier
+    latency_target: float = 0.0
+
+
+class RoutingDecision(NamedTuple):
+    endpoint: str
+    tier: str
+    model: str
+    reason: str
+    input_tokens: int
+
+
+class ModelStats:
+    """
+    Exponentially weighted latency and error rate of one model. The error
+    rate also halves every error_half_life seconds since it was last
+    updated, so a model that gets no calls after failing over recovers.
+    """
+
+    __slots__ = ('calls', 'errors', 'latency', 'error_rate', 'updated')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.updated = time.monotonic()
+
+    def current_error_rate(self, half_life: float, now: Optional[float] = None) -> float:
+        elapsed = (time.monotonic() if now is None else now) - self.updated
+        return self.error_rate * 0.5 ** (max(elapsed, 0.0) / half_life)
+
+    def record(self, seconds: float, ok: bool, alpha: float, half_life: float) -> None:
+        now = time.monotonic()
+        self.calls += 1
+        if ok:
+            self.latency = seconds if self.latency is None else (1 - alpha) * self.latency + alpha * seconds
+        else:
+            self.errors += 1
+        error_rate = self.current_error_rate(half_life, now)
+        self.error_rate = (1 - alpha) * error_rate + alpha * (0.0 if ok else 1.0)
+        self.updated = now
+
+    def to_dict(self, half_life: float) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'ewma_latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'ewma_error_rate': round(self.current_error_rate(half_life), 3)
+        }
+
+
+class ModelRouter:
+    """Chooses a model tier per request; thread-safe."""
+
+    def __init__(self, tiers: Dict[str, str], policies: Dict[str, RoutingPolicy],
+                 alpha: float = 0.2, error_threshold: float = 0.5, min_calls: int = 5,
+                 error_half_life: float = 30.0, log_size: int = 200):
+        """
+        tiers maps tier name to model name, fastest first. A model counts as
+        unhealthy once its EWMA error rate reaches error_threshold over at
+        least min_calls calls, until the rate has decayed back below it
+        (halving every error_half_life seconds).
+        """
+        self.tiers = dict(tiers)
+        self.policies = dict(policies)
+        self.alpha = alpha
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.error_half_life = error_half_life
+        self._lock = threading.Lock()
+        self._models: Dict[str, ModelStats] = {}
+        self._log: deque = deque(maxlen=log_size)
+        self._counts: Counter = Counter()
+
+    def tier_of(self, model: str) -> Optional[str]:
+        return next((tier for tier, name in self.tiers.items() if name == model), None)
+
+    def route(self, endpoint: str, input_tokens: int, tier: Optional[str] = None,
+              depth: Optional[str] = None, exclude: Iterable[str] = ()) -> RoutingDecision:
+        """
+        Pick the tier for one request. Raises ValueError for an unknown tier
+        or depth, or when the request excludes every usable tier.
+        """
+        excluded = set(exclude)
+        for name in list(excluded) + ([tier] if tier is not None else []):
+            if name not in self.tiers:
+                raise ValueError(f"Unknown model tier '{name}'; use one of: {', '.join(self.tiers)}")
+        if depth is not None and depth not in DEPTHS:
+            raise ValueError(f"Unknown depth '{depth}'; use one of: {', '.join(DEPTHS)}")
+        allowed = [name for name in self.tiers if name not in excluded]
+        if tier is not None and tier in excluded:
+            raise ValueError(f"Model tier '{tier}' is both requested and excluded")
+        if not allowed:
+            raise ValueError("Every model tier is excluded")
+
+        if tier is not None:
+            return self._decide(endpoint, tier, 'requested', input_tokens)
+
+        policy = self.policies[endpoint]
+        if depth in DEPTH_TIERS:
+            chosen, reason = DEPTH_TIERS[depth], f"{depth} depth"
+        elif input_tokens <= policy.fast_max_tokens:
+            chosen, reason = self.fastest(), 'small input'
+        else:
+            chosen, reason = policy.default_tier, 'endpoint default'
+            fast = self.fastest()
+            if (chosen != fast and policy.latency_target and input_tokens <= 2 * policy.fast_max_tokens
+                    and self._over_latency(chosen, policy.latency_target)):
+                chosen, reason = fast, 'latency target'
+
+        if chosen not in allowed:
+            chosen, reason = allowed[0], f"{reason}; {chosen} excluded"
+        if not self._healthy(chosen):
+            healthy = [name for name in allowed if name != chosen and self._healthy(name)]
+            if healthy:
+                chosen, reason = healthy[0], f"{reason}; failover from {chosen}"
+        return self._decide(endpoint, chosen, reason, input_tokens)
+
+    def fastest(self) -> str:
+        return next(iter(self.tiers))
+
+    def _stats(self, tier: str) -> Optional[ModelStats]:
+        return self._models.get(self.tiers[tier])
+
+    def _healthy(self, tier: str) -> bool:
+        with self._lock:
+            stats = self._stats(tier)
+            return (stats is None or stats.calls < self.min_calls
+                    or stats.current_error_rate(self.error_half_life) < self.error_threshold)
+
+    def _over_latency(self, tier: str, target: float) -> bool:
+        with self._lock:
+            stats = self._stats(tier)
+            return stats is not None and stats.latency is not None and stats.latency > target
+
+    def _decide(self, endpoint: str, tier: str, reason: str, input_tokens: int) -> RoutingDecision:
+        decision = RoutingDecision(endpoint, tier, self.tiers[tier], reason, input_tokens)
+        logger.info(f"Routed {endpoint} (~{input_tokens} input tokens) to {decision.model}: {reason}")
+        with self._lock:
+            self._log.append({'time': time.time(), **decision._asdict()})
+            self._counts[(endpoint, tier)] += 1
+        return decision
+
+    def record(self, model: str, seconds: float, ok: bool) -> None:
+        """Record the outcome of one model call."""
+        with self._lock:
+            stats = self._models.get(model)
+            if stats is None:
+                stats = self._models[model] = ModelStats()
+            stats.record(seconds, ok, self.alpha, self.error_half_life)
+
+    def decisions(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """The most recent routing decisions, newest first."""
+        with self._lock:
+            return list(self._log)[::-1][:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._models.clear()
+            self._log.clear()
+            self._counts.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            routed: Dict[str, Dict[str, int]] = {}
+            for (endpoint, tier), count in self._counts.items():
+                routed.setdefault(endpoint, {})[tier] = count
+            return {
+                'tiers': dict(self.tiers),
+                'models': {
+                    model: stats.to_dict(self.error_half_life) for model, stats in self._models.items()
+                },
+                'routed': routed
+            }
@@ -0,0 +1,93 @@
+"""
+Server-side rolling profile summaries for incremental profile analysis.
+
+The device sends its whole conversation history on every profile
+refresh. When the client opts in with an opaque profile hash, the server
+keeps the latest profile analysis for that hash together with the
+fingerprint of the conversations it covers. The next refresh then folds
+only the conversations added since into that summary, instead of asking
+the model to rebuild the profile from hundreds of conversations.
+
+States are kept encrypted in a local SQLite file shared by the worker
+processes on the instance (see sqlite_store), and expire after ttl
+seconds without a refresh.
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlite_store import SQLiteDatabase, require_cipher
+
+
+class ProfileState(NamedTuple):
+    """The profile analysis of the first `conversations` conversations."""
+    analysis: Dict[str, Any]
+    conversations: int
+    fingerprint: str
+
+
+class ProfileStateStore:
+    """Encrypted rolling profile summaries keyed by profile hash."""
+
+    def __init__(self, path: str, cipher, ttl: float = 30 * 24 * 3600):
+        self.path = path
+        self.cipher = require_cipher(cipher, 'ProfileStateStore')
+        self.ttl = ttl
+
+        self._db = SQLiteDatabase(path)
+        self._counts = {'hits': 0, 'misses': 0, 'saved': 0}
+        self._counts_lock = threading.Lock()
+
+        self._db.connection().execute(
+            "CREATE TABLE IF NOT EXISTS profile_states ("
+            "profile_hash TEXT PRIMARY KEY, state BLOB NOT NULL, conversations INTEGER NOT NULL, "
+            "fingerprint TEXT NOT NULL, updated_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _count(self, name: str) -> None:
+        with self._counts_lock:
+            self._counts[name] += 1
+
+    def get(self, profile_hash: str) -> Optional[ProfileState]:
+        row = self._db.connection().execute(
+            "SELECT state, conversations, fingerprint FROM profile_states "
+            "WHERE profile_hash = ? AND expires_at > ?",
+            (profile_hash, time.time())
+        ).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+        state, conversations, fingerprint = row
+        self._count('hits')
+        return ProfileState(json.loads(self.cipher.decrypt(state)), conversations, fingerprint)
+
+    def save(self, profile_hash: str, state: ProfileState) -> None:
+        data = json.dumps(state.analysis).encode('utf-8')
+        now = time.time()
+        self._db.connection().execute(
+            "INSERT OR REPLACE INTO profile_states "
+            "(profile_hash, state, conversations, fingerprint, updated_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (profile_hash, self.cipher.encrypt(data), state.conversations, state.fingerprint,
+             now, now + self.ttl)
+        )
+        self._count('saved')
+
+    def delete(self, profile_hash: str) -> bool:
+        cursor = self._db.connection().execute(
+            "DELETE FROM profile_states WHERE profile_hash = ?", (profile_hash,)
+        )
+        return cursor.rowcount > 0
+
+    def purge_expired(self) -> int:
+        cursor = self._db.connection().execute(
+            "DELETE FROM profile_states WHERE expires_at <= ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        (stored,) = self._db.connection().execute("SELECT COUNT(*) FROM profile_states").fetchone()
+        with self._counts_lock:
+            return {'stored': stored, **self._counts}
@@ -0,0 +1,184 @@
+"""
+Compiled prompt templates with token estimates and budgets.
+
+Each template is split once, at import, into static segments and named
+slots, so building a prompt is a single join rather than one str.replace
+copy per placeholder. Slot values are never re-scanned for placeholders,
+so user text containing '{conversation}' stays literal.
+
+Token counts are estimated from character length (Gemini averages about
+four characters per token for English text). This estimate is used to
+report prompt sizes before sending and to fit conversations into
+per-endpoint budgets. A conversation is trimmed by dropping its oldest
+messages or lines, rather than cutting the serialized text at an
+arbitrary character.
+"""
+
+import json
+import re
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class RenderedPrompt(NamedTuple):
+    text: str
+    static_tokens: int
+    slot_tokens: Dict[str, int]
+
+    @property
+    def total_tokens(self) -> int:
+        return self.static_tokens + sum(self.slot_tokens.values())
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            'estimated_tokens': self.total_tokens,
+            'static_tokens': self.static_tokens,
+            'slot_tokens': dict(self.slot_tokens)
+        }
+
+
+class PromptTemplate:
+    """A prompt template split once into static segments and named slots."""
+
+    def __init__(self, template: str, slots: Sequence[str]):
+        pattern = re.compile('|'.join(re.escape('{' + name + '}') for name in slots))
+        self.parts: List[Tuple[bool, str]] = []
+        position = 0
+        for match in pattern.finditer(template):
+            if match.start() > position:
+                self.parts.append((False, template[position:match.start()]))
+            self.parts.append((True, match.group()[1:-1]))
+            position = match.end()
+        if position < len(template):
+            self.parts.append((False, template[position:]))
+
+        self.slots = tuple(slots)
+        missing = set(self.slots) - {text for is_slot, text in self.parts if is_slot}
+        if missing:
+            raise ValueError(f"Template has no slot for: {', '.join(sorted(missing))}")
+        self.static_tokens = estimate_tokens(''.join(text for is_slot, text in self.parts if not is_slot))
+
+    def slot_budget(self, budget_tokens: int, **other_values: str) -> int:
+        """Tokens left for the remaining slot once the static text and other slots are counted."""
+        used = self.static_tokens + sum(estimate_tokens(value) for value in other_values.values())
+        return max(budget_tokens - used, 0)
+
+    def render(self, **values: str) -> RenderedPrompt:
+        """Assemble the prompt in one pass; every slot must be given."""
+        text = ''.join(values[text] if is_slot else text for is_slot, text in self.parts)
+        return RenderedPrompt(
+            text,
+            self.static_tokens,
+            {name: estimate_tokens(values[name]) for name in self.slots}
+        )
+
+
+class Trimmed(NamedTuple):
+    """
+    A value fitted to a token budget: kept of total units survived. text is
+    the value's JSON when fitting it already produced that.
+    """
+    value: Any
+    kept: int
+    total: int
+    unit: str
+    text: Optional[str] = None
+
+    @property
+    def dropped(self) -> int:
+        return self.total - self.kept
+
+
+def keep_latest(sizes: Sequence[int], budget_chars: int, separator: int) -> int:
+    """Index of the oldest item that can be kept so the newest items fit the budget."""
+    used = 0
+    start = len(sizes)
+    while start > 0:
+        cost = sizes[start - 1] + (separator if start < len(sizes) else 0)
+        if used + cost > budget_chars:
+            break
+        used += cost
+        start -= 1
+    return start
+
+
+def fit_to_budget(value: Any, budget_tokens: int) -> Trimmed:
+    """
+    Fit a conversation to budget_tokens of serialized size by dropping its
+    oldest parts: list entries, lines of text, or entries of the largest
+    list inside an object (e.g. a profile's past conversations). When not
+    even the newest part fits, its text is cut to the budget.
+    """
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+
+    if isinstance(value, str):
+        if len(value) <= budget_chars:
+            lines = value.count('\n') + 1
+            return Trimmed(value, lines, lines, 'lines')
+        lines = value.split('\n')
+        start = keep_latest([len(line) for line in lines], budget_chars, 1)
+        if start == len(lines):
+            return Trimmed(lines[-1][-budget_chars:] if budget_chars else '', 1, len(lines), 'lines')
+        return Trimmed('\n'.join(lines[start:]), len(lines) - start, len(lines), 'lines')
+
+    if isinstance(value, list):
+        pieces = [json.dumps(item) for item in value]
+        # '[' + ', '.join(pieces) + ']'
+        start = keep_latest([len(piece) for piece in pieces], max(budget_chars - 2, 0), 2)
+        if start == len(value) and value:
+            return Trimmed([_cut_message(value[-1], budget_chars)], 1, len(value), 'messages')
+        kept = value[start:]
+        return Trimmed(kept, len(kept), len(value), 'messages', '[' + ', '.join(pieces[start:]) + ']')
+
+    if isinstance(value, dict):
+        lists = {key: item for key, item in value.items() if isinstance(item, list) and item}
+        text = json.dumps(value)
+        if not lists or estimate_tokens(text) <= budget_tokens:
+            return Trimmed(value, 1, 1, 'entries', text)
+        key = max(lists, key=lambda name: len(json.dumps(lists[name])))
+        rest_tokens = estimate_tokens(json.dumps({**value, key: []}))
+        inner = fit_to_budget(lists[key], max(budget_tokens - rest_tokens, 0))
+        return Trimmed({**value, key: inner.value}, inner.kept, inner.total, key)
+
+    return Trimmed(value, 1, 1, 'entries')
+
+
+def _cut_message(message: Any, budget_chars: int) -> Any:
+    """Keep the end of a single oversized message."""
+    if isinstance(message, str):
+        return message[-budget_chars:] if budget_chars else ''
+    if isinstance(message, dict) and isinstance(message.get('text'), str):
+        overhead = len(json.dumps({**message, 'text': ''}))
+        keep = max(budget_chars - overhead, 0)
+        return {**message, 'text': message['text'][-keep:] if keep else ''}
+    return message
+
+
+class PromptStats:
+    """Per-endpoint estimated prompt sizes and trimming counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, prompt: RenderedPrompt, trimmed: Optional[Trimmed] = None) -> None:
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'prompts': 0, 'estimated_tokens': 0, 'max_estimated_tokens': 0, 'trimmed': 0
+            })
+            stats['prompts'] += 1
+            stats['estimated_tokens'] += prompt.total_tokens
+            stats['max_estimated_tokens'] = max(stats['max_estimated_tokens'], prompt.total_tokens)
+            if trimmed is not None and trimmed.dropped:
+                stats['trimmed'] += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._endpoints.items()}
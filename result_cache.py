@@ -0,0 +1,392 @@
+"""
+Content-addressed cache for Gemini analysis results.
+
+Results are keyed by a hash of the final prompt, model name and generation
+config, so byte-identical requests (including client retries) are answered
+from memory instead of a paid, multi-second model call. The cache is an LRU
+bounded by both entry count and total size, with per-endpoint TTLs and
+hit/miss counters.
+
+A shared second-level tier (Redis across instances, or SQLite across the
+workers of one instance) can sit behind the in-memory LRU so the hit rate
+scales with the fleet instead of each worker starting cold. Shared values
+are zlib-compressed and stored with a TTL.
+"""
+
+import hashlib
+import json
+import logging
+import struct
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sqlite_store import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+
+def result_cache_key(model_name: str, generation_config: Dict[str, Any], prompt: str) -> str:
+    """Hash the inputs that fully determine a model response."""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(json.dumps(generation_config, sort_keys=True).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(prompt.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CacheStats:
+    """Hit/miss counters for one endpoint."""
+
+    __slots__ = ('hits', 'misses', 'stores', 'evictions', 'expirations')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class ResultCache:
+    """Thread-safe in-memory LRU of response texts with TTLs and a memory cap."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 10000):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, CacheStats] = {}
+
+    def _stats_for(self, endpoint: str) -> CacheStats:
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats[endpoint] = CacheStats()
+        return stats
+
+    def get(self, key: str, endpoint: str = 'default') -> Optional[str]:
+        """Return the cached value for key, or None on a miss or expiry."""
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats_for(endpoint)
+            entry = self._entries.get(key)
+            if entry is None:
+                stats.misses += 1
+                return None
+            value, expires_at, size, owner = entry
+            if expires_at <= now:
+                self._remove(key)
+                self._stats_for(owner).expirations += 1
+                stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            stats.hits += 1
+            return value
+
+    def set(self, key: str, value: str, ttl: float, endpoint: str = 'default') -> None:
+        """Store value for ttl seconds, evicting least recently used entries as needed."""
+        size = len(value.encode('utf-8'))
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, size, endpoint)
+            self._size += size
+            self._stats_for(endpoint).stores += 1
+            while self._size > self.max_bytes or len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                owner = self._entries[oldest][3]
+                self._remove(oldest)
+                self._stats_for(owner).evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._size -= entry[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._stats.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters per endpoint plus overall size."""
+        with self._lock:
+            endpoints = {name: stats.to_dict() for name, stats in self._stats.items()}
+            hits = sum(stats.hits for stats in self._stats.values())
+            misses = sum(stats.misses for stats in self._stats.values())
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                'endpoints': endpoints,
+            }
+
+
+# =============================================================================
+# SHARED CACHE TIER
+# =============================================================================
+
+class CacheBackend(ABC):
+    """Interface for a shared cache tier storing bytes with a TTL."""
+
+    name = 'none'
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """The value of key, or None if absent or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Store value under key for ttl seconds."""
+
+    @abstractmethod
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Set key only if absent (or expired). Returns True if it was set."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove key if present."""
+
+    @abstractmethod
+    def delete_if(self, key: str, value: bytes) -> bool:
+        """Delete key only if it still holds value. Returns True if it was deleted."""
+
+
+class RedisCacheBackend(CacheBackend):
+    """Shared tier backed by Redis, visible to every instance."""
+
+    name = 'redis'
+
+    # Compare-and-delete in one server-side step
+    DELETE_IF_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('del', KEYS[1]) else return 0 end"
+    )
+
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = 'text-decoder:result:'):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return bool(self.client.set(self.prefix + key, value, ex=max(1, int(ttl)), nx=True))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        return bool(self.client.eval(self.DELETE_IF_SCRIPT, 1, self.prefix + key, value))
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Shared tier in a local SQLite file (WAL mode), visible to every worker
+    on the instance. Also serves as a Redis stand-in for tests.
+    """
+
+    name = 'sqlite'
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = SQLiteDatabase(path)
+        self._writes = 0
+        self._db.connection().execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._db.connection().execute(
+            "SELECT value FROM result_cache WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        conn = self._db.connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO result_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM result_cache WHERE expires_at <= ?", (time.time(),))
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        conn = self._db.connection()
+        now = time.time()
+        conn.execute("DELETE FROM result_cache WHERE key = ? AND expires_at <= ?", (key, now))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO result_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, now + ttl)
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key: str) -> None:
+        self._db.connection().execute("DELETE FROM result_cache WHERE key = ?", (key,))
+
+    def delete_if(self, key: str, value: bytes) -> bool:
+        cursor = self._db.connection().execute(
+            "DELETE FROM result_cache WHERE key = ? AND value = ?", (key, value)
+        )
+        return cursor.rowcount == 1
+
+
+# Shared values: 8-byte big-endian expiry timestamp followed by zlib data
+_SHARED_HEADER = struct.Struct('>d')
+
+
+def encode_shared_value(value: str, expires_at: float) -> bytes:
+    return _SHARED_HEADER.pack(expires_at) + zlib.compress(value.encode('utf-8'), 6)
+
+
+def decode_shared_value(blob: bytes) -> tuple:
+    """Return (value, expires_at)."""
+    (expires_at,) = _SHARED_HEADER.unpack_from(blob)
+    return zlib.decompress(blob[_SHARED_HEADER.size:]).decode('utf-8'), expires_at
+
+
+class TieredResultCache:
+    """
+    In-memory LRU in front of a shared backend.
+    Shared-tier failures are logged and treated as misses so an outage
+    never fails a request.
+    """
+
+    def __init__(self, local: ResultCache, backend: CacheBackend):
+        self.local = local
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._shared = {'hits': 0, 'misses': 0, 'errors': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._shared[name] += 1
+
+    def get(self, key: str, endpoint: str = 'default') -> Optional[str]:
+        value = self.local.get(key, endpoint)
+        if value is not None:
+            return value
+
+        try:
+            blob = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Shared cache read failed: {str(e)}")
+            self._count('errors')
+            return None
+        if blob is None:
+            self._count('misses')
+            return None
+
+        try:
+            value, expires_at = decode_shared_value(blob)
+        except (struct.error, zlib.error, UnicodeDecodeError) as e:
+            logger.warning(f"Discarding corrupt shared cache entry: {str(e)}")
+            self._count('errors')
+            return None
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        self.local.set(key, value, remaining, endpoint)
+        return value
+
+    def peek_shared(self, key: str, endpoint: str = 'default') -> Optional[str]:
+        """
+        Read the shared tier without touching hit/miss counters.
+        Used while waiting on another worker's in-flight call.
+        """
+        try:
+            blob = self.backend.get(key)
+            if blob is None:
+                return None
+            value, expires_at = decode_shared_value(blob)
+        except Exception:
+            return None
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            return None
+        self.local.set(key, value, remaining, endpoint)
+        return value
+
+    def set(self, key: str, value: str, ttl: float, endpoint: str = 'default') -> None:
+        self.local.set(key, value, ttl, endpoint)
+        if ttl <= 0:
+            return
+        try:
+            self.backend.set(key, encode_shared_value(value, time.time() + ttl), ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed: {str(e)}")
+            self._count('errors')
+
+    def clear(self) -> None:
+        """Clear this worker's tier and counters. The shared tier is left alone."""
+        self.local.clear()
+        with self._lock:
+            self._shared = {'hits': 0, 'misses': 0, 'errors': 0}
+
+    def __len__(self) -> int:
+        return len(self.local)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.local.stats()
+        with self._lock:
+            stats['shared'] = {'backend': self.backend.name, **self._shared}
+        return stats
+
+
+def create_result_cache(max_bytes: int, backend: str = 'memory',
+                        redis_url: Optional[str] = None, sqlite_path: Optional[str] = None):
+    """
+    Build the result cache for this worker.
+    backend is 'memory' (per-worker only), 'sqlite' or 'redis'.
+    Falls back to memory-only if the shared backend cannot be created.
+    """
+    local = ResultCache(max_bytes=max_bytes)
+    try:
+        if backend == 'redis' and redis_url:
+            return TieredResultCache(local, RedisCacheBackend(redis_url))
+        if backend == 'sqlite' and sqlite_path:
+            return TieredResultCache(local, SQLiteCacheBackend(sqlite_path))
+    except Exception as e:
+        logger.error(f"Shared result cache unavailable, using memory only: {str(e)}")
+        return local
+    if backend != 'memory':
+        logger.warning(f"Result cache backend '{backend}' is not configured, using memory only")
+    return local
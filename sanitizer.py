@@ -0,0 +1,81 @@
+"""
+Markup stripping for user text, with a fast path for plain text.
+
+bleach.clean builds a full HTML5 parse tree for every call, even when the
+text contains no markup at all, which is nearly always the case for chat
+transcripts. bleach only ever changes a handful of characters: '<', '>',
+'&', carriage returns and C0 control characters other than tab and
+newline. sanitize therefore scans the text once for those:
+
+- none found: the text is returned unchanged (only cut to max_length);
+- the first one lies past max_length: the cut text is returned unchanged;
+- otherwise the markup-free prefix is kept as is and only the rest of the
+  text is parsed by bleach. Parsing starts in the same state after plain
+  text as at the start of the input, so the result is identical. Control
+  characters are treated differently at the start of a fragment, so
+  text containing them is passed to bleach whole.
+
+The output is always identical to bleach.clean(text, tags=[], strip=True)
+cut to max_length.
+
+Structured request fields (conversations, profiles) are sanitized with
+sanitize_fields, which cleans each string where it sits in the parsed
+value. Sanitizing the serialized JSON instead would let a tag-like run
+span several strings, and strip the quotes and commas between them.
+"""
+
+import re
+from typing import Any, Optional
+
+import bleach
+
+# Characters bleach may change; anything else passes through untouched
+MARKUP = re.compile(r'[<>&\r\x00-\x08\x0b-\x1f]')
+CONTROL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def clean(text: str) -> str:
+    """bleach.clean with every tag stripped."""
+    return bleach.clean(text, tags=[], strip=True)
+
+
+def sanitize(text: Optional[str], max_length: Optional[int] = None) -> str:
+    """Strip markup from text and cut it to max_length characters."""
+    if not text:
+        return ""
+    match = MARKUP.search(text)
+    if match is None:
+        return text[:max_length] if max_length is not None else text
+    start = match.start()
+    if max_length is not None and start >= max_length:
+        return text[:max_length]
+    if CONTROL.search(text, start):
+        cleaned = clean(text)
+    else:
+        cleaned = text[:start] + clean(text[start:])
+    return cleaned[:max_length] if max_length is not None else cleaned
+
+
+def sanitize_fields(value: Any, max_length: Optional[int] = None) -> Any:
+    """
+    Sanitize every string in a parsed JSON value, keys included, without
+    serializing it. Strings inside lists and objects are cut to max_length;
+    a bare string is returned whole, since text is trimmed to the prompt
+    budget by lines. Other values are returned unchanged.
+    """
+    if isinstance(value, str):
+        return sanitize(value)
+    return _sanitize_nested(value, max_length)
+
+
+def _sanitize_nested(value: Any, max_length: Optional[int]) -> Any:
+    if isinstance(value, str):
+        return sanitize(value, max_length)
+    if isinstance(value, list):
+        return [_sanitize_nested(item, max_length) for item in value]
+    if isinstance(value, dict):
+        return {
+            sanitize(key) if isinstance(key, str) else key: _sanitize_nested(item, max_length)
+            for key, item in value.items()
+        }
+    return value
@@ -0,0 +1,178 @@
+"""
+Single-flight coalescing of identical in-flight analyses.
+
+When the same prompt is already being sent to Gemini (a double-tapped
+"Analyze", or a client retry while the first call is still running),
+later callers wait for the first call and share its result instead of
+starting their own.
+
+Within a worker this uses an in-memory map of in-flight calls. Across
+workers it can also take a short-lived lock in the shared cache backend:
+a worker that loses the lock polls the shared cache for the leader's
+result, and only calls the model itself if the leader produced nothing
+cacheable or the wait times out. The lock holds a random token and is
+released only while it still holds that token, so a leader that outlives
+lock_ttl never removes the lock a newer leader has taken since.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Run a function at most once at a time per key."""
+
+    def __init__(self, backend=None, lock_ttl: float = 130.0,
+                 wait_timeout: float = 125.0, poll_interval: float = 0.1):
+        """
+        backend is an optional CacheBackend used for the cross-worker lock.
+        lock_ttl bounds how long a crashed leader can block other workers.
+        """
+        self.backend = backend
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._counts = {'leaders': 0, 'coalesced': 0, 'shared_coalesced': 0, 'lock_errors': 0,
+                        'lock_expired': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def do(self, key: str, fn: Callable[[], Any],
+           lookup: Optional[Callable[[], Any]] = None) -> Tuple[Any, bool]:
+        """
+        Run fn for key, or wait for the identical call already in flight.
+        lookup fetches the leader's result from the shared store when another
+        worker holds the lock. Returns (value, coalesced).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counts['leaders'] += 1
+            else:
+                self._counts['coalesced'] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value, coalesced = self._run_across_workers(key, fn, lookup)
+            return call.value, coalesced
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def _run_across_workers(self, key: str, fn: Callable[[], Any],
+                            lookup: Optional[Callable[[], Any]]) -> Tuple[Any, bool]:
+        if self.backend is None or lookup is None:
+            return fn(), False
+
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex.encode()
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            try:
+                acquired = self.backend.add(lock_key, token, self.lock_ttl)
+            except Exception as e:
+                logger.warning(f"Single-flight lock unavailable: {str(e)}")
+                self._count('lock_errors')
+                return fn(), False
+
+            if acquired:
+                try:
+                    # Another worker may have finished between our cache miss and the lock
+                    value = lookup()
+                    if value is not None:
+                        self._count('shared_coalesced')
+                        return value, True
+                    return fn(), False
+                finally:
+                    try:
+                        if not self.backend.delete_if(lock_key, token):
+                            logger.warning("Single-flight lock expired before its leader finished")
+                            self._count('lock_expired')
+                    except Exception as e:
+                        logger.warning(f"Single-flight lock release failed: {str(e)}")
+
+            value = lookup()
+            if value is not None:
+                self._count('shared_coalesced')
+                return value, True
+            if time.monotonic() >= deadline:
+                return fn(), False
+            time.sleep(self.poll_interval)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'shared_lock': self.backend.name if self.backend is not None else None,
+                **self._counts,
+            }
+
+
+class AsyncSingleFlight:
+    """
+    Single-flight for coroutines on one event loop (the async server).
+
+    The call runs in its own task that every caller, the leader included,
+    awaits through a shield. A caller that is cancelled (e.g. its client
+    disconnected) stops waiting without cancelling the call for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._counts = {'leaders': 0, 'coalesced': 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Await fn for key, or the identical call already in flight."""
+        task = self._calls.get(key)
+        if task is not None:
+            self._counts['coalesced'] += 1
+            return await asyncio.shield(task), True
+
+        task = self._calls[key] = asyncio.ensure_future(fn())
+        task.add_done_callback(lambda done: self._finished(key, done))
+        self._counts['leaders'] += 1
+        return await asyncio.shield(task), False
+
+    def _finished(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieve the exception so a call nobody awaits anymore does not warn
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'in_flight': len(self._calls), **self._counts}
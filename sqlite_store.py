@@ -0,0 +1,47 @@
+"""
+Local SQLite files shared by the worker processes on an instance.
+
+The result cache's SQLite tier, the job queue, profile states and sync
+blobs each keep one SQLite file in WAL mode, so every worker process sees
+the same data and it survives restarts. SQLiteDatabase opens one
+connection per thread, since a connection must not be shared between the
+threads of a worker.
+
+Jobs, profile states and sync blobs hold user data, so those stores
+encrypt everything they write with a cipher and refuse to start without
+one (require_cipher). Data is never stored in plaintext; without
+ENCRYPTION_KEY the features that need these stores are disabled instead.
+"""
+
+import os
+import sqlite3
+import threading
+
+
+class SQLiteDatabase:
+    """Per-thread connections to one SQLite file in WAL mode."""
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, in autocommit mode."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def require_cipher(cipher, store: str):
+    """Return cipher (e.g. a Fernet), or raise ValueError naming store if there is none."""
+    if cipher is None:
+        raise ValueError(f"{store} requires a cipher")
+    return cipher
@@ -0,0 +1,238 @@
+"""
+Storage for encrypted cross-device sync blobs.
+
+Clients upload data they have already encrypted, keyed by an opaque user
+hash. SyncStore is the storage interface; a cloud bucket implementation
+can stand in for the local one later. SQLiteSyncStore keeps everything in
+one SQLite file in WAL mode, shared by the worker processes on the
+instance:
+
+- Blobs are content-addressed by the SHA-256 of the uploaded data and
+  reference-counted, so identical uploads are stored once, encrypted
+  (see sqlite_store).
+- Each upload of changed data adds a numbered version for the user. Only
+  the newest max_versions are kept; older ones are pruned in the same
+  transaction, along with blobs no version refers to anymore.
+- A latest-version pointer per user makes downloads a single-row lookup,
+  however many users and versions there are.
+
+Hashing and encryption happen before the write transaction, which only
+touches a few rows, so concurrent uploads hold the write lock briefly.
+Each transaction is atomic: a crash never leaves a version without its
+blob.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlite_store import SQLiteDatabase, require_cipher
+
+
+class SyncVersion(NamedTuple):
+    """One stored version of a user's sync data."""
+    version: int
+    content_hash: str
+    size: int
+    created_at: float
+
+
+class SyncStore(ABC):
+    """Encrypted sync blobs per user hash, with a bounded version history."""
+
+    @abstractmethod
+    def put(self, user_hash: str, data: bytes) -> Tuple[SyncVersion, bool]:
+        """
+        Store data as the user's latest version. Returns (version, created);
+        created is False when the data equals the latest version already.
+        """
+
+    @abstractmethod
+    def latest(self, user_hash: str) -> Optional[SyncVersion]:
+        """The user's latest version, without its data."""
+
+    @abstractmethod
+    def get(self, user_hash: str, version: Optional[int] = None) -> Optional[Tuple[SyncVersion, bytes]]:
+        """A stored version (the latest by default) and its data."""
+
+    @abstractmethod
+    def versions(self, user_hash: str) -> List[SyncVersion]:
+        """Stored versions, newest first."""
+
+    @abstractmethod
+    def delete_user(self, user_hash: str) -> int:
+        """Delete every version of the user; returns how many there were."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Stored users, versions, blobs and bytes, plus upload counters."""
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class SQLiteSyncStore(SyncStore):
+    """SyncStore in a local SQLite file."""
+
+    def __init__(self, path: str, cipher, max_versions: int = 5):
+        if max_versions < 1:
+            raise ValueError("max_versions must be at least 1")
+        self.path = path
+        self.cipher = require_cipher(cipher, 'SQLiteSyncStore')
+        self.max_versions = max_versions
+
+        self._db = SQLiteDatabase(path, timeout=10)
+        self._counts = {'uploads': 0, 'deduplicated': 0, 'unchanged': 0, 'pruned': 0}
+        self._counts_lock = threading.Lock()
+
+        conn = self._db.connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_blobs ("
+            "hash TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, refs INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_versions ("
+            "user_hash TEXT NOT NULL, version INTEGER NOT NULL, hash TEXT NOT NULL, "
+            "size INTEGER NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (user_hash, version)"
+            ") WITHOUT ROWID"
+        )
+        # Latest version per user, so downloads never scan a user's history
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_latest ("
+            "user_hash TEXT PRIMARY KEY, version INTEGER NOT NULL, hash TEXT NOT NULL, "
+            "size INTEGER NOT NULL, created_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._counts_lock:
+            self._counts[name] += amount
+
+    def put(self, user_hash: str, data: bytes) -> Tuple[SyncVersion, bool]:
+        digest = content_hash(data)
+        conn = self._db.connection()
+        # Encrypt outside the write lock; usually the blob is new
+        stored = None
+        if conn.execute("SELECT 1 FROM sync_blobs WHERE hash = ?", (digest,)).fetchone() is None:
+            stored = self.cipher.encrypt(data)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT version, hash, size, created_at FROM sync_latest WHERE user_hash = ?", (user_hash,)
+            ).fetchone()
+            if row is not None and row[1] == digest:
+                conn.execute("COMMIT")
+                self._count('unchanged')
+                return SyncVersion(*row), False
+
+            deduplicated = conn.execute(
+                "UPDATE sync_blobs SET refs = refs + 1 WHERE hash = ?", (digest,)
+            ).rowcount > 0
+            if not deduplicated:
+                conn.execute(
+                    "INSERT INTO sync_blobs (hash, data, size, refs) VALUES (?, ?, ?, 1)",
+                    (digest, stored if stored is not None else self.cipher.encrypt(data), len(data))
+                )
+
+            version = SyncVersion(row[0] + 1 if row is not None else 1, digest, len(data), time.time())
+            conn.execute(
+                "INSERT INTO sync_versions (user_hash, version, hash, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                (user_hash, *version)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_latest (user_hash, version, hash, size, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (user_hash, *version)
+            )
+            pruned = self._prune(conn, user_hash, version.version - self.max_versions)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._count('uploads')
+        if deduplicated:
+            self._count('deduplicated')
+        if pruned:
+            self._count('pruned', pruned)
+        return version, True
+
+    def _prune(self, conn: sqlite3.Connection, user_hash: str, up_to: int) -> int:
+        """Delete the user's versions up to and including up_to, releasing their blobs."""
+        if up_to < 1:
+            return 0
+        old = conn.execute(
+            "SELECT hash FROM sync_versions WHERE user_hash = ? AND version <= ?", (user_hash, up_to)
+        ).fetchall()
+        if not old:
+            return 0
+        conn.execute("DELETE FROM sync_versions WHERE user_hash = ? AND version <= ?", (user_hash, up_to))
+        self._release(conn, [digest for (digest,) in old])
+        return len(old)
+
+    @staticmethod
+    def _release(conn: sqlite3.Connection, digests: List[str]) -> None:
+        for digest in digests:
+            conn.execute("UPDATE sync_blobs SET refs = refs - 1 WHERE hash = ?", (digest,))
+        conn.executemany(
+            "DELETE FROM sync_blobs WHERE hash = ? AND refs <= 0", [(digest,) for digest in set(digests)]
+        )
+
+    def latest(self, user_hash: str) -> Optional[SyncVersion]:
+        row = self._db.connection().execute(
+            "SELECT version, hash, size, created_at FROM sync_latest WHERE user_hash = ?", (user_hash,)
+        ).fetchone()
+        return SyncVersion(*row) if row is not None else None
+
+    def get(self, user_hash: str, version: Optional[int] = None) -> Optional[Tuple[SyncVersion, bytes]]:
+        if version is None:
+            query = ("SELECT l.version, l.hash, l.size, l.created_at, b.data FROM sync_latest l "
+                     "JOIN sync_blobs b ON b.hash = l.hash WHERE l.user_hash = ?")
+            params: tuple = (user_hash,)
+        else:
+            query = ("SELECT v.version, v.hash, v.size, v.created_at, b.data FROM sync_versions v "
+                     "JOIN sync_blobs b ON b.hash = v.hash WHERE v.user_hash = ? AND v.version = ?")
+            params = (user_hash, version)
+        row = self._db.connection().execute(query, params).fetchone()
+        if row is None:
+            return None
+        return SyncVersion(*row[:4]), self.cipher.decrypt(row[4])
+
+    def versions(self, user_hash: str) -> List[SyncVersion]:
+        rows = self._db.connection().execute(
+            "SELECT version, hash, size, created_at FROM sync_versions WHERE user_hash = ? "
+            "ORDER BY version DESC",
+            (user_hash,)
+        ).fetchall()
+        return [SyncVersion(*row) for row in rows]
+
+    def delete_user(self, user_hash: str) -> int:
+        conn = self._db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            digests = [digest for (digest,) in conn.execute(
+                "SELECT hash FROM sync_versions WHERE user_hash = ?", (user_hash,)
+            )]
+            conn.execute("DELETE FROM sync_versions WHERE user_hash = ?", (user_hash,))
+            conn.execute("DELETE FROM sync_latest WHERE user_hash = ?", (user_hash,))
+            self._release(conn, digests)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(digests)
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._db.connection()
+        (users,) = conn.execute("SELECT COUNT(*) FROM sync_latest").fetchone()
+        (versions,) = conn.execute("SELECT COUNT(*) FROM sync_versions").fetchone()
+        blobs, stored_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sync_blobs").fetchone()
+        with self._counts_lock:
+            return {'users': users, 'versions': versions, 'blobs': blobs, 'stored_bytes': stored_bytes,
+                    **self._counts}
@@ -3,8 +3,47 @@ Shared pytest fixtures and configuration.
 """
 
 import os
+import tempfile
 import pytest
+from cryptography.fernet import Fernet
 
 # Ensure test environment variables are set
 os.environ.setdefault('APP_SECRET_KEY', 'test-secret-key')
 os.environ.setdefault('FLASK_DEBUG', 'false')
+os.environ.setdefault('BEHAVIOR_LIBRARY_RELOAD_INTERVAL', '0')
+os.environ.setdefault('LOCAL_STORE_DIR', tempfile.mkdtemp(prefix='text-decoder-tests-'))
+# Server-side stores (profiles, jobs, sync) only run with encryption at rest
+os.environ.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+
+
+@pytest.fixture(autouse=True)
+def reset_result_cache():
+    """Start every test with an empty analysis result cache."""
+    from app import result_cache
+    result_cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def reset_model_registry():
+    """Drop pre-built models so each test builds them from its patched genai."""
+    from app import model_registry
+    model_registry.clear()
+    yield
+    model_registry.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Rate limits are per client address, which every test shares."""
+    from app import limiter
+    limiter.reset()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def reset_model_router():
+    """Routing reacts to model latency and errors; don't carry them between tests."""
+    from app import model_router
+    model_router.reset()
+    yield
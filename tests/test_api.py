@@ -7,8 +7,9 @@ Run: python -m pytest tests/ -v --cov=app
 
 import json
 import os
+import uuid
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, PropertyMock
 from datetime import datetime
 
 # Set env vars before importing app
@@ -242,6 +243,13 @@ class TestHealthCheck:
         assert data['version'] == '1.0.0-mvp'
         assert 'timestamp' in data
 
+    def test_reports_behavior_library_version(self, client):
+        response = client.get('/health')
+        library = response.get_json()['behavior_library']
+        assert library['version']
+        assert library['behavior_count'] > 0
+        assert library['etag']
+
     def test_no_auth_required(self, client):
         """Health check should not require authentication."""
         response = client.get('/health')
@@ -358,6 +366,44 @@ class TestIdentifySpeakers:
         data = response.get_json()
         assert data['success'] is False
 
+    @patch('app.genai')
+    def test_chat_export_parsed_without_model(self, mock_genai, client, auth_header):
+        response = client.post('/api/v1/analyze/identify-speakers',
+                               json={'text': '[12/03/2024, 14:23:45] Alice: Hello\n'
+                                             '[12/03/2024, 14:24:01] Bob: Hi there'},
+                               headers=auth_header)
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert data['speakers_identified'] == ['Alice', 'Bob']
+        assert data['messages'][1]['text'] == 'Hi there'
+        assert data['parser'] == 'whatsapp'
+        mock_genai.GenerativeModel.return_value.generate_content.assert_not_called()
+
+    @patch('app.genai')
+    def test_chat_export_streams_without_model(self, mock_genai, client, auth_header):
+        response = client.post('/api/v1/analyze/identify-speakers?stream=ndjson',
+                               json={'text': '[12/03/2024, 14:23:45] Alice: Hello\n'
+                                             '[12/03/2024, 14:24:01] Bob: Hi there'},
+                               headers=auth_header)
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [line['event'] for line in lines] == ['start', 'complete']
+        assert lines[-1]['data']['data']['speakers_identified'] == ['Alice', 'Bob']
+        mock_genai.GenerativeModel.return_value.generate_content.assert_not_called()
+
+    @patch('app.genai')
+    def test_local_parse_can_be_disabled(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"speakers_identified": ["Alice", "Bob"], "messages": []})
+        mock_model.generate_content.return_value = mock_response
+
+        response = client.post('/api/v1/analyze/identify-speakers',
+                               json={'text': 'Alice: Hello\nBob: Hi there', 'local_parse': False},
+                               headers=auth_header)
+        assert response.status_code == 200
+        assert mock_model.generate_content.call_count == 1
+
     def test_sanitizes_input(self, client, auth_header):
         """Input with HTML should be sanitized."""
         with patch('app.genai') as mock_genai:
@@ -416,6 +462,790 @@ class TestAnalyzeConversation:
         assert data['success'] is True
 
 
+class TestBehaviorCandidates:
+    """Tests for passing locally matched behaviors into conversation prompts."""
+
+    @patch('app.genai')
+    def test_prompt_lists_matched_behaviors(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"summary": "ok"})
+        mock_model.generate_content.return_value = mock_response
+
+        client.post('/api/v1/analyze/conversation',
+                    json={'conversation': [
+                        {'speaker': 'Alice', 'text': "That never happened, you're imagining things"},
+                        {'speaker': 'Bob', 'text': 'I need some time alone to process this'}
+                    ], 'speakers': ['Alice', 'Bob']},
+                    headers=auth_header)
+        prompt = mock_model.generate_content.call_args.args[0]
+        line = next(line for line in prompt.splitlines() if line.startswith('Library behaviors'))
+        candidates = json.loads(line.split(': ', 1)[1])
+        assert 0 < len(candidates) <= 15
+        assert 'clear_boundary_setting' in [candidate['behavior_id'] for candidate in candidates]
+
+
+class TestModelRouting:
+    """Tests for routing requests between the flash and pro models."""
+
+    def model(self, mock_genai):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"summary": "ok"})
+        mock_model.generate_content.return_value = mock_response
+        return mock_model
+
+    def built_models(self, mock_genai):
+        return [call.args[0] for call in mock_genai.GenerativeModel.call_args_list]
+
+    @patch('app.genai')
+    def test_short_conversation_uses_flash(self, mock_genai, client, auth_header, sample_conversation_data):
+        self.model(mock_genai)
+        response = client.post('/api/v1/analyze/conversation', json=sample_conversation_data,
+                               headers=auth_header)
+        assert response.status_code == 200
+        assert self.built_models(mock_genai) == ['gemini-1.5-flash']
+
+        routing = client.get('/api/v1/stats').get_json()['data']['routing']
+        assert routing['routed']['conversation'] == {'flash': 1}
+        assert routing['recent'][0]['reason'] == 'small input'
+        assert routing['models']['gemini-1.5-flash']['calls'] == 1
+
+    @patch('app.genai')
+    def test_request_can_choose_or_exclude_tier(self, mock_genai, client, auth_header,
+                                                sample_conversation_data):
+        self.model(mock_genai)
+        client.post('/api/v1/analyze/conversation',
+                    json={**sample_conversation_data, 'model_tier': 'pro'}, headers=auth_header)
+        assert self.built_models(mock_genai) == ['gemini-1.5-pro']
+
+        mock_genai.GenerativeModel.reset_mock()
+        client.post('/api/v1/analyze/profile',
+                    json={'profile_data': {'name': 'Test', 'conversations': []},
+                          'exclude_model_tiers': ['pro']},
+                    headers=auth_header)
+        assert self.built_models(mock_genai) == ['gemini-1.5-flash']
+
+    @patch('app.genai')
+    def test_profile_defaults_to_pro(self, mock_genai, client, auth_header):
+        self.model(mock_genai)
+        client.post('/api/v1/analyze/profile',
+                    json={'profile_data': {'name': 'Test', 'conversations': []}}, headers=auth_header)
+        assert self.built_models(mock_genai) == ['gemini-1.5-pro']
+
+    @patch('app.genai')
+    def test_blocked_response_is_not_a_model_error(self, mock_genai, client, auth_header,
+                                                   sample_conversation_data):
+        mock_model = self.model(mock_genai)
+        blocked = MagicMock()
+        type(blocked).text = PropertyMock(side_effect=ValueError("response was blocked"))
+        mock_model.generate_content.return_value = blocked
+        client.post('/api/v1/analyze/conversation', json=sample_conversation_data, headers=auth_header)
+
+        models = client.get('/api/v1/stats').get_json()['data']['routing']['models']
+        assert models['gemini-1.5-flash']['calls'] == 1
+        assert models['gemini-1.5-flash']['errors'] == 0
+
+    @pytest.mark.parametrize('options', [
+        {'model_tier': 'ultra'}, {'depth': 'bottomless'}, {'exclude_model_tiers': 'pro'}
+    ])
+    def test_invalid_routing_options(self, client, auth_header, sample_conversation_data, options):
+        response = client.post('/api/v1/analyze/conversation',
+                               json={**sample_conversation_data, **options}, headers=auth_header)
+        assert response.status_code == 400
+
+
+class TestPromptBudgets:
+    """Tests for per-endpoint prompt token budgets."""
+
+    @patch('app.genai')
+    def test_long_conversation_trimmed_at_message_boundaries(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"impact_analysis": {}})
+        mock_model.generate_content.return_value = mock_response
+
+        conversation = [
+            {'speaker': 'Alice', 'text': f'Message number {i} ' + 'words ' * 40}
+            for i in range(2000)
+        ]
+        response = client.post('/api/v1/analyze/response-impact',
+                               json={'conversation': conversation, 'user_speaker': 'Alice',
+                                     'draft_response': 'Sounds good'},
+                               headers=auth_header)
+        assert response.status_code == 200
+        message = response.get_json()['message']
+        assert 'analyzed the most recent' in message
+        assert 'of 2000 messages' in message
+
+        prompt = mock_model.generate_content.call_args.args[0]
+        # The newest message is kept whole and the serialized list is still valid JSON
+        assert 'Message number 1999 ' in prompt
+        assert 'Message number 0 ' not in prompt
+        marker = 'Previous conversation:\n'
+        conversation_json = prompt[prompt.index(marker) + len(marker):].strip()
+        assert json.loads(conversation_json)[-1]['text'].startswith('Message number 1999')
+
+        stats = client.get('/api/v1/stats').get_json()['data']['prompts']['response_impact']
+        assert stats['trimmed'] >= 1
+        assert stats['max_estimated_tokens'] <= 24000 + 100
+
+    @patch('app.genai')
+    def test_short_conversation_untouched(self, mock_genai, client, auth_header,
+                                          sample_conversation_data):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"summary": "Short"})
+        mock_model.generate_content.return_value = mock_response
+
+        response = client.post('/api/v1/analyze/conversation',
+                               json=sample_conversation_data, headers=auth_header)
+        assert response.get_json()['message'] == "Conversation analysis complete"
+        prompt = mock_model.generate_content.call_args.args[0]
+        assert json.dumps(sample_conversation_data['conversation']) in prompt
+
+    @patch('app.genai')
+    def test_markup_across_messages_keeps_json_valid(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"impact_analysis": {}})
+        mock_model.generate_content.return_value = mock_response
+
+        # Sanitizing the serialized list would strip '<b", ... "y>' as one tag
+        conversation = [{'speaker': 'Alice', 'text': 'x <b'}, {'speaker': 'Bob', 'text': 'y> z'}]
+        response = client.post('/api/v1/analyze/response-impact',
+                               json={'conversation': conversation, 'user_speaker': 'Alice',
+                                     'draft_response': 'ok'},
+                               headers=auth_header)
+        assert response.status_code == 200
+
+        prompt = mock_model.generate_content.call_args.args[0]
+        marker = 'Previous conversation:\n'
+        sent = json.loads(prompt[prompt.index(marker) + len(marker):].strip())
+        assert sent == [{'speaker': 'Alice', 'text': 'x &lt;b'}, {'speaker': 'Bob', 'text': 'y&gt; z'}]
+
+
+class TestLongConversationAnalysis:
+    """Tests for map-reduce analysis of conversations over the prompt budget."""
+
+    def long_conversation(self, count=1500):
+        return [
+            {'speaker': 'Alice' if i % 2 else 'Bob', 'text': f'Message number {i} ' + 'words ' * 40}
+            for i in range(count)
+        ]
+
+    def window_model(self, mock_genai, fail_window=None):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        def generate(prompt, **kwargs):
+            part = int(prompt.split('This is part ')[1].split(' of ')[0])
+            if part == fail_window:
+                raise Exception("API rate limit")
+            response = MagicMock()
+            response.text = json.dumps({
+                "summary": f"Part {part}.",
+                "speaker_analyses": [
+                    {"speaker": "Alice", "strengths": [f"strength {part}"],
+                     "behaviors_exhibited": [{"behavior_id": "stonewalling", "frequency": "rare"}]},
+                    {"speaker": "Bob", "strengths": ["listens"]}
+                ],
+                "manipulation_check": {"detected": part == 2, "severity": "moderate" if part == 2 else "none"},
+                "conversation_health_score": 40 if part == 1 else 80
+            })
+            return response
+        mock_model.generate_content.side_effect = generate
+        return mock_model
+
+    @patch('app.genai')
+    def test_windows_analyzed_and_merged(self, mock_genai, client, auth_header):
+        mock_model = self.window_model(mock_genai)
+        conversation = self.long_conversation()
+        response = client.post('/api/v1/analyze/conversation',
+                               json={'conversation': conversation, 'speakers': ['Alice', 'Bob']},
+                               headers=auth_header)
+        assert response.status_code == 200
+        body = response.get_json()
+        data = body['data']
+        windows = data['long_conversation']['windows']
+        assert windows > 1
+        assert mock_model.generate_content.call_count == windows
+        assert 'parts combined' in body['message']
+
+        # Every message is covered, and the windows overlap
+        prompts = [call.args[0] for call in mock_model.generate_content.call_args_list]
+        assert any('Message number 0 ' in prompt for prompt in prompts)
+        assert any('Message number 1499 ' in prompt for prompt in prompts)
+
+        speakers = {s['speaker']: s for s in data['speaker_analyses']}
+        assert set(speakers) == {'Alice', 'Bob'}
+        assert speakers['Bob']['strengths'] == ['listens']
+        assert speakers['Alice']['behaviors_exhibited'][0]['frequency'] == 'frequent'
+        assert data['manipulation_check'] == {
+            'detected': True, 'types': [], 'examples': [], 'severity': 'moderate'
+        }
+        assert 40 < data['conversation_health_score'] < 80
+
+    @patch('app.genai')
+    def test_failed_window_does_not_fail_analysis(self, mock_genai, client, auth_header):
+        self.window_model(mock_genai, fail_window=1)
+        response = client.post('/api/v1/analyze/conversation',
+                               json={'conversation': self.long_conversation(), 'speakers': ['Alice']},
+                               headers=auth_header)
+        assert response.status_code == 200
+        info = response.get_json()['data']['long_conversation']
+        assert info['windows_analyzed'] == info['windows'] - 1
+
+    @patch('app.genai')
+    def test_all_windows_failing_is_an_error(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_model.generate_content.side_effect = Exception("API rate limit")
+        response = client.post('/api/v1/analyze/conversation',
+                               json={'conversation': self.long_conversation(), 'speakers': ['Alice']},
+                               headers=auth_header)
+        assert response.status_code == 500
+
+    @patch('app.genai')
+    def test_window_limit_drops_oldest_messages(self, mock_genai, client, auth_header):
+        import app as app_module
+        self.window_model(mock_genai)
+        with patch.object(app_module, 'LONG_CONVERSATION_MAX_WINDOWS', 2):
+            response = client.post('/api/v1/analyze/conversation',
+                                   json={'conversation': self.long_conversation(3000),
+                                         'speakers': ['Alice']},
+                                   headers=auth_header)
+        body = response.get_json()
+        assert body['data']['long_conversation']['windows'] == 2
+        assert 'analyzed the most recent' in body['message']
+
+    @patch('app.genai')
+    def test_streamed_long_conversation_reports_window_progress(self, mock_genai, client, auth_header):
+        self.window_model(mock_genai)
+        response = client.post('/api/v1/analyze/conversation?stream=ndjson',
+                               json={'conversation': self.long_conversation(), 'speakers': ['Alice']},
+                               headers=auth_header)
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        progress = [line['data'] for line in lines if line['event'] == 'progress']
+        assert progress[-1]['windows_completed'] == progress[-1]['windows']
+        assert lines[-1]['event'] == 'complete'
+        assert 'long_conversation' in lines[-1]['data']['data']
+
+
+class TestIncrementalAnalysis:
+    """Tests for re-analyzing a conversation with only its new messages."""
+
+    def conversation(self, count):
+        return [{'speaker': 'Alice' if i % 2 else 'Bob', 'text': f'Message {i}'} for i in range(count)]
+
+    def model(self, mock_genai):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        def generate(prompt, **kwargs):
+            update = 'already analyzed' in prompt
+            response = MagicMock()
+            response.text = json.dumps({
+                "summary": "Update." if update else "Full.",
+                "speaker_analyses": [{"speaker": "Alice", "strengths": ["new" if update else "old"]}],
+                "conversation_health_score": 40 if update else 80
+            })
+            return response
+        mock_model.generate_content.side_effect = generate
+        return mock_model
+
+    @patch('app.genai')
+    def test_appended_messages_sent_with_prior_state(self, mock_genai, client, auth_header):
+        mock_model = self.model(mock_genai)
+        client.post('/api/v1/analyze/conversation',
+                    json={'conversation': self.conversation(10), 'speakers': ['Alice', 'Bob']},
+                    headers=auth_header)
+        response = client.post('/api/v1/analyze/conversation',
+                               json={'conversation': self.conversation(12), 'speakers': ['Alice', 'Bob']},
+                               headers=auth_header)
+        assert response.status_code == 200
+        assert mock_model.generate_content.call_count == 2
+
+        prompt = mock_model.generate_content.call_args.args[0]
+        assert '"Message 11"' in prompt and '"Message 10"' in prompt
+        # Only a few earlier messages are repeated, for context
+        assert '"Message 0"' not in prompt
+        assert 'Full.' in prompt
+
+        body = response.get_json()
+        data = body['data']
+        assert data['incremental']['base_messages'] == 10
+        assert data['incremental']['new_messages'] == 2
+        assert data['speaker_analyses'][0]['strengths'] == ['old', 'new']
+        assert 40 < data['conversation_health_score'] < 80
+        assert '2 new messages' in body['message']
+
+    @patch('app.genai')
+    def test_updates_chain(self, mock_genai, client, auth_header):
+        mock_model = self.model(mock_genai)
+        for count in (10, 12, 15):
+            response = client.post('/api/v1/analyze/conversation',
+                                   json={'conversation': self.conversation(count), 'speakers': ['Alice']},
+                                   headers=auth_header)
+        assert response.get_json()['data']['incremental']['base_messages'] == 12
+        assert mock_model.generate_content.call_count == 3
+
+    @patch('app.genai')
+    def test_retried_update_returns_stored_state(self, mock_genai, client, auth_header):
+        mock_model = self.model(mock_genai)
+        for count in (10, 12, 12):
+            response = client.post('/api/v1/analyze/conversation',
+                                   json={'conversation': self.conversation(count), 'speakers': ['Alice']},
+                                   headers=auth_header)
+        assert mock_model.generate_content.call_count == 2
+        body = response.get_json()
+        assert body['message'] == "Conversation analysis is up to date"
+        assert body['data']['incremental']['base_messages'] == 12
+        assert body['data']['incremental']['new_messages'] == 0
+        assert body['data']['speaker_analyses'][0]['strengths'] == ['old', 'new']
+
+    @patch('app.genai')
+    def test_incremental_false_analyzes_everything(self, mock_genai, client, auth_header):
+        mock_model = self.model(mock_genai)
+        client.post('/api/v1/analyze/conversation',
+                    json={'conversation': self.conversation(10), 'speakers': ['Alice']},
+                    headers=auth_header)
+        response = client.post('/api/v1/analyze/conversation',
+                               json={'conversation': self.conversation(12), 'speakers': ['Alice'],
+                                     'incremental': False},
+                               headers=auth_header)
+        assert 'incremental' not in response.get_json()['data']
+        assert '"Message 0"' in mock_model.generate_content.call_args.args[0]
+
+    @patch('app.genai')
+    def test_edited_history_analyzes_everything(self, mock_genai, client, auth_header):
+        mock_model = self.model(mock_genai)
+        client.post('/api/v1/analyze/conversation',
+                    json={'conversation': self.conversation(10), 'speakers': ['Alice']},
+                    headers=auth_header)
+        edited = self.conversation(12)
+        edited[3]['text'] = 'Edited'
+        response = client.post('/api/v1/analyze/conversation',
+                               json={'conversation': edited, 'speakers': ['Alice']},
+                               headers=auth_header)
+        assert 'incremental' not in response.get_json()['data']
+        assert '"Message 0"' in mock_model.generate_content.call_args.args[0]
+
+
+# ============================================
+# ANALYSIS RESULT CACHE
+# ============================================
+
+class TestAnalysisResultCache:
+    """Tests for caching Gemini results across identical requests."""
+
+    @patch('app.genai')
+    def test_identical_request_served_from_cache(self, mock_genai, client, auth_header,
+                                                 sample_conversation_data):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"summary": "Cached", "conversation_health_score": 70})
+        mock_model.generate_content.return_value = mock_response
+
+        first = client.post('/api/v1/analyze/conversation',
+                            json=sample_conversation_data, headers=auth_header)
+        second = client.post('/api/v1/analyze/conversation',
+                             json=sample_conversation_data, headers=auth_header)
+
+        assert first.status_code == second.status_code == 200
+        assert second.get_json()['data'] == first.get_json()['data']
+        assert mock_model.generate_content.call_count == 1
+
+    @patch('app.genai')
+    def test_no_cache_header_bypasses_cache(self, mock_genai, client, auth_header,
+                                            sample_conversation_data):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"summary": "Fresh"})
+        mock_model.generate_content.return_value = mock_response
+
+        client.post('/api/v1/analyze/conversation',
+                    json=sample_conversation_data, headers=auth_header)
+        client.post('/api/v1/analyze/conversation',
+                    json=sample_conversation_data,
+                    headers={**auth_header, 'Cache-Control': 'no-cache'})
+        assert mock_model.generate_content.call_count == 2
+
+    @patch('app.genai')
+    def test_unparseable_response_not_cached(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = "not json"
+        mock_model.generate_content.return_value = mock_response
+
+        for _ in range(2):
+            client.post('/api/v1/analyze/identify-speakers',
+                        json={'text': 'Some conversation text'}, headers=auth_header)
+        assert mock_model.generate_content.call_count == 2
+
+    @patch('app.genai')
+    def test_concurrent_identical_requests_coalesced(self, mock_genai, auth_header,
+                                                     sample_conversation_data):
+        import threading
+        import time
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"summary": "Shared"})
+
+        def slow_generate(*args, **kwargs):
+            time.sleep(0.3)
+            return mock_response
+        mock_model.generate_content.side_effect = slow_generate
+
+        statuses = []
+
+        def post():
+            with app.test_client() as thread_client:
+                response = thread_client.post('/api/v1/analyze/conversation',
+                                              json=sample_conversation_data,
+                                              headers={**auth_header, 'Cache-Control': 'no-cache'})
+                statuses.append(response.status_code)
+
+        threads = [threading.Thread(target=post) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert statuses == [200] * 4
+        assert mock_model.generate_content.call_count == 1
+
+    @patch('app.genai')
+    def test_model_built_once_and_reused(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"speakers_identified": ["A"], "messages": []})
+        mock_model.generate_content.return_value = mock_response
+
+        for text in ('First conversation', 'Second conversation'):
+            client.post('/api/v1/analyze/identify-speakers',
+                        json={'text': text}, headers=auth_header)
+
+        assert mock_model.generate_content.call_count == 2
+        assert mock_genai.GenerativeModel.call_count == 1
+        # Short inputs are routed to the fast model
+        assert mock_genai.GenerativeModel.call_args.args == ('gemini-1.5-flash',)
+        stats = client.get('/api/v1/stats').get_json()['data']['models']
+        assert stats['reused'] >= 1
+
+    @patch('app.genai')
+    def test_stats_endpoint(self, mock_genai, client, auth_header, sample_conversation_data):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"summary": "ok"})
+        mock_model.generate_content.return_value = mock_response
+
+        for _ in range(2):
+            client.post('/api/v1/analyze/conversation',
+                        json=sample_conversation_data, headers=auth_header)
+
+        stats = client.get('/api/v1/stats').get_json()['data']['result_cache']
+        assert stats['endpoints']['conversation']['hits'] == 1
+        assert stats['endpoints']['conversation']['misses'] == 1
+
+
+# ============================================
+# STREAMING ANALYSIS
+# ============================================
+
+def parse_sse(body):
+    events = []
+    for frame in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in frame.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+class TestStreamingAnalysis:
+    """Tests for opt-in SSE/NDJSON streaming of analysis results."""
+
+    STREAMED = json.dumps({
+        "summary": "A friendly exchange",
+        "speaker_analyses": [{"speaker": "Alice"}, {"speaker": "Bob"}],
+        "conversation_health_score": 85
+    })
+
+    def mock_stream(self, mock_genai, text, size=16):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        chunks = []
+        for start in range(0, len(text), size):
+            chunk = MagicMock()
+            chunk.text = text[start:start + size]
+            chunks.append(chunk)
+        mock_model.generate_content.return_value = iter(chunks)
+        return mock_model
+
+    @patch('app.genai')
+    def test_sse_stream_sections_then_complete(self, mock_genai, client, auth_header,
+                                               sample_conversation_data):
+        mock_model = self.mock_stream(mock_genai, self.STREAMED)
+        response = client.post('/api/v1/analyze/conversation?stream=sse',
+                               json=sample_conversation_data, headers=auth_header)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        events = parse_sse(response.get_data(as_text=True))
+        assert mock_model.generate_content.call_args.kwargs['stream'] is True
+
+        names = [event for event, _ in events]
+        assert names[0] == 'start'
+        assert names[-1] == 'complete'
+        assert 'progress' in names
+        assert ('section', {'key': 'summary', 'value': 'A friendly exchange'}) in events
+        items = [data for event, data in events if event == 'item']
+        assert [item['value']['speaker'] for item in items] == ['Alice', 'Bob']
+        # Sections arrive before the final body
+        assert names.index('section') < names.index('complete')
+        complete = events[-1][1]
+        assert complete['success'] is True
+        assert complete['data'] == json.loads(self.STREAMED)
+
+    @patch('app.genai')
+    def test_accept_header_selects_sse(self, mock_genai, client, auth_header):
+        self.mock_stream(mock_genai, json.dumps({"speakers_identified": ["A"], "messages": []}))
+        response = client.post('/api/v1/analyze/identify-speakers',
+                               json={'text': 'Some conversation text'},
+                               headers={**auth_header, 'Accept': 'text/event-stream'})
+        assert response.mimetype == 'text/event-stream'
+        assert parse_sse(response.get_data(as_text=True))[-1][0] == 'complete'
+
+    @patch('app.genai')
+    def test_ndjson_stream(self, mock_genai, client, auth_header, sample_conversation_data):
+        self.mock_stream(mock_genai, self.STREAMED)
+        response = client.post('/api/v1/analyze/conversation?stream=ndjson',
+                               json=sample_conversation_data, headers=auth_header)
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert lines[-1]['event'] == 'complete'
+        assert lines[-1]['data']['data']['conversation_health_score'] == 85
+
+    @patch('app.genai')
+    def test_streamed_result_is_cached(self, mock_genai, client, auth_header,
+                                       sample_conversation_data):
+        mock_model = self.mock_stream(mock_genai, self.STREAMED)
+        streamed = client.post('/api/v1/analyze/conversation?stream=sse',
+                               json=sample_conversation_data, headers=auth_header)
+        streamed.get_data()
+        response = client.post('/api/v1/analyze/conversation',
+                               json=sample_conversation_data, headers=auth_header)
+        assert response.get_json()['data']['summary'] == "A friendly exchange"
+        assert mock_model.generate_content.call_count == 1
+
+    @patch('app.genai')
+    def test_unparseable_stream_uses_fallback(self, mock_genai, client, auth_header):
+        self.mock_stream(mock_genai, "not json")
+        response = client.post('/api/v1/analyze/identify-speakers?stream=sse',
+                               json={'text': 'Some conversation text'}, headers=auth_header)
+        event, data = parse_sse(response.get_data(as_text=True))[-1]
+        assert event == 'complete'
+        assert data['data']['raw_response'] == "not json"
+
+    @patch('app.genai')
+    def test_upstream_error_sends_error_event(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_model.generate_content.side_effect = Exception("API rate limit")
+        response = client.post('/api/v1/analyze/identify-speakers?stream=sse',
+                               json={'text': 'Some conversation text'}, headers=auth_header)
+        event, data = parse_sse(response.get_data(as_text=True))[-1]
+        assert event == 'error'
+        assert data['success'] is False
+
+    def test_invalid_input_is_plain_error(self, client, auth_header):
+        response = client.post('/api/v1/analyze/profile?stream=sse', json={}, headers=auth_header)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == "Missing required field"
+
+
+# ============================================
+# BATCH ANALYSIS ENDPOINT
+# ============================================
+
+class TestModelOutputRecovery:
+    """Tests for recovering results from invalid model JSON."""
+
+    TRUNCATED = (
+        '{"speakers_identified": ["Alice", "Bob"], "messages": ['
+        '{"speaker": "Alice", "text": "Hi", "confidence": 0.9}, {"speaker": "Bob", "text": "Hel'
+    )
+
+    def model(self, mock_genai, text):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = text
+        mock_model.generate_content.return_value = mock_response
+        return mock_model
+
+    def identify(self, client, auth_header, query=''):
+        return client.post(f'/api/v1/analyze/identify-speakers{query}',
+                           json={'text': 'Some conversation text', 'local_parse': False},
+                           headers=auth_header)
+
+    @patch('app.genai')
+    def test_truncated_output_gives_partial_result(self, mock_genai, client, auth_header):
+        mock_model = self.model(mock_genai, self.TRUNCATED)
+        data = self.identify(client, auth_header).get_json()['data']
+        assert data['partial'] is True
+        assert data['speakers_identified'] == ['Alice', 'Bob']
+        assert data['messages'] == [{'speaker': 'Alice', 'text': 'Hi', 'confidence': 0.9}, {'speaker': 'Bob'}]
+        assert 'raw_response' not in data
+
+        # A retry may get the whole answer, so partial results are not cached
+        self.identify(client, auth_header)
+        assert mock_model.generate_content.call_count == 2
+
+    @patch('app.genai')
+    def test_partial_result_is_not_kept_as_conversation_state(self, mock_genai, client, auth_header):
+        mock_model = self.model(mock_genai, '{"summary": "Cut", "speaker_analyses": [{"speaker": "Al')
+        conversation = [{'speaker': 'Alice', 'text': f'Message {i}'} for i in range(10)]
+        client.post('/api/v1/analyze/conversation',
+                    json={'conversation': conversation, 'speakers': ['Alice']}, headers=auth_header)
+        response = client.post('/api/v1/analyze/conversation',
+                               json={'conversation': conversation + [{'speaker': 'Alice', 'text': 'More'}],
+                                     'speakers': ['Alice']},
+                               headers=auth_header)
+        assert 'incremental' not in response.get_json()['data']
+        assert 'already analyzed' not in mock_model.generate_content.call_args.args[0]
+
+    @patch('app.genai')
+    def test_repaired_output_is_cached(self, mock_genai, client, auth_header):
+        mock_model = self.model(
+            mock_genai, '```json\n{"speakers_identified": ["Alice", "Bob",], "messages": []}\n```'
+        )
+        first = self.identify(client, auth_header).get_json()['data']
+        second = self.identify(client, auth_header).get_json()['data']
+        assert first == second == {'speakers_identified': ['Alice', 'Bob'], 'messages': []}
+        assert mock_model.generate_content.call_count == 1
+
+    @patch('app.genai')
+    def test_truncated_stream_gives_partial_result(self, mock_genai, client, auth_header):
+        TestStreamingAnalysis().mock_stream(mock_genai, self.TRUNCATED, size=7)
+        event, data = parse_sse(self.identify(client, auth_header, '?stream=sse').get_data(as_text=True))[-1]
+        assert event == 'complete'
+        assert data['data']['partial'] is True
+        assert len(data['data']['messages']) == 2
+
+
+class TestAnalyzeBatch:
+    """Tests for /api/v1/analyze/batch endpoint."""
+
+    def batch(self, count):
+        return [
+            {
+                'id': f'conv-{i}',
+                'conversation': [{'speaker': 'Alice', 'text': f'Message {i}'}],
+                'speakers': ['Alice']
+            }
+            for i in range(count)
+        ]
+
+    def test_rejects_missing_items(self, client, auth_header):
+        response = client.post('/api/v1/analyze/batch', json={}, headers=auth_header)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == "Missing required field"
+
+    def test_rejects_oversized_batch(self, client, auth_header):
+        import app as app_module
+        response = client.post('/api/v1/analyze/batch',
+                               json={'items': self.batch(app_module.BATCH_MAX_ITEMS + 1)},
+                               headers=auth_header)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == "Batch too large"
+
+    def test_rejects_invalid_concurrency(self, client, auth_header):
+        response = client.post('/api/v1/analyze/batch',
+                               json={'items': self.batch(1), 'concurrency': 0},
+                               headers=auth_header)
+        assert response.status_code == 400
+
+    @patch('app.genai')
+    def test_results_in_input_order_with_item_errors(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        def generate(prompt, **kwargs):
+            if 'Message 1' in prompt:
+                raise Exception("API rate limit")
+            response = MagicMock()
+            response.text = json.dumps({"summary": "ok"})
+            return response
+        mock_model.generate_content.side_effect = generate
+
+        items = self.batch(3) + [{'id': 'broken', 'speakers': ['Alice']}]
+        response = client.post('/api/v1/analyze/batch', json={'items': items}, headers=auth_header)
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert [r['index'] for r in data['results']] == [0, 1, 2, 3]
+        assert [r['id'] for r in data['results']] == ['conv-0', 'conv-1', 'conv-2', 'broken']
+        assert [r['success'] for r in data['results']] == [True, False, True, False]
+        assert data['results'][0]['data'] == {"summary": "ok"}
+        assert data['results'][1]['error'] == "Analysis failed"
+        assert data['results'][3]['error'] == "Missing required field"
+        assert (data['succeeded'], data['failed']) == (2, 2)
+
+    @patch('app.genai')
+    def test_concurrency_is_bounded(self, mock_genai, client, auth_header):
+        import threading
+        import time
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        lock = threading.Lock()
+        active = [0]
+        peak = [0]
+
+        def generate(*args, **kwargs):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            response = MagicMock()
+            response.text = json.dumps({"summary": "ok"})
+            return response
+        mock_model.generate_content.side_effect = generate
+
+        response = client.post('/api/v1/analyze/batch',
+                               json={'items': self.batch(8), 'concurrency': 2},
+                               headers=auth_header)
+        assert response.get_json()['data']['succeeded'] == 8
+        assert 1 < peak[0] <= 2
+
+    @patch('app.genai')
+    def test_ndjson_stream_results_as_completed(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"summary": "ok"})
+        mock_model.generate_content.return_value = mock_response
+
+        response = client.post('/api/v1/analyze/batch?stream=ndjson',
+                               json={'items': self.batch(3)}, headers=auth_header)
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [line['event'] for line in lines] == ['result'] * 3 + ['complete']
+        assert sorted(line['data']['id'] for line in lines[:3]) == ['conv-0', 'conv-1', 'conv-2']
+        assert lines[-1]['data'] == {'total': 3, 'succeeded': 3, 'failed': 0}
+
+
 # ============================================
 # RESPONSE IMPACT ENDPOINT
 # ============================================
@@ -492,6 +1322,211 @@ class TestAnalyzeProfile:
         assert response.status_code == 200
 
 
+class TestIncrementalProfile:
+    """Tests for folding new conversations into a stored profile (profile_hash)."""
+
+    def profile(self, count):
+        return {
+            'profile_name': 'Alex',
+            'conversation_count': count,
+            'conversations': [{'messages': [{'text': f'Conversation {i}'}]} for i in range(count)]
+        }
+
+    def model(self, mock_genai):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+
+        def generate(prompt, **kwargs):
+            response = MagicMock()
+            response.text = json.dumps({
+                "profile_summary": "Updated." if 'since this profile was created' in prompt else "First."
+            })
+            return response
+        mock_model.generate_content.side_effect = generate
+        return mock_model
+
+    def post(self, client, auth_header, body):
+        return client.post('/api/v1/analyze/profile', json=body, headers=auth_header)
+
+    @patch('app.genai')
+    def test_only_new_conversations_are_sent(self, mock_genai, client, auth_header):
+        mock_model = self.model(mock_genai)
+        profile_hash = uuid.uuid4().hex
+        self.post(client, auth_header, {'profile_data': self.profile(5), 'profile_hash': profile_hash})
+        response = self.post(client, auth_header, {'profile_data': self.profile(7), 'profile_hash': profile_hash})
+
+        prompt = mock_model.generate_content.call_args.args[0]
+        assert 'Conversation 5' in prompt and 'Conversation 6' in prompt
+        assert 'Conversation 4' not in prompt
+        assert 'First.' in prompt
+
+        body = response.get_json()
+        assert body['data']['profile_summary'] == 'Updated.'
+        assert body['data']['incremental'] == {
+            'conversations': 7, 'base_conversations': 5, 'new_conversations': 2
+        }
+
+    @patch('app.genai')
+    def test_unchanged_history_uses_stored_profile(self, mock_genai, client, auth_header):
+        mock_model = self.model(mock_genai)
+        profile_hash = uuid.uuid4().hex
+        self.post(client, auth_header, {'profile_data': self.profile(5), 'profile_hash': profile_hash})
+        response = self.post(client, auth_header, {'profile_data': self.profile(5), 'profile_hash': profile_hash})
+        assert mock_model.generate_content.call_count == 1
+        assert response.get_json()['data']['profile_summary'] == 'First.'
+        assert response.get_json()['message'] == "Profile is up to date"
+
+    @patch('app.genai')
+    def test_without_profile_hash_nothing_is_stored(self, mock_genai, client, auth_header):
+        import app as app_module
+        mock_model = self.model(mock_genai)
+        saved = app_module.profile_states.stats()['saved']
+        self.post(client, auth_header, {'profile_data': self.profile(5)})
+        self.post(client, auth_header, {'profile_data': self.profile(7)})
+        assert mock_model.generate_content.call_count == 2
+        assert 'Conversation 0' in mock_model.generate_content.call_args.args[0]
+        assert app_module.profile_states.stats()['saved'] == saved
+
+    @patch('app.genai')
+    def test_edited_history_rebuilds_profile(self, mock_genai, client, auth_header):
+        mock_model = self.model(mock_genai)
+        profile_hash = uuid.uuid4().hex
+        self.post(client, auth_header, {'profile_data': self.profile(5), 'profile_hash': profile_hash})
+        edited = self.profile(7)
+        edited['conversations'][1]['messages'][0]['text'] = 'Edited'
+        response = self.post(client, auth_header, {'profile_data': edited, 'profile_hash': profile_hash})
+        assert 'Conversation 0' in mock_model.generate_content.call_args.args[0]
+        assert 'incremental' not in response.get_json()['data']
+
+    def test_rejects_invalid_profile_hash(self, client, auth_header):
+        response = self.post(client, auth_header, {'profile_data': self.profile(1), 'profile_hash': 42})
+        assert response.status_code == 400
+
+    @patch('app.genai')
+    def test_deleting_user_data_removes_profile_state(self, mock_genai, client, auth_header):
+        import app as app_module
+        self.model(mock_genai)
+        profile_hash = uuid.uuid4().hex
+        self.post(client, auth_header, {'profile_data': self.profile(5), 'profile_hash': profile_hash})
+        assert app_module.profile_states.get(profile_hash) is not None
+        response = client.delete('/api/v1/user/delete',
+                                 json={'user_hash': 'user', 'profile_hashes': [profile_hash]},
+                                 headers=auth_header)
+        assert response.get_json()['data']['profile_states'] == 1
+        assert app_module.profile_states.get(profile_hash) is None
+
+    @patch('app.genai')
+    def test_profile_hash_ignored_without_encryption(self, mock_genai, client, auth_header):
+        mock_model = self.model(mock_genai)
+        profile_hash = uuid.uuid4().hex
+        with patch('app.profile_states', None):
+            self.post(client, auth_header, {'profile_data': self.profile(5), 'profile_hash': profile_hash})
+            response = self.post(client, auth_header,
+                                 {'profile_data': self.profile(7), 'profile_hash': profile_hash})
+        assert response.status_code == 200
+        assert mock_model.generate_content.call_count == 2
+        assert 'Conversation 0' in mock_model.generate_content.call_args.args[0]
+        assert 'incremental' not in response.get_json()['data']
+
+
+# ============================================
+# BACKGROUND ANALYSIS JOBS
+# ============================================
+
+class TestAnalysisJobs:
+    """Tests for ?mode=async profile analyses and /api/v1/jobs/<id>."""
+
+    @patch('app.genai')
+    def test_profile_job_lifecycle(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"profile_summary": "A balanced communicator"})
+        mock_model.generate_content.return_value = mock_response
+
+        response = client.post('/api/v1/analyze/profile?mode=async',
+                               json={'profile_data': {'name': 'Test', 'conversations': []}},
+                               headers=auth_header)
+        assert response.status_code == 202
+        job = response.get_json()['data']
+        assert job['status'] in ('queued', 'running', 'succeeded')
+        assert response.headers['Location'] == job['status_url']
+
+        response = client.get(f"{job['status_url']}?wait=10")
+        assert response.status_code == 200
+        job = response.get_json()['data']
+        assert job['status'] == 'succeeded'
+        assert job['result']['success'] is True
+        assert job['result']['data']['profile_summary'] == "A balanced communicator"
+        assert job['result']['message'] == "Profile analysis complete"
+
+    @patch('app.genai')
+    def test_prefer_header_queues_self_profile(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_model.generate_content.side_effect = Exception("API rate limit")
+
+        response = client.post('/api/v1/analyze/self-profile',
+                               json={'user_data': {'conversations': []}},
+                               headers={**auth_header, 'Prefer': 'respond-async'})
+        assert response.status_code == 202
+
+        job = client.get(f"{response.headers['Location']}?wait=10").get_json()['data']
+        assert job['status'] == 'failed'
+        assert 'API rate limit' not in job['error']
+
+    def test_invalid_request_rejected_before_queueing(self, client, auth_header):
+        response = client.post('/api/v1/analyze/profile?mode=async', json={}, headers=auth_header)
+        assert response.status_code == 400
+
+    def test_unknown_job(self, client):
+        response = client.get('/api/v1/jobs/does-not-exist')
+        assert response.status_code == 404
+        assert response.get_json()['error'] == "Job not found"
+
+    def test_invalid_wait(self, client):
+        response = client.get('/api/v1/jobs/does-not-exist?wait=soon')
+        assert response.status_code == 400
+
+    def test_async_mode_rejected_without_encryption(self, client, auth_header):
+        with patch('app.job_queue', None):
+            response = client.post('/api/v1/analyze/profile?mode=async',
+                                   json={'profile_data': {'name': 'Test', 'conversations': []}},
+                                   headers=auth_header)
+        assert response.status_code == 503
+
+    @patch('app.genai')
+    def test_deleting_user_data_removes_listed_jobs(self, mock_genai, client, auth_header):
+        mock_model = MagicMock()
+        mock_genai.GenerativeModel.return_value = mock_model
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"profile_summary": "A balanced communicator"})
+        mock_model.generate_content.return_value = mock_response
+
+        response = client.post('/api/v1/analyze/profile?mode=async',
+                               json={'profile_data': {'name': 'Test', 'conversations': []}},
+                               headers=auth_header)
+        job = response.get_json()['data']
+        client.get(f"{job['status_url']}?wait=10")
+        response = client.delete('/api/v1/user/delete',
+                                 json={'user_hash': 'user', 'job_ids': [job['id']]},
+                                 headers=auth_header)
+        assert response.status_code == 200
+        assert response.get_json()['data']['jobs'] == 1
+        assert client.get(job['status_url']).status_code == 404
+
+    def test_other_endpoints_ignore_async_mode(self, client, auth_header):
+        with patch('app.genai') as mock_genai:
+            mock_model = MagicMock()
+            mock_genai.GenerativeModel.return_value = mock_model
+            mock_response = MagicMock()
+            mock_response.text = json.dumps({"speakers_identified": ["A"], "messages": []})
+            mock_model.generate_content.return_value = mock_response
+            response = client.post('/api/v1/analyze/identify-speakers?mode=async',
+                                   json={'text': 'Some conversation text'}, headers=auth_header)
+        assert response.status_code == 200
+
+
 # ============================================
 # SELF PROFILE ANALYSIS ENDPOINT
 # ============================================
@@ -548,11 +1583,161 @@ class TestBehaviorLibrary:
         if data['data'].get('categories'):
             assert len(data['data']['categories']) > 0
 
+    def test_get_behaviors_timestamp_is_current(self, client):
+        """The pre-encoded body gets the time of each response, not of the snapshot."""
+        before = datetime.utcnow().isoformat()
+        data = client.get('/api/v1/behaviors').get_json()
+        assert data['timestamp'] >= before
+
+    def test_get_behaviors_sets_etag(self, client):
+        response = client.get('/api/v1/behaviors')
+        # Weak: the timestamp makes every body's bytes different
+        assert response.headers.get('ETag', '').startswith('W/"')
+        assert 'no-cache' in response.headers.get('Cache-Control', '')
+
+    def test_get_behaviors_not_modified_for_strong_form(self, client):
+        etag = client.get('/api/v1/behaviors').headers['ETag']
+        response = client.get('/api/v1/behaviors', headers={'If-None-Match': etag[2:]})
+        assert response.status_code == 304
+
+    def test_get_behaviors_not_modified(self, client):
+        """Conditional GET with a matching ETag should return 304 with no body."""
+        etag = client.get('/api/v1/behaviors').headers['ETag']
+        response = client.get('/api/v1/behaviors', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
+    def test_get_behaviors_stale_etag(self, client):
+        response = client.get('/api/v1/behaviors', headers={'If-None-Match': '"stale"'})
+        assert response.status_code == 200
+        assert response.get_json()['success'] is True
+
+    def test_manifest_lists_shards(self, client):
+        response = client.get('/api/v1/behaviors/manifest')
+        assert response.status_code == 200
+        data = response.get_json()
+        shards = data['data']['shards']
+        assert len(shards) > 0
+        assert all(shard['url'].endswith(shard['hash']) for shard in shards)
+
+    def test_shard_served_precompressed(self, client):
+        import gzip
+        shard = client.get('/api/v1/behaviors/manifest').get_json()['data']['shards'][0]
+        response = client.get(shard['url'], headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'immutable' in response.headers['Cache-Control']
+        category = json.loads(gzip.decompress(response.data))
+        assert category['id'] == shard['id']
+
+    def test_shard_identity_encoding(self, client):
+        shard = client.get('/api/v1/behaviors/manifest').get_json()['data']['shards'][0]
+        response = client.get(shard['url'], headers={'Accept-Encoding': 'identity'})
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_json()['id'] == shard['id']
+
+    def test_shard_unknown_hash(self, client):
+        shard = client.get('/api/v1/behaviors/manifest').get_json()['data']['shards'][0]
+        response = client.get(f"/api/v1/behaviors/shards/{shard['id']}/0000000000000000")
+        assert response.status_code == 404
+
+    def test_search(self, client):
+        response = client.get('/api/v1/behaviors/search?q=silent+treatment&fields=name')
+        assert response.status_code == 200
+        results = response.get_json()['data']['results']
+        assert results[0]['id'] == 'silent_treatment'
+        assert set(results[0]) == {'id', 'name', 'score'}
+
+    def test_search_requires_query(self, client):
+        response = client.get('/api/v1/behaviors/search')
+        assert response.status_code == 400
+
+    def test_search_within_category(self, client):
+        response = client.get('/api/v1/behaviors/search?q=boundaries&category=manipulation_tactics')
+        results = response.get_json()['data']['results']
+        assert all(r['category_id'] == 'manipulation_tactics' for r in results)
+
+    def test_suggest(self, client):
+        response = client.get('/api/v1/behaviors/suggest?q=silent')
+        assert response.status_code == 200
+        suggestions = response.get_json()['data']['suggestions']
+        assert suggestions[0]['id'] == 'silent_treatment'
+
+    def test_suggest_empty_prefix(self, client):
+        response = client.get('/api/v1/behaviors/suggest?q=')
+        assert response.get_json()['data']['suggestions'] == []
+
     def test_get_categories(self, client):
         response = client.get('/api/v1/behaviors/categories')
         assert response.status_code == 200
         data = response.get_json()
         assert data['success'] is True
+        assert len(data['data']['categories']) > 0
+
+    def test_categories_conditional_get(self, client):
+        response = client.get('/api/v1/behaviors/categories')
+        again = client.get('/api/v1/behaviors/categories',
+                           headers={'If-None-Match': response.headers['ETag']})
+        assert again.status_code == 304
+
+    def test_single_behavior_projection(self, client):
+        whole = client.get('/api/v1/behaviors/clear_boundary_setting').get_json()['data']
+        projected = client.get('/api/v1/behaviors/clear_boundary_setting?fields=name').get_json()['data']
+        assert projected == {'id': whole['id'], 'name': whole['name']}
+
+    def test_get_single_behavior(self, client):
+        response = client.get('/api/v1/behaviors/clear_boundary_setting')
+        assert response.status_code == 200
+        behavior = response.get_json()['data']
+        assert behavior['id'] == 'clear_boundary_setting'
+        assert behavior['category_id'] == 'communication_styles'
+        assert 'examples' in behavior
+
+    def test_get_single_behavior_projection(self, client):
+        response = client.get('/api/v1/behaviors/clear_boundary_setting?fields=name,definition')
+        behavior = response.get_json()['data']
+        assert set(behavior) == {'id', 'name', 'definition'}
+
+    def test_get_single_behavior_not_found(self, client):
+        response = client.get('/api/v1/behaviors/does_not_exist')
+        assert response.status_code == 404
+        assert response.get_json()['success'] is False
+
+    def test_get_single_behavior_not_modified(self, client):
+        etag = client.get('/api/v1/behaviors/clear_boundary_setting').headers['ETag']
+        response = client.get('/api/v1/behaviors/clear_boundary_setting',
+                              headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
+    def test_list_by_category(self, client):
+        response = client.get('/api/v1/behaviors?category=manipulation_tactics&fields=name')
+        assert response.status_code == 200
+        behaviors = response.get_json()['data']['behaviors']
+        assert len(behaviors) > 0
+        assert all(set(b) == {'id', 'name'} for b in behaviors)
+
+    def test_list_unknown_category(self, client):
+        response = client.get('/api/v1/behaviors?category=unknown')
+        assert response.status_code == 404
+
+    def test_list_cursor_pagination(self, client):
+        seen = []
+        url = '/api/v1/behaviors?limit=25&fields=name'
+        while url:
+            data = client.get(url).get_json()['data']
+            seen.extend(b['id'] for b in data['behaviors'])
+            cursor = data['next_cursor']
+            url = f'/api/v1/behaviors?limit=25&fields=name&cursor={cursor}' if cursor else None
+        full = client.get('/api/v1/behaviors').get_json()['data']
+        assert len(seen) == len(set(seen)) == count_behaviors(full)
+
+    def test_list_invalid_limit(self, client):
+        assert client.get('/api/v1/behaviors?limit=0').status_code == 400
+        assert client.get('/api/v1/behaviors?limit=abc').status_code == 400
+
+    def test_list_invalid_cursor(self, client):
+        response = client.get('/api/v1/behaviors?cursor=bm90LWFuLWlk')
+        assert response.status_code == 400
 
 
 # ============================================
@@ -596,6 +1781,43 @@ class TestSyncUpload:
                                headers=auth_header)
         assert response.status_code == 200
 
+    def test_rejects_non_string_fields(self, client, auth_header):
+        response = client.post('/api/v1/sync/upload',
+                               json={'encrypted_data': {'a': 1}, 'user_hash': 'abc'},
+                               headers=auth_header)
+        assert response.status_code == 400
+
+    def test_rejects_oversized_data(self, client, auth_header):
+        with patch('app.SYNC_MAX_BLOB_BYTES', 10):
+            response = client.post('/api/v1/sync/upload',
+                                   json={'encrypted_data': 'x' * 11, 'user_hash': uuid.uuid4().hex},
+                                   headers=auth_header)
+        assert response.status_code == 413
+
+    def test_versions_and_unchanged_uploads(self, client, auth_header):
+        user_hash = uuid.uuid4().hex
+        first = client.post('/api/v1/sync/upload',
+                            json={'encrypted_data': 'blob-1', 'user_hash': user_hash},
+                            headers=auth_header).get_json()['data']
+        second = client.post('/api/v1/sync/upload',
+                             json={'encrypted_data': 'blob-2', 'user_hash': user_hash},
+                             headers=auth_header).get_json()['data']
+        again = client.post('/api/v1/sync/upload',
+                            json={'encrypted_data': 'blob-2', 'user_hash': user_hash},
+                            headers=auth_header).get_json()['data']
+        assert (first['version'], first['status']) == (1, 'stored')
+        assert (second['version'], second['status']) == (2, 'stored')
+        assert (again['version'], again['status']) == (2, 'unchanged')
+        assert again['sync_id'] == second['sync_id'] != first['sync_id']
+
+
+    def test_unavailable_without_encryption(self, client, auth_header):
+        with patch('app.sync_store', None):
+            response = client.post('/api/v1/sync/upload',
+                                   json={'encrypted_data': 'blob', 'user_hash': uuid.uuid4().hex},
+                                   headers=auth_header)
+        assert response.status_code == 503
+
 
 class TestSyncDownload:
     """Tests for /api/v1/sync/download endpoint."""
@@ -614,6 +1836,46 @@ class TestSyncDownload:
         data = response.get_json()
         assert data['data']['status'] == 'no_data'
 
+    def test_round_trip(self, client, auth_header):
+        user_hash = uuid.uuid4().hex
+        client.post('/api/v1/sync/upload',
+                    json={'encrypted_data': 'old-blob', 'user_hash': user_hash},
+                    headers=auth_header)
+        uploaded = client.post('/api/v1/sync/upload',
+                               json={'encrypted_data': 'new-blob', 'user_hash': user_hash},
+                               headers=auth_header).get_json()['data']
+
+        data = client.post('/api/v1/sync/download',
+                           json={'user_hash': user_hash},
+                           headers=auth_header).get_json()['data']
+        assert data['status'] == 'found'
+        assert data['encrypted_data'] == 'new-blob'
+        assert data['sync_id'] == uploaded['sync_id']
+        assert data['version'] == 2
+        assert data['last_sync'] is not None
+
+        data = client.post('/api/v1/sync/download',
+                           json={'user_hash': user_hash, 'version': 1},
+                           headers=auth_header).get_json()['data']
+        assert data['encrypted_data'] == 'old-blob'
+
+    def test_unchanged_for_current_sync_id(self, client, auth_header):
+        user_hash = uuid.uuid4().hex
+        uploaded = client.post('/api/v1/sync/upload',
+                               json={'encrypted_data': 'blob', 'user_hash': user_hash},
+                               headers=auth_header).get_json()['data']
+        data = client.post('/api/v1/sync/download',
+                           json={'user_hash': user_hash, 'sync_id': uploaded['sync_id']},
+                           headers=auth_header).get_json()['data']
+        assert data['status'] == 'unchanged'
+        assert data['encrypted_data'] is None
+
+    def test_rejects_invalid_version(self, client, auth_header):
+        response = client.post('/api/v1/sync/download',
+                               json={'user_hash': 'abc', 'version': 'latest'},
+                               headers=auth_header)
+        assert response.status_code == 400
+
 
 # ============================================
 # USER DATA DELETION ENDPOINT
@@ -638,6 +1900,36 @@ class TestDeleteUserData:
         assert data['data']['deleted'] is True
         assert 'confirmation_code' in data['data']
 
+    def test_deletes_sync_data(self, client, auth_header):
+        user_hash = uuid.uuid4().hex
+        client.post('/api/v1/sync/upload',
+                    json={'encrypted_data': 'blob', 'user_hash': user_hash},
+                    headers=auth_header)
+        response = client.delete('/api/v1/user/delete',
+                                 json={'user_hash': user_hash},
+                                 headers=auth_header)
+        assert response.status_code == 200
+        assert response.get_json()['data']['sync_versions'] == 1
+        data = client.post('/api/v1/sync/download',
+                           json={'user_hash': user_hash},
+                           headers=auth_header).get_json()['data']
+        assert data['status'] == 'no_data'
+
+    def test_reports_cached_analyses_expiry(self, client, auth_header):
+        """Cached analyses and conversation states are not linked to a user; the response says when they expire."""
+        import app as app_module
+        response = client.delete('/api/v1/user/delete',
+                                 json={'user_hash': uuid.uuid4().hex},
+                                 headers=auth_header)
+        data = response.get_json()
+        assert data['data']['sync_versions'] == 0
+        assert data['data']['expires_within'] == {
+            'cached_analyses': 24 * 3600,
+            'conversation_states': app_module.INCREMENTAL_STATE_TTL
+        }
+        assert 'All your data' not in data['message']
+        assert f'{app_module.INCREMENTAL_STATE_TTL // 3600} hours' in data['message']
+
     def test_requires_auth(self, client):
         """Data deletion requires authentication."""
         response = client.delete('/api/v1/user/delete',
@@ -0,0 +1,288 @@
+"""
+Tests for the async (aiohttp) analysis server.
+
+Run: python -m pytest tests/test_async_app.py -v
+"""
+
+import asyncio
+import json
+import threading
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import async_app
+from single_flight import AsyncSingleFlight
+
+
+@pytest_asyncio.fixture
+async def async_client():
+    """aiohttp test client with fresh rate-limit state."""
+    async_app._rate_limiter.storage.reset()
+    client = TestClient(TestServer(await async_app.create_app()))
+    await client.start_server()
+    yield client
+    await client.close()
+
+
+def mock_model(mock_genai, text, delay=0.0):
+    model = MagicMock()
+    mock_genai.GenerativeModel.return_value = model
+    response = MagicMock()
+    response.text = text
+
+    async def generate(*args, **kwargs):
+        await asyncio.sleep(delay)
+        return response
+    model.generate_content_async = AsyncMock(side_effect=generate)
+    return model
+
+
+class TestAsyncAnalyzeRoutes:
+    """Tests for the async analyze endpoints."""
+
+    @pytest.mark.asyncio
+    async def test_health(self, async_client):
+        response = await async_client.get('/health')
+        assert response.status == 200
+        data = await response.json()
+        assert data['mode'] == 'async'
+
+    @pytest.mark.asyncio
+    async def test_conversation_analysis(self, async_client):
+        with patch('app.genai') as mock_genai:
+            model = mock_model(mock_genai, json.dumps({"summary": "Friendly"}))
+            response = await async_client.post('/api/v1/analyze/conversation', json={
+                'conversation': [{'speaker': 'Alice', 'text': 'Hi'}],
+                'speakers': ['Alice']
+            })
+            assert response.status == 200
+            data = await response.json()
+            assert data['success'] is True
+            assert data['data']['summary'] == "Friendly"
+            assert model.generate_content_async.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_missing_field(self, async_client):
+        response = await async_client.post('/api/v1/analyze/profile', json={})
+        assert response.status == 400
+        data = await response.json()
+        assert data['success'] is False
+        assert data['error'] == "Missing required field"
+
+    @pytest.mark.asyncio
+    async def test_invalid_json_body(self, async_client):
+        response = await async_client.post('/api/v1/analyze/identify-speakers', data=b'not json')
+        assert response.status == 400
+
+    @pytest.mark.asyncio
+    async def test_upstream_error(self, async_client):
+        with patch('app.genai') as mock_genai:
+            model = MagicMock()
+            mock_genai.GenerativeModel.return_value = model
+            model.generate_content_async = AsyncMock(side_effect=Exception("API rate limit"))
+            response = await async_client.post('/api/v1/analyze/identify-speakers',
+                                               json={'text': 'Some conversation text'})
+            assert response.status == 500
+            assert (await response.json())['success'] is False
+
+    @pytest.mark.asyncio
+    async def test_unparseable_output_uses_fallback(self, async_client):
+        with patch('app.genai') as mock_genai:
+            mock_model(mock_genai, "not json")
+            response = await async_client.post('/api/v1/analyze/identify-speakers',
+                                               json={'text': 'Some conversation text'})
+            data = await response.json()
+            assert response.status == 200
+            assert data['data']['raw_response'] == "not json"
+
+    @pytest.mark.asyncio
+    async def test_simple_analysis_format(self, async_client):
+        with patch('app.genai') as mock_genai:
+            mock_model(mock_genai, json.dumps({"speakers": [{"label": "Speaker 1"}]}))
+            response = await async_client.post('/analyze', json={'text': 'Hello there'})
+            assert response.status == 200
+            assert (await response.json())['speakers'][0]['label'] == "Speaker 1"
+
+            response = await async_client.post('/analyze', json={})
+            assert response.status == 400
+            assert (await response.json())['message'] == 'Missing required field: text'
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_do_not_serialize(self, async_client):
+        """Many slow upstream calls overlap instead of queueing behind threads."""
+        with patch('app.genai') as mock_genai:
+            mock_model(mock_genai, json.dumps({"impact_analysis": {}}), delay=0.2)
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            responses = await asyncio.gather(*[
+                async_client.post('/api/v1/analyze/response-impact', json={
+                    'conversation': f'Alice: message {i}',
+                    'user_speaker': 'Alice',
+                    'draft_response': 'Hi'
+                })
+                for i in range(20)
+            ])
+            assert all(r.status == 200 for r in responses)
+            assert loop.time() - start < 2.0
+
+    @pytest.mark.asyncio
+    async def test_rate_limit(self, async_client):
+        for _ in range(10):
+            await async_client.post('/api/v1/analyze/profile', json={})
+        response = await async_client.post('/api/v1/analyze/profile', json={})
+        assert response.status == 429
+
+    @pytest.mark.asyncio
+    async def test_finish_runs_off_the_event_loop(self):
+        import app as api
+        threads = []
+        analysis = api.PreparedAnalysis(
+            'response_impact', 'prompt', fallback=lambda text: {}, message="Done",
+            record=lambda result: threads.append(threading.current_thread())
+        )
+        with patch('app.generate_json_async', AsyncMock(return_value=({'a': 1}, '{"a": 1}'))):
+            assert await api.execute_analysis_async(analysis) == ({'a': 1}, "Done")
+        assert threads and threads[0] is not threading.current_thread()
+
+    @pytest.mark.asyncio
+    async def test_windows_respect_concurrency_limit(self):
+        import app as api
+        running = peak = 0
+
+        async def generate(*args):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return {'summary': 'ok'}, '{"summary": "ok"}'
+
+        analysis = api.PreparedAnalysis(
+            'conversation', None, fallback=lambda text: {}, message="Done",
+            windows=['prompt'] * 10, merge=lambda results: {'windows': len(results)}
+        )
+        with patch('app.generate_json_async', AsyncMock(side_effect=generate)), \
+                patch('app.LONG_CONVERSATION_CONCURRENCY', 3):
+            assert await api.execute_analysis_async(analysis) == ({'windows': 10}, "Done")
+        assert peak == 3
+
+
+class TestAsyncJobs:
+    """Tests for ?mode=async profile analyses on the async server."""
+
+    @pytest.mark.asyncio
+    async def test_profile_job_lifecycle(self, async_client):
+        with patch('app.genai') as mock_genai:
+            model = mock_model(mock_genai, '')
+            response = MagicMock()
+            response.text = json.dumps({"profile_summary": "A balanced communicator"})
+            model.generate_content.return_value = response
+
+            response = await async_client.post('/api/v1/analyze/profile?mode=async',
+                                               json={'profile_data': {'name': 'Test', 'conversations': []}})
+            assert response.status == 202
+            job = (await response.json())['data']
+            assert response.headers['Location'] == job['status_url']
+
+            response = await async_client.get(f"{job['status_url']}?wait=10")
+            assert response.status == 200
+            job = (await response.json())['data']
+            assert job['status'] == 'succeeded'
+            assert job['result']['data']['profile_summary'] == "A balanced communicator"
+
+    @pytest.mark.asyncio
+    async def test_async_mode_rejected_without_encryption(self, async_client):
+        with patch('app.job_queue', None):
+            response = await async_client.post('/api/v1/analyze/self-profile?mode=async',
+                                               json={'user_data': {'conversations': []}})
+        assert response.status == 503
+
+    @pytest.mark.asyncio
+    async def test_unknown_job(self, async_client):
+        response = await async_client.get('/api/v1/jobs/does-not-exist')
+        assert response.status == 404
+
+
+
+class TestAsyncStreaming:
+    """Tests for streamed analyses on the async server."""
+
+    @pytest.mark.asyncio
+    async def test_ndjson_stream(self, async_client):
+        text = json.dumps({"summary": "Friendly", "speaker_analyses": [{"speaker": "Alice"}]})
+        with patch('app.genai') as mock_genai:
+            model = MagicMock()
+            mock_genai.GenerativeModel.return_value = model
+
+            async def chunks():
+                for start in range(0, len(text), 10):
+                    chunk = MagicMock()
+                    chunk.text = text[start:start + 10]
+                    yield chunk
+            model.generate_content_async = AsyncMock(return_value=chunks())
+
+            response = await async_client.post('/api/v1/analyze/conversation?stream=ndjson', json={
+                'conversation': [{'speaker': 'Alice', 'text': 'Hi'}],
+                'speakers': ['Alice']
+            })
+            assert response.status == 200
+            assert response.headers['Content-Type'].startswith('application/x-ndjson')
+            lines = [json.loads(line) for line in (await response.text()).splitlines()]
+            events = [line['event'] for line in lines]
+            assert events[0] == 'start'
+            assert 'section' in events and 'item' in events
+            assert lines[-1]['event'] == 'complete'
+            assert lines[-1]['data']['data']['summary'] == "Friendly"
+            assert model.generate_content_async.call_args.kwargs['stream'] is True
+
+
+class TestAsyncSingleFlight:
+    """Tests for coroutine coalescing."""
+
+    @pytest.mark.asyncio
+    async def test_coalesces_concurrent_calls(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "value"
+
+        results = await asyncio.gather(*[flight.do('key', slow) for _ in range(5)])
+        assert len(calls) == 1
+        assert [value for value, _ in results] == ["value"] * 5
+        assert flight.stats()['coalesced'] == 4
+
+    @pytest.mark.asyncio
+    async def test_errors_propagate(self):
+        flight = AsyncSingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("failed")
+
+        results = await asyncio.gather(*[flight.do('key', failing) for _ in range(3)],
+                                       return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert flight.stats()['in_flight'] == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        flight = AsyncSingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "value"
+
+        leader = asyncio.ensure_future(flight.do('key', slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do('key', slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == ("value", True)
+        assert leader.cancelled()
+        assert flight.stats()['in_flight'] == 0
@@ -0,0 +1,364 @@
+"""
+Tests for behavior library loading and validation.
+
+Run: python -m pytest tests/test_behavior_library.py -v
+"""
+
+import gzip
+import json
+import os
+import time
+import pytest
+from unittest.mock import patch
+
+import behavior_library
+
+from behavior_library import (
+    BehaviorLibrary,
+    BehaviorLibraryError,
+    BehaviorLibraryStore,
+    BehaviorShard,
+    brotli,
+    load_behavior_library,
+    main,
+    validate_library,
+)
+
+
+# ============================================
+# FIXTURES
+# ============================================
+
+@pytest.fixture
+def library_data():
+    return {
+        "version": "1.0.0",
+        "total_behaviors": 2,
+        "categories": [
+            {
+                "id": "communication_styles",
+                "category": "Communication Styles",
+                "subcategories": [
+                    {
+                        "id": "assertive",
+                        "name": "Assertive",
+                        "behaviors": [
+                            {"id": "assert_1", "name": "Direct Expression"},
+                            {"id": "assert_2", "name": "Clear Boundaries"},
+                        ]
+                    }
+                ]
+            }
+        ]
+    }
+
+
+def default_library():
+    return {"version": "0.0.0", "categories": []}
+
+
+def envelope(data, message):
+    return {"success": True, "message": message, "data": data}
+
+
+# ============================================
+# VALIDATION
+# ============================================
+
+class TestValidateLibrary:
+    """Tests for library structure validation."""
+
+    def test_accepts_valid_library(self, library_data):
+        validate_library(library_data)
+
+    def test_rejects_non_object(self):
+        with pytest.raises(BehaviorLibraryError):
+            validate_library([])
+
+    def test_rejects_missing_categories(self):
+        with pytest.raises(BehaviorLibraryError):
+            validate_library({"version": "1.0.0"})
+
+    def test_rejects_category_without_id(self, library_data):
+        del library_data['categories'][0]['id']
+        with pytest.raises(BehaviorLibraryError):
+            validate_library(library_data)
+
+    def test_rejects_duplicate_behavior_ids(self, library_data):
+        behaviors = library_data['categories'][0]['subcategories'][0]['behaviors']
+        behaviors[1]['id'] = behaviors[0]['id']
+        with pytest.raises(BehaviorLibraryError):
+            validate_library(library_data)
+
+    def test_count_mismatch_is_not_fatal(self, library_data):
+        library_data['total_behaviors'] = 162
+        validate_library(library_data)
+
+
+# ============================================
+# SNAPSHOT
+# ============================================
+
+class TestBehaviorLibrary:
+    """Tests for the immutable library snapshot."""
+
+    def test_body_is_pre_encoded_envelope(self, library_data):
+        library = BehaviorLibrary(library_data, envelope)
+        body = json.loads(library.body)
+        assert body['data'] == library_data
+        assert body['message'] == "Loaded 2 behaviors and traits"
+
+    def test_body_timestamp_is_per_response(self, library_data):
+        stamped = lambda data, message: {"success": True, "timestamp": "built", "data": data}
+        library = BehaviorLibrary(library_data, stamped)
+        first = json.loads(library.body)
+        time.sleep(0.01)
+        second = json.loads(library.body)
+        assert first['data'] == library_data
+        assert first['timestamp'] != 'built'
+        assert second['timestamp'] > first['timestamp']
+
+    def test_categories_body_is_pre_encoded(self, library_data):
+        body = json.loads(BehaviorLibrary(library_data, envelope).categories_body)
+        assert body['data'] == {'categories': ['Communication Styles']}
+
+    def test_behavior_body_is_encoded_once(self, library_data):
+        library = BehaviorLibrary(library_data, envelope)
+        with patch('behavior_library.encode', wraps=behavior_library.encode) as encode:
+            body = library.behavior_body('assert_1')
+            assert library.behavior_body('assert_1') == body
+        assert encode.call_count == 1
+        assert json.loads(body)['data']['subcategory_id'] == 'assertive'
+        assert json.loads(body)['message'] == "Loaded behavior: Direct Expression"
+        assert library.behavior_body('missing') is None
+
+    def test_category_and_behavior_timestamps_are_per_response(self, library_data):
+        stamped = lambda data, message: {"success": True, "timestamp": "built", "data": data}
+        library = BehaviorLibrary(library_data, stamped)
+        assert json.loads(library.categories_body)['timestamp'] != 'built'
+        first = json.loads(library.behavior_body('assert_1'))
+        time.sleep(0.01)
+        second = json.loads(library.behavior_body('assert_1'))
+        assert first['timestamp'] != 'built'
+        assert second['timestamp'] > first['timestamp']
+        assert second['data'] == first['data']
+
+    def test_etag_is_content_hash(self, library_data):
+        first = BehaviorLibrary(library_data)
+        second = BehaviorLibrary(json.loads(json.dumps(library_data)))
+        assert first.etag == second.etag
+
+        library_data['version'] = "1.0.1"
+        assert BehaviorLibrary(library_data).etag != first.etag
+
+    def test_is_immutable(self, library_data):
+        library = BehaviorLibrary(library_data)
+        with pytest.raises(AttributeError):
+            library.version = "2.0.0"
+
+    def test_metadata(self, library_data):
+        library = BehaviorLibrary(library_data)
+        assert library.version == "1.0.0"
+        assert library.behavior_count == 2
+
+
+class TestBehaviorIndexes:
+    """Tests for id and category lookups."""
+
+    def test_get_behavior(self, library_data):
+        entry = BehaviorLibrary(library_data).get_behavior('assert_2')
+        assert entry.behavior['name'] == "Clear Boundaries"
+        assert entry.category_id == 'communication_styles'
+        assert entry.subcategory_id == 'assertive'
+
+    def test_get_unknown_behavior(self, library_data):
+        assert BehaviorLibrary(library_data).get_behavior('missing') is None
+
+    def test_projection_keeps_id(self, library_data):
+        entry = BehaviorLibrary(library_data).get_behavior('assert_1')
+        assert entry.to_dict(['name']) == {'id': 'assert_1', 'name': "Direct Expression"}
+
+    def test_projection_does_not_mutate_library(self, library_data):
+        library = BehaviorLibrary(library_data)
+        library.get_behavior('assert_1').to_dict()['name'] = "Changed"
+        assert library.get_behavior('assert_1').behavior['name'] == "Direct Expression"
+
+    def test_list_by_subcategory(self, library_data):
+        entries, cursor = BehaviorLibrary(library_data).list_behaviors(subcategory_id='assertive')
+        assert [e.behavior['id'] for e in entries] == ['assert_1', 'assert_2']
+        assert cursor is None
+
+    def test_pagination(self, library_data):
+        library = BehaviorLibrary(library_data)
+        first, cursor = library.list_behaviors(limit=1)
+        assert [e.behavior['id'] for e in first] == ['assert_1']
+        second, cursor = library.list_behaviors(cursor=cursor, limit=1)
+        assert [e.behavior['id'] for e in second] == ['assert_2']
+        assert cursor is None
+
+    def test_invalid_cursor(self, library_data):
+        with pytest.raises(ValueError):
+            BehaviorLibrary(library_data).list_behaviors(cursor='!!!')
+
+    def test_search(self, library_data):
+        results = BehaviorLibrary(library_data).search("boundaries")
+        assert results[0][0].behavior['id'] == 'assert_2'
+
+    def test_search_unknown_category(self, library_data):
+        assert BehaviorLibrary(library_data).search("boundaries", category_id='missing') == []
+
+    def test_suggest(self, library_data):
+        assert BehaviorLibrary(library_data).suggest("dir")[0]['id'] == 'assert_1'
+
+    def test_category_names(self, library_data):
+        assert BehaviorLibrary(library_data).category_names() == ["Communication Styles"]
+
+
+class TestBehaviorShards:
+    """Tests for precompressed, content-addressed category shards."""
+
+    def test_one_shard_per_category(self, library_data):
+        library = BehaviorLibrary(library_data)
+        assert list(library.shards) == ['communication_styles']
+        assert library.shards['communication_styles'].behavior_count == 2
+
+    def test_encodings_round_trip(self, library_data):
+        shard = BehaviorShard(library_data['categories'][0])
+        identity = shard.encodings['identity']
+        assert json.loads(identity) == library_data['categories'][0]
+        assert gzip.decompress(shard.encodings['gzip']) == identity
+        if brotli is not None:
+            assert brotli.decompress(shard.encodings['br']) == identity
+
+    def test_hash_changes_with_content(self, library_data):
+        category = library_data['categories'][0]
+        before = BehaviorShard(category).hash
+        category['subcategories'][0]['behaviors'][0]['name'] = "Changed"
+        assert BehaviorShard(category).hash != before
+
+    def test_select_encoding(self, library_data):
+        shard = BehaviorShard(library_data['categories'][0])
+        accepts = {'gzip': 1}
+        assert shard.select_encoding(lambda e: accepts.get(e, 0)) == 'gzip'
+        assert shard.select_encoding(lambda e: 0) == 'identity'
+
+    def test_manifest(self, library_data):
+        manifest = BehaviorLibrary(library_data).manifest()
+        assert manifest['version'] == "1.0.0"
+        assert manifest['shards'][0]['id'] == 'communication_styles'
+
+    def test_build_shards_command(self, tmp_path, library_data):
+        source = tmp_path / "library.json"
+        source.write_text(json.dumps(library_data))
+        out = tmp_path / "dist"
+        assert main(['build-shards', '--library', str(source), '--out', str(out)]) == 0
+
+        manifest = json.loads((out / "manifest.json").read_text())
+        filename = f"communication_styles.{manifest['shards'][0]['hash']}.json"
+        assert (out / filename).exists()
+        assert (out / (filename + ".gz")).exists()
+
+
+class TestLoadBehaviorLibrary:
+    """Tests for loading the library from disk."""
+
+    def test_loads_file(self, tmp_path, library_data):
+        path = tmp_path / "library.json"
+        path.write_text(json.dumps(library_data))
+        library = load_behavior_library(str(path), default=default_library)
+        assert library.behavior_count == 2
+        assert library.source == str(path)
+
+    def test_missing_file_uses_default(self, tmp_path):
+        library = load_behavior_library(str(tmp_path / "missing.json"), default=default_library)
+        assert library.version == "0.0.0"
+        assert library.source is None
+
+    def test_invalid_file_uses_default(self, tmp_path):
+        path = tmp_path / "library.json"
+        path.write_text("{not json")
+        library = load_behavior_library(str(path), default=default_library)
+        assert library.version == "0.0.0"
+
+    def test_loads_shipped_library(self):
+        from app import BEHAVIOR_LIBRARY_PATH, get_default_behavior_library
+        library = load_behavior_library(BEHAVIOR_LIBRARY_PATH, default=get_default_behavior_library)
+        assert library.source == BEHAVIOR_LIBRARY_PATH
+        assert library.behavior_count > 0
+
+
+# ============================================
+# HOT RELOAD
+# ============================================
+
+def write_library(path, data, mtime):
+    path.write_text(json.dumps(data))
+    os.utime(path, ns=(mtime, mtime))
+
+
+class TestBehaviorLibraryStore:
+    """Tests for change detection and atomic snapshot swaps."""
+
+    def test_loads_initial_snapshot(self, tmp_path, library_data):
+        path = tmp_path / "library.json"
+        write_library(path, library_data, 1_000_000_000)
+        store = BehaviorLibraryStore(str(path), default=default_library)
+        assert store.current.version == "1.0.0"
+        assert store.status()['behavior_count'] == 2
+
+    def test_unchanged_file_is_not_reloaded(self, tmp_path, library_data):
+        path = tmp_path / "library.json"
+        write_library(path, library_data, 1_000_000_000)
+        store = BehaviorLibraryStore(str(path), default=default_library)
+        snapshot = store.current
+        assert store.check() is False
+        assert store.current is snapshot
+
+    def test_touched_file_with_same_content_keeps_snapshot(self, tmp_path, library_data):
+        path = tmp_path / "library.json"
+        write_library(path, library_data, 1_000_000_000)
+        store = BehaviorLibraryStore(str(path), default=default_library)
+        snapshot = store.current
+        write_library(path, library_data, 2_000_000_000)
+        assert store.check() is False
+        assert store.current is snapshot
+
+    def test_changed_file_is_swapped_in(self, tmp_path, library_data):
+        path = tmp_path / "library.json"
+        write_library(path, library_data, 1_000_000_000)
+        store = BehaviorLibraryStore(str(path), default=default_library)
+        old = store.current
+
+        library_data['version'] = "1.1.0"
+        write_library(path, library_data, 2_000_000_000)
+        assert store.check() is True
+        assert store.current.version == "1.1.0"
+        assert store.reload_count == 1
+        # Requests holding the old snapshot are unaffected
+        assert old.version == "1.0.0"
+
+    def test_invalid_file_keeps_current_snapshot(self, tmp_path, library_data):
+        path = tmp_path / "library.json"
+        write_library(path, library_data, 1_000_000_000)
+        store = BehaviorLibraryStore(str(path), default=default_library)
+
+        path.write_text('{"categories": "broken"}')
+        os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+        assert store.check() is False
+        assert store.current.version == "1.0.0"
+        assert store.status()['last_error']
+
+    def test_watcher_picks_up_changes(self, tmp_path, library_data):
+        path = tmp_path / "library.json"
+        write_library(path, library_data, 1_000_000_000)
+        store = BehaviorLibraryStore(str(path), default=default_library)
+        store.start_watcher(0.01)
+        try:
+            library_data['version'] = "2.0.0"
+            write_library(path, library_data, 2_000_000_000)
+            deadline = time.time() + 5
+            while store.current.version != "2.0.0" and time.time() < deadline:
+                time.sleep(0.01)
+            assert store.current.version == "2.0.0"
+        finally:
+            store.stop_watcher()
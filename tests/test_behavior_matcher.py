@@ -0,0 +1,83 @@
+"""
+Tests for matching conversation messages against the behavior library.
+
+Run: python -m pytest tests/test_behavior_matcher.py -v
+"""
+
+import pytest
+
+from behavior_matcher import BehaviorMatcher, PHRASE_BOOST, features, words
+
+
+# ============================================
+# FIXTURES
+# ============================================
+
+@pytest.fixture
+def behaviors():
+    return [
+        {
+            "id": "silent_treatment",
+            "name": "Silent Treatment",
+            "definition": "Refusing to communicate as punishment",
+            "examples": ["Ignoring messages for days"],
+        },
+        {
+            "id": "gaslighting",
+            "name": "Gaslighting",
+            "definition": "Making someone doubt their perception of reality",
+            "examples": ["That never happened, you're imagining things"],
+        },
+        {
+            "id": "clear_boundary_setting",
+            "name": "Clear Boundary Setting",
+            "definition": "Directly stating personal limits",
+            "examples": ["I need some time alone to process this"],
+        },
+    ]
+
+
+@pytest.fixture
+def matcher(behaviors):
+    return BehaviorMatcher(behaviors)
+
+
+# ============================================
+# MATCHING
+# ============================================
+
+class TestBehaviorMatcher:
+    """Tests for BehaviorMatcher."""
+
+    def test_best_match_first(self, matcher):
+        results = matcher.match(["You keep imagining things, that never happened"])
+        assert results[0][0] == 'gaslighting'
+
+    def test_each_behavior_scored_by_its_best_message(self, matcher):
+        results = dict(matcher.match([
+            "I'm ignoring your messages",
+            "Stop doubting your perception of reality",
+        ]))
+        assert set(results) >= {'silent_treatment', 'gaslighting'}
+
+    def test_example_phrase_adds_boost(self, matcher):
+        results = dict(matcher.match(["Honestly I need some time alone to process this."]))
+        assert results['clear_boundary_setting'] > PHRASE_BOOST
+
+    def test_curly_apostrophes_match(self, matcher):
+        assert words("you’re") == ["you're"]
+        results = dict(matcher.match(["That never happened, you’re imagining things"]))
+        assert results['gaslighting'] > PHRASE_BOOST
+
+    def test_limit_and_threshold(self, matcher):
+        assert len(matcher.match(["silent treatment, gaslighting and boundary setting"], limit=2)) == 2
+        assert matcher.match(["lunch at noon?"]) == []
+
+    def test_empty_inputs(self, behaviors):
+        assert BehaviorMatcher(behaviors).match([]) == []
+        assert BehaviorMatcher([]).match(["anything"]) == []
+
+    def test_features_are_stable_across_processes(self):
+        # crc32, unlike hash(), is not randomized per process
+        assert features("silent treatment") == features("Silent Treatment!")
+        assert len(features("silent treatment")) == 3
@@ -0,0 +1,125 @@
+"""
+Tests for behavior library full-text search and type-ahead.
+
+Run: python -m pytest tests/test_behavior_search.py -v
+"""
+
+import pytest
+
+from behavior_search import BehaviorSearch, PrefixTrie, SearchIndex, tokenize
+
+
+# ============================================
+# FIXTURES
+# ============================================
+
+@pytest.fixture
+def behaviors():
+    return [
+        {
+            "id": "silent_treatment",
+            "name": "Silent Treatment",
+            "definition": "Refusing to communicate as punishment",
+            "examples": ["Ignoring messages for days"],
+        },
+        {
+            "id": "gaslighting",
+            "name": "Gaslighting",
+            "definition": "Making someone doubt their perception of reality",
+            "examples": ["That never happened, you're imagining things"],
+            "unhealthy_indicators": ["Denies events the partner remembers"],
+        },
+        {
+            "id": "clear_boundary_setting",
+            "name": "Clear Boundary Setting",
+            "definition": "Directly stating personal limits",
+            "healthy_indicators": ["Communicates limits calmly"],
+        },
+    ]
+
+
+# ============================================
+# TOKENIZER
+# ============================================
+
+class TestTokenize:
+    """Tests for query and document tokenization."""
+
+    def test_lowercases_and_splits(self):
+        assert tokenize("Silent Treatment!") == ["silent", "treatment"]
+
+    def test_drops_stopwords(self):
+        assert tokenize("the reality of it") == ["reality"]
+
+    def test_strips_possessive(self):
+        assert tokenize("partner's view") == ["partner", "view"]
+
+
+# ============================================
+# SEARCH
+# ============================================
+
+class TestSearchIndex:
+    """Tests for BM25 ranking."""
+
+    def test_name_match_ranks_first(self, behaviors):
+        index = SearchIndex([(b['id'], b) for b in behaviors])
+        results = index.search("silent treatment")
+        assert results[0][0] == "silent_treatment"
+
+    def test_searches_examples_and_indicators(self, behaviors):
+        index = SearchIndex([(b['id'], b) for b in behaviors])
+        assert index.search("imagining")[0][0] == "gaslighting"
+        assert index.search("calmly")[0][0] == "clear_boundary_setting"
+
+    def test_no_match(self, behaviors):
+        index = SearchIndex([(b['id'], b) for b in behaviors])
+        assert index.search("zebra") == []
+
+    def test_limit(self, behaviors):
+        index = SearchIndex([(b['id'], b) for b in behaviors])
+        assert len(index.search("limits reality punishment", limit=2)) == 2
+
+    def test_allowed_filter(self, behaviors):
+        index = SearchIndex([(b['id'], b) for b in behaviors])
+        assert index.search("reality", allowed=["silent_treatment"]) == []
+
+    def test_empty_index(self):
+        assert SearchIndex([]).search("anything") == []
+
+
+# ============================================
+# TYPE-AHEAD
+# ============================================
+
+class TestPrefixTrie:
+    """Tests for prefix suggestions."""
+
+    def test_prefix_of_name(self, behaviors):
+        trie = PrefixTrie([(b['id'], b['name']) for b in behaviors])
+        assert trie.suggest("gas") == [{"id": "gaslighting", "name": "Gaslighting"}]
+
+    def test_prefix_of_later_word(self, behaviors):
+        trie = PrefixTrie([(b['id'], b['name']) for b in behaviors])
+        assert [s['id'] for s in trie.suggest("bound")] == ["clear_boundary_setting"]
+
+    def test_multi_word_prefix(self, behaviors):
+        trie = PrefixTrie([(b['id'], b['name']) for b in behaviors])
+        assert [s['id'] for s in trie.suggest("silent  tr")] == ["silent_treatment"]
+
+    def test_start_of_name_ranks_first(self):
+        trie = PrefixTrie([("a", "Healthy Setting"), ("b", "Setting Limits")])
+        assert [s['id'] for s in trie.suggest("set")] == ["b", "a"]
+
+    def test_no_match(self, behaviors):
+        trie = PrefixTrie([(b['id'], b['name']) for b in behaviors])
+        assert trie.suggest("xyz") == []
+
+
+class TestBehaviorSearch:
+    """Tests for the combined search facade."""
+
+    def test_search_and_suggest(self, behaviors):
+        search = BehaviorSearch(behaviors)
+        assert search.search("perception")[0][0] == "gaslighting"
+        assert search.suggest("cle")[0]['id'] == "clear_boundary_setting"
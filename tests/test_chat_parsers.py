@@ -0,0 +1,136 @@
+"""
+Tests for the deterministic chat-export parsers.
+
+Run: python -m pytest tests/test_chat_parsers.py -v
+"""
+
+import json
+import pytest
+
+from chat_parsers import parse_chat, plausible_speaker
+
+
+def texts(parsed):
+    return [message['text'] for message in parsed.messages]
+
+
+class TestParseChat:
+    """Tests for parse_chat across export formats."""
+
+    def test_plain_name_prefix(self):
+        parsed = parse_chat('Alice: Hello\nBob: Hi there')
+        assert parsed.format == 'plain'
+        assert parsed.speakers() == ['Alice', 'Bob']
+        assert texts(parsed) == ['Hello', 'Hi there']
+        assert parsed.confidence >= 0.8
+
+    def test_whatsapp_ios_with_multiline_message(self):
+        parsed = parse_chat(
+            '[12/03/2024, 14:23:45] Alice: Hello\n'
+            '[12/03/2024, 14:24:01] Bob: Hi there\nsecond line\n'
+            '[12/03/2024, 14:25:00] Alice: ok'
+        )
+        assert parsed.format == 'whatsapp'
+        assert texts(parsed) == ['Hello', 'Hi there\nsecond line', 'ok']
+        assert parsed.messages[0]['timestamp'] == '12/03/2024, 14:23:45'
+
+    def test_whatsapp_android_skips_system_lines(self):
+        parsed = parse_chat(
+            '12/03/2024, 14:23 - Messages and calls are end-to-end encrypted.\n'
+            '12/03/2024, 14:23 - Alice: Hello\n'
+            '12/03/24, 2:24 PM - Bob: Hi: there'
+        )
+        assert parsed.format == 'whatsapp'
+        assert parsed.speakers() == ['Alice', 'Bob']
+        assert texts(parsed) == ['Hello', 'Hi: there']
+        assert parsed.confidence == 0.98
+
+    def test_sms_backup_with_phone_number_sender(self):
+        parsed = parse_chat('2024-01-05 15:22:11 Alice: Hello\n2024-01-05 15:23:00 +61 412 345 678: Who is this?')
+        assert parsed.format == 'sms'
+        assert parsed.speakers() == ['Alice', '+61 412 345 678']
+
+    def test_discord_copy_paste(self):
+        parsed = parse_chat('Alice — Today at 3:22 PM\nHello\nsecond\nBob — Today at 3:23 PM\nHi')
+        assert parsed.format == 'discord'
+        assert texts(parsed) == ['Hello\nsecond', 'Hi']
+
+    def test_imessage_export(self):
+        parsed = parse_chat(
+            'Jan 05, 2024  3:22:11 PM\nAlice\nHello\n\n'
+            'Jan 05, 2024  3:23:11 PM (Read by you after 1 minute)\nMe\nHi there'
+        )
+        assert parsed.format == 'imessage'
+        assert parsed.speakers() == ['Alice', 'Me']
+        assert texts(parsed) == ['Hello', 'Hi there']
+
+    def test_url_lines_are_not_headers(self):
+        lines = []
+        for i in range(5):
+            lines += [f'Alice: look at this {i}', 'https://foo.org/bar', f'Bob: nice {i}']
+        parsed = parse_chat('\n'.join(lines))
+        assert parsed.format == 'plain'
+        assert parsed.speakers() == ['Alice', 'Bob']
+        assert parsed.confidence < 0.8
+
+    def test_messenger_json_sorted_and_decoded(self):
+        export = {
+            'participants': [{'name': 'A'}, {'name': 'B'}],
+            'messages': [
+                {'sender_name': 'B', 'timestamp_ms': 2000, 'content': 'cafÃ©'},
+                {'sender_name': 'A', 'timestamp_ms': 1000, 'content': 'hey'},
+                {'sender_name': 'A', 'timestamp_ms': 1500, 'photos': []}
+            ]
+        }
+        parsed = parse_chat(json.dumps(export))
+        assert parsed.format == 'messenger'
+        assert texts(parsed) == ['hey', 'café']
+        assert parsed.confidence == 1.0
+
+    def test_messenger_json_mixed_timestamp_types(self):
+        export = {
+            'messages': [
+                {'sender_name': 'B', 'timestamp_ms': '3000', 'content': 'third'},
+                {'sender_name': 'A', 'timestamp_ms': 2000, 'content': 'second'},
+                {'sender_name': 'B', 'timestamp_ms': 'soon', 'content': 'undated'},
+                {'sender_name': 'A', 'timestamp_ms': 1000, 'content': 'first'}
+            ]
+        }
+        parsed = parse_chat(json.dumps(export))
+        assert texts(parsed) == ['undated', 'first', 'second', 'third']
+        assert 'timestamp' not in parsed.messages[0]
+        assert parsed.messages[3]['timestamp'] == '1970-01-01T00:00:03+00:00'
+
+    @pytest.mark.parametrize('text', [
+        'Some conversation text',
+        'Meet at 12:30 ok\nsure',
+        'Alice: only one message',
+        'see https://example.com and http://example.org',
+    ])
+    def test_unrecognized_text(self, text):
+        assert parse_chat(text) is None
+
+    def test_prose_labels_have_low_confidence(self):
+        parsed = parse_chat('Note: one\nTip: two\nWarning: three')
+        assert parsed.confidence < 0.8
+
+    def test_unattributed_lines_lower_confidence(self):
+        parsed = parse_chat('Intro paragraph\nmore prose\nAlice: Hello\nBob: Hi')
+        assert parsed.confidence < 0.8
+
+    def test_identification_structure(self):
+        result = parse_chat('Alice: Hello\nBob: Hi there').as_identification()
+        assert set(result) >= {'speakers_identified', 'messages', 'analysis_notes', 'confidence_overall'}
+        assert set(result['messages'][0]) == {'speaker', 'text', 'confidence', 'reasoning'}
+
+
+class TestPlausibleSpeaker:
+    """Tests for plausible_speaker."""
+
+    @pytest.mark.parametrize('name', ['Alice', 'Mary Jane', '+61 412 345 678', 'Dr. Smith', 'José'])
+    def test_names(self, name):
+        assert plausible_speaker(name)
+
+    @pytest.mark.parametrize('name', ['', '12', 'this is a long sentence here', 'Why?', 'http://x', 'a' * 41])
+    def test_not_names(self, name):
+        assert not plausible_speaker(name)
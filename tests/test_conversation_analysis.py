@@ -0,0 +1,194 @@
+"""
+Tests for map-reduce analysis of long conversations.
+
+Run: python -m pytest tests/test_conversation_analysis.py -v
+"""
+
+from conversation_analysis import (
+    ConversationStateStore, compact_state, fingerprint_chain, merge_window_analyses, split_windows
+)
+from result_cache import ResultCache
+
+
+class TestSplitWindows:
+    """Tests for split_windows."""
+
+    def test_single_window_when_everything_fits(self):
+        assert split_windows([10] * 5, 1000, 2) == [(0, 5)]
+
+    def test_windows_cover_all_messages_with_overlap(self):
+        windows = split_windows([10] * 100, 122, 3)
+        assert windows[0][0] == 0
+        assert windows[-1][1] == 100
+        for (_, previous_end), (start, _) in zip(windows, windows[1:]):
+            assert start == previous_end - 3
+        # [ + 10 messages of 10 chars with ', ' separators + ]
+        assert all(end - start <= 10 for start, end in windows)
+
+    def test_oversized_message_gets_own_window(self):
+        windows = split_windows([10, 500, 10], 100, 1)
+        assert (1, 2) in windows
+        assert windows[-1][1] == 3
+
+    def test_overlap_always_makes_progress(self):
+        windows = split_windows([60] * 5, 100, 4)
+        assert windows == [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5)]
+
+    def test_empty(self):
+        assert split_windows([], 100, 2) == []
+
+
+class TestMergeWindowAnalyses:
+    """Tests for merge_window_analyses."""
+
+    def test_no_results(self):
+        assert merge_window_analyses([None, None], [5, 5]) is None
+
+    def test_scores_weighted_by_window_size(self):
+        merged = merge_window_analyses(
+            [{'conversation_health_score': 20, 'power_dynamics': {'balance_score': 2}},
+             {'conversation_health_score': 80, 'power_dynamics': {'balance_score': 8}}],
+            [1, 3]
+        )
+        assert merged['conversation_health_score'] == 65
+        assert merged['power_dynamics']['balance_score'] == 6.5
+
+    def test_failed_windows_are_skipped(self):
+        merged = merge_window_analyses([None, {'summary': 'Only part.'}], [5, 5])
+        assert merged['summary'] == 'Only part.'
+
+    def test_speakers_merged_by_name(self):
+        merged = merge_window_analyses([
+            {'speaker_analyses': [{
+                'speaker': 'Alice',
+                'communication_style': {'primary': 'assertive', 'examples': ['a'], 'effectiveness_score': 6},
+                'strengths': ['clear', 'kind'],
+                'behaviors_exhibited': [{'behavior_id': 'b1', 'frequency': 'rare', 'examples': ['x']}]
+            }]},
+            {'speaker_analyses': [{
+                'speaker': 'alice ',
+                'communication_style': {'primary': 'passive', 'examples': ['b'], 'effectiveness_score': 8},
+                'strengths': ['Clear'],
+                'behaviors_exhibited': [
+                    {'behavior_id': 'b2', 'frequency': 'occasional'},
+                ]
+            }]}
+        ], [3, 1])
+        assert len(merged['speaker_analyses']) == 1
+        alice = merged['speaker_analyses'][0]
+        assert alice['communication_style'] == {
+            'primary': 'assertive', 'examples': ['a', 'b'], 'effectiveness_score': 6.5
+        }
+        assert alice['strengths'] == ['clear', 'kind']
+        assert [b['behavior_id'] for b in alice['behaviors_exhibited']] == ['b2', 'b1']
+
+    def test_behavior_in_most_windows_is_frequent(self):
+        window = {'speaker_analyses': [{
+            'speaker': 'Bob',
+            'behaviors_exhibited': [{'behavior_id': 'stonewalling', 'frequency': 'rare'}]
+        }]}
+        merged = merge_window_analyses([window, window, window], [1, 1, 1])
+        behavior = merged['speaker_analyses'][0]['behaviors_exhibited'][0]
+        assert behavior['frequency'] == 'frequent'
+
+    def test_manipulation_keeps_most_serious_finding(self):
+        merged = merge_window_analyses([
+            {'manipulation_check': {'detected': False, 'severity': 'none'}},
+            {'manipulation_check': {'detected': True, 'severity': 'severe', 'types': ['gaslighting']}},
+            {'manipulation_check': {'detected': False, 'severity': 'mild'}}
+        ], [10, 1, 10])
+        assert merged['manipulation_check'] == {
+            'detected': True, 'types': ['gaslighting'], 'examples': [], 'severity': 'severe'
+        }
+
+    def test_labels_take_majority_and_descriptions_latest(self):
+        merged = merge_window_analyses([
+            {'relationship_dynamics': {'overall_health': 'healthy', 'conflict_style': 'old'}},
+            {'relationship_dynamics': {'overall_health': 'healthy', 'conflict_style': 'older'}},
+            {'relationship_dynamics': {'overall_health': 'concerning', 'conflict_style': 'current'}}
+        ], [1, 1, 1])
+        assert merged['relationship_dynamics']['overall_health'] == 'healthy'
+        assert merged['relationship_dynamics']['conflict_style'] == 'current'
+
+    def test_insights_most_recent_first_without_duplicates(self):
+        merged = merge_window_analyses([
+            {'actionable_insights': [{'for_speaker': 'both', 'insight': 'Listen more'}]},
+            {'actionable_insights': [
+                {'for_speaker': 'both', 'insight': 'listen more '},
+                {'for_speaker': 'Bob', 'insight': 'Pause first'}
+            ]}
+        ], [1, 1])
+        assert [i['insight'] for i in merged['actionable_insights']] == ['listen more ', 'Pause first']
+
+    def test_lists_are_capped(self):
+        merged = merge_window_analyses(
+            [{'follow_up_questions': [f'q{i}' for i in range(8)]},
+             {'follow_up_questions': [f'q{i}' for i in range(8, 16)]}],
+            [1, 1]
+        )
+        assert merged['follow_up_questions'] == [f'q{i}' for i in range(6, 16)]
+
+    def test_latest_summary_does_not_grow(self):
+        merged = {'summary': 'Start.', 'speaker_analyses': [{'speaker': 'A', 'strengths': ['s0']}]}
+        for update in range(1, 6):
+            merged = merge_window_analyses([merged, {
+                'summary': f'Summary {update}.',
+                'speaker_analyses': [{'speaker': 'A', 'strengths': [f's{update}{i}' for i in range(3)]}]
+            }], [10, 2], latest_summary=True)
+        assert merged['summary'] == 'Summary 5.'
+        assert merged['speaker_analyses'][0]['strengths'][-3:] == ['s50', 's51', 's52']
+        assert len(merged['speaker_analyses'][0]['strengths']) == 10
+
+
+class TestFingerprintChain:
+    """Tests for fingerprint_chain."""
+
+    def test_appended_messages_share_prefix(self):
+        messages = [{'speaker': 'A', 'text': 'hi'}, {'speaker': 'B', 'text': 'hey'}]
+        chain = fingerprint_chain(messages, 'seed')
+        longer = fingerprint_chain(messages + [{'speaker': 'A', 'text': 'bye'}], 'seed')
+        assert len(longer) == 3
+        assert longer[:2] == chain
+
+    def test_seed_and_history_change_every_fingerprint(self):
+        messages = ['one', 'two']
+        assert fingerprint_chain(messages, 'a')[1] != fingerprint_chain(messages, 'b')[1]
+        assert fingerprint_chain(['other', 'two'], 'a')[1] != fingerprint_chain(messages, 'a')[1]
+
+    def test_key_order_does_not_matter(self):
+        assert fingerprint_chain([{'a': 1, 'b': 2}], '') == fingerprint_chain([{'b': 2, 'a': 1}], '')
+
+
+class TestConversationStateStore:
+    """Tests for ConversationStateStore and compact_state."""
+
+    def test_latest_finds_state_of_shorter_prefix(self):
+        store = ConversationStateStore(ResultCache(), ttl=60)
+        chain = fingerprint_chain(['one', 'two', 'three', 'four'], '')
+        store.save(chain[:2], {'summary': 'first two'})
+        assert store.latest(chain) == (2, {'summary': 'first two'})
+        assert store.latest(chain[:1]) is None
+
+    def test_other_branch_is_not_used(self):
+        store = ConversationStateStore(ResultCache(), ttl=60)
+        store.save(fingerprint_chain(['one', 'two'], ''), {'summary': 'x'})
+        assert store.latest(fingerprint_chain(['one', 'changed', 'three'], '')) is None
+
+    def test_compact_state_keeps_only_context(self):
+        state = compact_state({
+            'summary': 'Tense.',
+            'speaker_analyses': [{
+                'speaker': 'Alice',
+                'communication_style': {'primary': 'direct', 'description': 'long text'},
+                'behaviors_exhibited': [{'behavior_id': 'stonewalling', 'examples': ['quote']}]
+            }],
+            'manipulation_check': {'detected': False, 'severity': 'none', 'examples': []},
+            'conversation_health_score': 60
+        })
+        assert state == {
+            'summary': 'Tense.',
+            'speakers': [{'speaker': 'Alice', 'communication_style': 'direct',
+                          'attachment_style': None, 'behaviors': ['stonewalling']}],
+            'manipulation_severity': 'none',
+            'conversation_health_score': 60
+        }
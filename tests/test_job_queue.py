@@ -0,0 +1,194 @@
+"""
+Tests for the persistent background job queue.
+
+Run: python -m pytest tests/test_job_queue.py -v
+"""
+
+import threading
+import time
+import pytest
+from cryptography.fernet import Fernet
+
+from job_queue import JobQueue, FAILED, QUEUED, RUNNING, SUCCEEDED
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'jobs.db')
+
+
+@pytest.fixture
+def cipher():
+    return Fernet(Fernet.generate_key())
+
+
+def echo_handler(kind, payload):
+    if payload.get('fail'):
+        raise RuntimeError("boom")
+    return {'kind': kind, 'echo': payload}
+
+
+class TestJobQueue:
+    """Tests for JobQueue."""
+
+    def test_submit_then_claim_and_run(self, db_path, cipher):
+        queue = JobQueue(db_path, echo_handler, cipher)
+        job_id = queue.submit('profile', {'x': 1})
+        assert queue.get(job_id)['status'] == QUEUED
+
+        claimed = queue.claim()
+        assert claimed[0] == job_id
+        assert queue.get(job_id)['status'] == RUNNING
+        assert queue.claim() is None
+
+        queue.run_job(*claimed)
+        job = queue.get(job_id)
+        assert job['status'] == SUCCEEDED
+        assert job['result'] == {'kind': 'profile', 'echo': {'x': 1}}
+
+    def test_handler_error_marks_job_failed(self, db_path, cipher):
+        queue = JobQueue(db_path, echo_handler, cipher)
+        job_id = queue.submit('profile', {'fail': True})
+        queue.run_job(*queue.claim())
+        job = queue.get(job_id)
+        assert job['status'] == FAILED
+        assert 'result' not in job
+        assert queue.stats()['failed'] == 1
+
+    def test_jobs_survive_restart(self, db_path, cipher):
+        job_id = JobQueue(db_path, echo_handler, cipher).submit('profile', {'x': 1})
+        restarted = JobQueue(db_path, echo_handler, cipher)
+        assert restarted.claim()[0] == job_id
+
+    def test_expired_lease_is_reclaimed(self, db_path, cipher):
+        queue = JobQueue(db_path, echo_handler, cipher, lease=0.05)
+        job_id = queue.submit('profile', {'x': 1})
+        queue.claim()
+        # The worker "dies" without finishing
+        time.sleep(0.1)
+        assert queue.get(job_id)['status'] == QUEUED
+        claimed = queue.claim()
+        assert claimed[0] == job_id
+        assert queue.stats()['retried'] == 1
+
+    def test_repeatedly_interrupted_job_fails(self, db_path, cipher):
+        queue = JobQueue(db_path, echo_handler, cipher, lease=0.01, max_attempts=1)
+        job_id = queue.submit('profile', {'x': 1})
+        queue.claim()
+        time.sleep(0.05)
+        assert queue.claim() is None
+        assert queue.get(job_id)['status'] == FAILED
+
+    def test_results_expire(self, db_path, cipher):
+        queue = JobQueue(db_path, echo_handler, cipher, result_ttl=0.05)
+        job_id = queue.submit('profile', {'x': 1})
+        queue.run_job(*queue.claim())
+        assert queue.get(job_id) is not None
+        time.sleep(0.1)
+        assert queue.get(job_id) is None
+        assert queue.purge_expired() == 1
+
+    def test_payload_and_result_encrypted_at_rest(self, db_path, cipher):
+        import sqlite3
+        queue = JobQueue(db_path, echo_handler, cipher)
+        job_id = queue.submit('profile', {'secret': 'my diary'})
+        payload = sqlite3.connect(db_path).execute("SELECT payload FROM jobs").fetchone()[0]
+        assert b'my diary' not in payload
+        queue.run_job(*queue.claim())
+        assert queue.get(job_id)['result']['echo'] == {'secret': 'my diary'}
+
+    def test_delete(self, db_path, cipher):
+        queue = JobQueue(db_path, echo_handler, cipher)
+        job_id = queue.submit('profile', {'x': 1})
+        queue.run_job(*queue.claim())
+        assert queue.delete(job_id) is True
+        assert queue.get(job_id) is None
+        assert queue.delete(job_id) is False
+
+    def test_requires_cipher(self, db_path):
+        with pytest.raises(ValueError):
+            JobQueue(db_path, echo_handler, None)
+
+    def test_payload_removed_when_finished(self, db_path, cipher):
+        import sqlite3
+        queue = JobQueue(db_path, echo_handler, cipher)
+        queue.submit('profile', {'x': 1})
+        queue.run_job(*queue.claim())
+        payload = sqlite3.connect(db_path).execute("SELECT payload FROM jobs").fetchone()[0]
+        assert payload is None
+
+    def test_workers_process_jobs_and_wait_returns_when_done(self, db_path, cipher):
+        def slow_handler(kind, payload):
+            time.sleep(0.1)
+            return payload
+
+        queue = JobQueue(db_path, slow_handler, cipher, poll_interval=0.05)
+        queue.start(2)
+        try:
+            job_ids = [queue.submit('profile', {'n': n}) for n in range(4)]
+            jobs = [queue.wait(job_id, 5) for job_id in job_ids]
+            assert [job['status'] for job in jobs] == [SUCCEEDED] * 4
+            assert [job['result'] for job in jobs] == [{'n': n} for n in range(4)]
+        finally:
+            queue.stop()
+
+    def test_unserializable_result_marks_job_failed(self, db_path, cipher):
+        queue = JobQueue(db_path, lambda kind, payload: object(), cipher)
+        job_id = queue.submit('profile', {})
+        queue.run_job(*queue.claim())
+        assert queue.get(job_id)['status'] == FAILED
+
+    def test_worker_survives_storage_errors(self, db_path, cipher):
+        queue = JobQueue(db_path, echo_handler, cipher, poll_interval=0.05)
+        finish = queue._finish
+        failures = []
+
+        def flaky_finish(job_id, status, **kwargs):
+            if len(failures) < 2:
+                failures.append(job_id)
+                raise RuntimeError("database is locked")
+            return finish(job_id, status, **kwargs)
+
+        queue._finish = flaky_finish
+        queue.start(1)
+        try:
+            stuck = queue.submit('profile', {'x': 1})
+            time.sleep(0.2)
+            # Neither outcome could be stored; the job waits for its lease to expire
+            assert queue.get(stuck)['status'] == RUNNING
+            job = queue.wait(queue.submit('profile', {'x': 2}), 5)
+            assert job['status'] == SUCCEEDED
+        finally:
+            queue.stop()
+
+    def test_wait_times_out_for_unfinished_job(self, db_path, cipher):
+        queue = JobQueue(db_path, echo_handler, cipher, poll_interval=0.01)
+        job_id = queue.submit('profile', {'x': 1})
+        start = time.monotonic()
+        assert queue.wait(job_id, 0.1)['status'] == QUEUED
+        assert time.monotonic() - start >= 0.1
+
+    def test_each_job_claimed_once_across_queues(self, db_path, cipher):
+        """Two processes' queues on one file never run the same job."""
+        first = JobQueue(db_path, echo_handler, cipher)
+        second = JobQueue(db_path, echo_handler, cipher)
+        for n in range(20):
+            first.submit('profile', {'n': n})
+
+        claimed = []
+        lock = threading.Lock()
+
+        def drain(queue):
+            while True:
+                job = queue.claim()
+                if job is None:
+                    return
+                with lock:
+                    claimed.append(job[0])
+
+        threads = [threading.Thread(target=drain, args=(q,)) for q in (first, second, first, second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(claimed) == len(set(claimed)) == 20
@@ -0,0 +1,99 @@
+"""
+Tests for the orjson-backed Flask JSON provider.
+
+Run: python -m pytest tests/test_json_provider.py -v
+"""
+
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+
+import pytest
+from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import OrjsonProvider, create_json_provider, encode, orjson
+
+pytestmark = pytest.mark.skipif(orjson is None, reason="orjson not installed")
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+
+
+VALUES = [
+    {'b': 1, 'a': [1, 2.5, None, True], 'nested': {'z': 'é 世界 🌍', 'y': ''}},
+    {'when': datetime(2024, 3, 12, 14, 23, 45), 'id': uuid.UUID(int=7), 'point': Point(1, 2)},
+    {'big': 2 ** 70},
+    [],
+]
+
+
+@pytest.fixture
+def apps():
+    fast, slow = Flask('fast'), Flask('slow')
+    fast.json = OrjsonProvider(fast)
+    return fast, slow
+
+
+class TestOrjsonProvider:
+    """The provider must produce what Flask's own provider does."""
+
+    @pytest.mark.parametrize('value', VALUES)
+    def test_same_as_stdlib(self, apps, value):
+        fast, slow = apps
+        assert json.loads(fast.json.dumps(value)) == json.loads(slow.json.dumps(value))
+        with fast.app_context():
+            fast_body = jsonify(value).get_data()
+        with slow.app_context():
+            slow_body = jsonify(value).get_data()
+        assert json.loads(fast_body) == json.loads(slow_body)
+        assert fast_body.endswith(b'\n')
+
+    def test_keys_sorted(self, apps):
+        assert apps[0].json.dumps({'b': 1, 'a': 2}) == '{"a":2,"b":1}'
+
+    def test_debug_output_is_indented(self, apps):
+        fast = apps[0]
+        fast.debug = True
+        with fast.app_context():
+            assert b'\n  "a": 1' in jsonify({'a': 1}).get_data()
+
+    def test_stdlib_arguments_still_work(self, apps):
+        assert apps[0].json.dumps({'a': 1}, indent=2) == '{\n  "a": 1\n}'
+
+    def test_unserializable_raises_type_error(self, apps):
+        with pytest.raises(TypeError):
+            apps[0].json.dumps({'a': object()})
+
+    def test_request_bodies(self, apps):
+        fast = apps[0]
+
+        @fast.route('/echo', methods=['POST'])
+        def echo():
+            return jsonify(request.get_json())
+
+        client = fast.test_client()
+        assert client.post('/echo', json={'text': 'hi é'}).get_json() == {'text': 'hi é'}
+        invalid = client.post('/echo', data='{"text": ', content_type='application/json')
+        assert invalid.status_code == 400
+
+
+class TestCreateJsonProvider:
+    """Tests for choosing the provider."""
+
+    def test_choices(self):
+        app = Flask('choice')
+        assert isinstance(create_json_provider(app, 'orjson'), OrjsonProvider)
+        stdlib = create_json_provider(app, 'stdlib')
+        assert type(stdlib) is DefaultJSONProvider
+
+    def test_unknown(self):
+        with pytest.raises(ValueError):
+            create_json_provider(Flask('choice'), 'simdjson')
+
+    def test_encode(self):
+        assert json.loads(encode({'a': 'é', 'n': 2 ** 70})) == {'a': 'é', 'n': 2 ** 70}
@@ -0,0 +1,188 @@
+"""
+Tests for incremental parsing of streamed model output.
+
+Run: python -m pytest tests/test_json_stream.py -v
+"""
+
+import json
+import random
+import pytest
+
+from json_stream import JsonRepairParser, SectionStreamParser, repair_json
+
+
+SAMPLE = {
+    "summary": "A tense exchange about plans, with \"quoted\" text and {braces}",
+    "power_dynamics": {"balance": "uneven", "notes": ["Alice leads", "Bob defers"]},
+    "speaker_analyses": [
+        {"speaker": "Alice", "behaviors_exhibited": [{"name": "Stonewalling"}]},
+        {"speaker": "Bob", "strengths": ["patient", "clear \\ calm"]}
+    ],
+    "conversation_health_score": 62,
+    "follow_up_questions": []
+}
+
+
+def feed_in_chunks(parser, text, size):
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return events
+
+
+class TestSectionStreamParser:
+    """Tests for SectionStreamParser."""
+
+    @pytest.mark.parametrize('size', [1, 3, 7, 64, 10000])
+    def test_chunk_size_does_not_change_events(self, size):
+        parser = SectionStreamParser(expand=['speaker_analyses'])
+        events = feed_in_chunks(parser, json.dumps(SAMPLE, indent=2), size)
+
+        sections = {e['key']: e['value'] for e in events if e['type'] == 'section'}
+        items = [e for e in events if e['type'] == 'item']
+        assert sections == {
+            key: value for key, value in SAMPLE.items() if key != 'speaker_analyses'
+        }
+        assert [(e['index'], e['value']) for e in items] == list(enumerate(SAMPLE['speaker_analyses']))
+        assert parser.finished
+        assert json.loads(parser.text) == SAMPLE
+
+    def test_sections_reported_as_soon_as_complete(self):
+        parser = SectionStreamParser()
+        assert parser.feed('{"summary": "Hi') == []
+        events = parser.feed('", "power_dynamics": {"balance"')
+        assert events == [{'type': 'section', 'key': 'summary', 'value': 'Hi'}]
+        assert not parser.finished
+
+    def test_expanded_entries_reported_before_array_closes(self):
+        parser = SectionStreamParser(expand=['speaker_analyses'])
+        events = parser.feed('{"speaker_analyses": [{"speaker": "A"}, {"speaker": "B"')
+        assert events == [
+            {'type': 'item', 'key': 'speaker_analyses', 'index': 0, 'value': {'speaker': 'A'}}
+        ]
+        assert parser.completed == []
+
+    def test_text_before_object_is_ignored(self):
+        parser = SectionStreamParser()
+        events = parser.feed('```json\n{"summary": "ok"}\n```')
+        assert events == [{'type': 'section', 'key': 'summary', 'value': 'ok'}]
+        assert parser.completed == ['summary']
+
+    def test_empty_object(self):
+        parser = SectionStreamParser()
+        assert parser.feed('{}') == []
+        assert parser.finished
+
+    def test_malformed_value_is_skipped(self):
+        parser = SectionStreamParser()
+        events = parser.feed('{"summary": nope, "score": 5}')
+        assert events == [{'type': 'section', 'key': 'score', 'value': 5}]
+
+
+# (broken model output, recovered value, partial)
+REPAIR_CORPUS = [
+    ('```json\n{"summary": "ok", "score": 5}\n```', {"summary": "ok", "score": 5}, False),
+    ('Here is the analysis:\n{"summary": "ok"}\nLet me know!', {"summary": "ok"}, False),
+    ('{"flags": ["a", "b",], "score": 5,}', {"flags": ["a", "b"], "score": 5}, False),
+    ('{"a": 1 "b": [1 2]}', {"a": 1, "b": [1, 2]}, False),
+    ('{"a" 1}', {"a": 1}, False),
+    ('{"summary":"x"\n "power_dynamics":{"balance":"even"}}',
+     {"summary": "x", "power_dynamics": {"balance": "even"}}, False),
+    ('["x" "y"]', ["x", "y"], False),
+    ('{"flags": ["x"\n "y"], "n": 1}', {"flags": ["x", "y"], "n": 1}, False),
+    ('{"quote": "She said "no" and left", "n": 1}', {"quote": 'She said "no" and left', "n": 1}, False),
+    ('{"quotes": ["he said "fine"", "ok"]}', {"quotes": ['he said "fine"', "ok"]}, False),
+    ('{"text": "line one\nline two\ttab"}', {"text": "line one\nline two\ttab"}, False),
+    ('{"path": "C:\\Users\\me \\q", "e": "\\u00e9"}', {"path": "C:\\Users\\me \\q", "e": "\u00e9"}, False),
+    ('{"ok": True, "missing": None, "n": -1.5e2}', {"ok": True, "missing": None, "n": -150.0}, False),
+    ('{"a": {"b": [1, 2, {"c": "d"}]}} trailing', {"a": {"b": [1, 2, {"c": "d"}]}}, False),
+    ('{"summary": "ok", "speaker_analyses": [{"speaker": "A", "style": "calm"}, {"speaker": "B", "sty',
+     {"summary": "ok", "speaker_analyses": [{"speaker": "A", "style": "calm"}, {"speaker": "B"}]}, True),
+    ('{"summary": "cut off mid-sent', {}, True),
+    ('{"score": 12', {}, True),
+    ('{"score": 12, "flags": ["a", "b"', {"score": 12, "flags": ["a", "b"]}, True),
+    ('{"messages": [{"speaker": "A", "text": "hi"}, ', {"messages": [{"speaker": "A", "text": "hi"}]}, True),
+    ('{"text": "ends with escape \\', {}, True),
+    # The last number may have been cut off
+    ('[1, 2, 3', [1, 2], True),
+    # Brackets in prose before the object do not hide it
+    ('Here is [the] analysis: {"summary": "ok"}', {"summary": "ok"}, False),
+    ('Analysis [draft:\n{"summary": "ok", "flags": ["a"]}', {"summary": "ok", "flags": ["a"]}, False),
+    ('See [1] and [2]: {"summary": "cut', {}, True),
+]
+
+
+def random_value(rng, depth=0):
+    kind = rng.choice(['object', 'array', 'string', 'number', 'literal'] if depth < 4 else ['string', 'number'])
+    if kind == 'object':
+        return {random_text(rng): random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+    if kind == 'array':
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    if kind == 'string':
+        return random_text(rng)
+    if kind == 'number':
+        return rng.choice([0, -1, 7, 2 ** 70, 3.25, -1e-7, 1.5e300])
+    return rng.choice([True, False, None])
+
+
+def random_text(rng):
+    return ''.join(rng.choice(['a', ' ', '"', '\\', '\n', '{', '}', '[', ']', ',', ':', 'é', '😀', '\x01'])
+                   for _ in range(rng.randint(0, 8)))
+
+
+def is_prefix(partial, full):
+    """Whether partial holds only complete values that are also in full."""
+    if isinstance(partial, dict):
+        return isinstance(full, dict) and all(
+            key in full and is_prefix(value, full[key]) for key, value in partial.items()
+        )
+    if isinstance(partial, list):
+        return isinstance(full, list) and len(partial) <= len(full) and all(
+            is_prefix(value, other) for value, other in zip(partial, full)
+        )
+    return partial == full
+
+
+class TestRepairJson:
+    """Tests for JsonRepairParser and repair_json."""
+
+    @pytest.mark.parametrize('text,value,partial', REPAIR_CORPUS)
+    def test_corpus(self, text, value, partial):
+        assert repair_json(text) == (value, partial)
+
+    @pytest.mark.parametrize('text,value,partial', REPAIR_CORPUS)
+    @pytest.mark.parametrize('size', [1, 2, 5])
+    def test_corpus_in_chunks(self, text, value, partial, size):
+        parser = JsonRepairParser()
+        for start in range(0, len(text), size):
+            parser.feed(text[start:start + size])
+        assert parser.finish() == (value, partial)
+
+    @pytest.mark.parametrize('text', ['', 'no json at all', '```\n```'])
+    def test_nothing_to_recover(self, text):
+        assert repair_json(text) is None
+
+    def test_valid_json_parses_exactly(self):
+        rng = random.Random(3)
+        for _ in range(300):
+            value = {'root': random_value(rng)}
+            for indent in (None, 2):
+                text = json.dumps(value, indent=indent, ensure_ascii=rng.random() < 0.5)
+                assert repair_json(text) == (value, False)
+
+    def test_every_truncation_is_a_prefix(self):
+        rng = random.Random(5)
+        for _ in range(30):
+            value = {'root': random_value(rng), 'list': [random_value(rng) for _ in range(3)]}
+            text = json.dumps(value)
+            for end in range(1, len(text)):
+                repaired = repair_json(text[:end])
+                assert repaired.partial
+                assert is_prefix(repaired.value, value), text[:end]
+
+    def test_finished(self):
+        parser = JsonRepairParser()
+        parser.feed('{"a": [1')
+        assert not parser.finished
+        parser.feed(']}')
+        assert parser.finished
@@ -0,0 +1,128 @@
+"""
+Tests for the registry of pre-built model clients.
+
+Run: python -m pytest tests/test_model_registry.py -v
+"""
+
+import threading
+import time
+import pytest
+
+from model_registry import ModelRegistry
+
+
+class FakeModel:
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.probes = 0
+
+
+class TestModelRegistry:
+    """Tests for ModelRegistry."""
+
+    def test_same_configuration_reuses_model(self):
+        registry = ModelRegistry(FakeModel)
+        first = registry.get('gemini-1.5-pro', {'temperature': 0.4, 'max_output_tokens': 8192})
+        second = registry.get('gemini-1.5-pro', {'max_output_tokens': 8192, 'temperature': 0.4})
+        assert first is second
+        assert registry.stats()['built'] == 1
+        assert registry.stats()['reused'] == 1
+
+    def test_distinct_configurations_get_distinct_models(self):
+        registry = ModelRegistry(FakeModel)
+        pro = registry.get('gemini-1.5-pro', {'temperature': 0.4})
+        warmer = registry.get('gemini-1.5-pro', {'temperature': 0.5})
+        flash = registry.get('gemini-1.5-flash', {'temperature': 0.4})
+        assert len({id(pro), id(warmer), id(flash)}) == 3
+        assert registry.stats()['model_names'] == ['gemini-1.5-flash', 'gemini-1.5-pro']
+
+    def test_preload_builds_up_front(self):
+        registry = ModelRegistry(FakeModel)
+        registry.preload([('a', {}), ('b', {}), ('a', {})])
+        assert registry.stats()['built'] == 2
+        registry.get('a', {})
+        assert registry.stats()['built'] == 2
+
+    def test_preload_skips_failing_configuration(self):
+        def factory(name, config):
+            if config.get('bad'):
+                raise TypeError("unexpected keyword")
+            return FakeModel(name, config)
+
+        registry = ModelRegistry(factory)
+        registry.preload([('a', {'bad': True}), ('b', {})])
+        assert registry.stats()['models'] == 1
+        with pytest.raises(TypeError):
+            registry.get('a', {'bad': True})
+
+    def test_warm_up_probes_once_per_model_name(self):
+        registry = ModelRegistry(FakeModel)
+        registry.preload([('pro', {'t': 1}), ('pro', {'t': 2}), ('flash', {})])
+
+        def probe(model):
+            model.probes += 1
+
+        registry.warm_up(probe)
+        stats = registry.stats()
+        assert stats['warmups'] == 2
+        assert set(stats['warmup_ms']) == {'pro', 'flash'}
+
+    def test_warm_up_errors_are_counted_not_raised(self):
+        registry = ModelRegistry(FakeModel)
+        registry.preload([('pro', {})])
+
+        def probe(model):
+            raise ConnectionError("unreachable")
+
+        registry.warm_up(probe)
+        assert registry.stats()['warmup_errors'] == 1
+
+    def test_async_warm_up(self):
+        import asyncio
+        registry = ModelRegistry(FakeModel)
+        registry.preload([('pro', {}), ('flash', {})])
+
+        async def probe(model):
+            model.probes += 1
+
+        asyncio.run(registry.warm_up_async(probe))
+        assert registry.stats()['warmups'] == 2
+
+    def test_background_keepalive_repeats_probe(self):
+        registry = ModelRegistry(FakeModel)
+        registry.preload([('pro', {})])
+        probed = threading.Event()
+        calls = []
+
+        def probe(model):
+            calls.append(model)
+            if len(calls) >= 3:
+                probed.set()
+
+        registry.start_warm_up(probe, keepalive_interval=0.01)
+        try:
+            assert probed.wait(2)
+        finally:
+            registry.stop()
+
+    def test_concurrent_get_builds_once(self):
+        built = []
+
+        def slow_factory(name, config):
+            built.append(name)
+            time.sleep(0.05)
+            return FakeModel(name, config)
+
+        registry = ModelRegistry(slow_factory)
+        models = []
+        threads = [
+            threading.Thread(target=lambda: models.append(registry.get('pro', {})))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(built) == 1
+        assert all(model is models[0] for model in models)
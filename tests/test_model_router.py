@@ -0,0 +1,98 @@
+"""
+Tests for per-request model routing.
+
+Run: python -m pytest tests/test_model_router.py -v
+"""
+
+import pytest
+from unittest.mock import patch
+
+from model_router import ModelRouter, RoutingPolicy
+
+TIERS = {'flash': 'fast-model', 'pro': 'slow-model'}
+
+
+@pytest.fixture
+def router():
+    return ModelRouter(TIERS, {
+        'conversation': RoutingPolicy('pro', fast_max_tokens=1000, latency_target=5),
+        'profile': RoutingPolicy('pro'),
+    }, min_calls=3)
+
+
+class TestModelRouter:
+    """Tests for ModelRouter."""
+
+    def test_small_input_goes_to_fast_tier(self, router):
+        decision = router.route('conversation', 800)
+        assert (decision.tier, decision.model, decision.reason) == ('flash', 'fast-model', 'small input')
+
+    def test_large_input_uses_endpoint_default(self, router):
+        assert router.route('conversation', 5000).tier == 'pro'
+        assert router.route('profile', 10).tier == 'pro'
+
+    def test_requested_tier_wins(self, router):
+        decision = router.route('conversation', 100, tier='pro')
+        assert (decision.tier, decision.reason) == ('pro', 'requested')
+
+    def test_depth(self, router):
+        assert router.route('profile', 10, depth='quick').tier == 'flash'
+        assert router.route('conversation', 10, depth='deep').tier == 'pro'
+        assert router.route('conversation', 10, depth='standard').tier == 'flash'
+
+    def test_excluded_tier_is_avoided(self, router):
+        decision = router.route('conversation', 5000, exclude=['pro'])
+        assert decision.tier == 'flash'
+        assert 'pro excluded' in decision.reason
+
+    @pytest.mark.parametrize('kwargs', [
+        {'tier': 'huge'},
+        {'exclude': ['huge']},
+        {'depth': 'bottomless'},
+        {'tier': 'pro', 'exclude': ['pro']},
+        {'exclude': ['flash', 'pro']},
+    ])
+    def test_invalid_requests(self, router, kwargs):
+        with pytest.raises(ValueError):
+            router.route('conversation', 10, **kwargs)
+
+    def test_failing_model_fails_over(self, router):
+        for _ in range(5):
+            router.record('slow-model', 1.0, False)
+        decision = router.route('conversation', 5000)
+        assert decision.tier == 'flash'
+        assert 'failover from pro' in decision.reason
+        # An explicit request is honoured regardless
+        assert router.route('conversation', 5000, tier='pro').tier == 'pro'
+
+    def test_failed_model_recovers_without_calls(self, router):
+        with patch('model_router.time.monotonic', return_value=1000.0):
+            for _ in range(5):
+                router.record('slow-model', 1.0, False)
+            assert router.route('conversation', 5000).tier == 'flash'
+        # Two half-lives later the error rate is below the threshold again
+        with patch('model_router.time.monotonic', return_value=1061.0):
+            assert router.route('conversation', 5000).tier == 'pro'
+            assert router.stats()['models']['slow-model']['ewma_error_rate'] < 0.5
+
+    def test_few_errors_do_not_fail_over(self, router):
+        router.record('slow-model', 1.0, False)
+        assert router.route('conversation', 5000).tier == 'pro'
+
+    def test_slow_model_moves_borderline_inputs(self, router):
+        for _ in range(3):
+            router.record('slow-model', 9.0, True)
+        assert router.route('conversation', 1500).reason == 'latency target'
+        # Well over the threshold still needs the thorough model
+        assert router.route('conversation', 5000).tier == 'pro'
+
+    def test_decision_log_and_stats(self, router):
+        router.route('conversation', 800)
+        router.route('conversation', 5000)
+        router.record('fast-model', 0.5, True)
+        decisions = router.decisions()
+        assert [decision['tier'] for decision in decisions] == ['pro', 'flash']
+        assert decisions[0]['input_tokens'] == 5000
+        stats = router.stats()
+        assert stats['routed'] == {'conversation': {'flash': 1, 'pro': 1}}
+        assert stats['models']['fast-model']['ewma_latency_ms'] == 500.0
@@ -0,0 +1,63 @@
+"""
+Tests for the rolling profile state store.
+
+Run: python -m pytest tests/test_profile_store.py -v
+"""
+
+import sqlite3
+import time
+import pytest
+from cryptography.fernet import Fernet
+
+from profile_store import ProfileState, ProfileStateStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'profiles.db')
+
+
+@pytest.fixture
+def cipher():
+    return Fernet(Fernet.generate_key())
+
+
+class TestProfileStateStore:
+    """Tests for ProfileStateStore."""
+
+    def test_save_and_get(self, db_path, cipher):
+        store = ProfileStateStore(db_path, cipher)
+        assert store.get('p1') is None
+        store.save('p1', ProfileState({'profile_summary': 'Calm'}, 3, 'abc'))
+        assert store.get('p1') == ProfileState({'profile_summary': 'Calm'}, 3, 'abc')
+        assert store.stats() == {'stored': 1, 'hits': 1, 'misses': 1, 'saved': 1}
+
+    def test_save_replaces_state(self, db_path, cipher):
+        store = ProfileStateStore(db_path, cipher)
+        store.save('p1', ProfileState({'v': 1}, 1, 'a'))
+        store.save('p1', ProfileState({'v': 2}, 2, 'b'))
+        assert store.get('p1').conversations == 2
+
+    def test_encrypted_at_rest_and_shared_across_instances(self, db_path, cipher):
+        ProfileStateStore(db_path, cipher=cipher).save('p1', ProfileState({'secret': 'my diary'}, 1, 'a'))
+        stored = sqlite3.connect(db_path).execute("SELECT state FROM profile_states").fetchone()[0]
+        assert b'my diary' not in stored
+        assert ProfileStateStore(db_path, cipher=cipher).get('p1').analysis == {'secret': 'my diary'}
+
+    def test_states_expire(self, db_path, cipher):
+        store = ProfileStateStore(db_path, cipher, ttl=0.05)
+        store.save('p1', ProfileState({}, 1, 'a'))
+        time.sleep(0.1)
+        assert store.get('p1') is None
+        assert store.purge_expired() == 1
+
+    def test_delete(self, db_path, cipher):
+        store = ProfileStateStore(db_path, cipher)
+        store.save('p1', ProfileState({}, 1, 'a'))
+        assert store.delete('p1') is True
+        assert store.delete('p1') is False
+        assert store.get('p1') is None
+
+    def test_requires_cipher(self, db_path):
+        with pytest.raises(ValueError):
+            ProfileStateStore(db_path, None)
@@ -0,0 +1,114 @@
+"""
+Tests for compiled prompt templates and token budgets.
+
+Run: python -m pytest tests/test_prompts.py -v
+"""
+
+import json
+import pytest
+
+from prompts import (
+    CHARS_PER_TOKEN,
+    PromptStats,
+    PromptTemplate,
+    estimate_tokens,
+    fit_to_budget,
+)
+
+
+class TestPromptTemplate:
+    """Tests for PromptTemplate."""
+
+    def test_render_matches_chained_replace(self):
+        template = 'Speakers: {speakers}\nJSON: {"a": 1}\nConversation:\n{conversation}\n'
+        compiled = PromptTemplate(template, ['speakers', 'conversation'])
+        rendered = compiled.render(speakers='["A", "B"]', conversation='hello')
+        assert rendered.text == template.replace(
+            '{speakers}', '["A", "B"]'
+        ).replace('{conversation}', 'hello')
+
+    def test_slot_values_are_not_rescanned(self):
+        compiled = PromptTemplate('{speakers} / {conversation}', ['speakers', 'conversation'])
+        rendered = compiled.render(speakers='{conversation}', conversation='text')
+        assert rendered.text == '{conversation} / text'
+
+    def test_token_report(self):
+        compiled = PromptTemplate('x' * 40 + '{text}', ['text'])
+        rendered = compiled.render(text='y' * 81)
+        assert rendered.static_tokens == 10
+        assert rendered.slot_tokens == {'text': 21}
+        assert rendered.total_tokens == 31
+        assert rendered.report()['estimated_tokens'] == 31
+
+    def test_missing_slot_rejected(self):
+        with pytest.raises(ValueError):
+            PromptTemplate('no slots here', ['conversation'])
+
+    def test_slot_budget_subtracts_static_and_other_slots(self):
+        compiled = PromptTemplate('x' * 40 + '{a}{b}', ['a', 'b'])
+        assert compiled.slot_budget(100, a='y' * 40) == 80
+        assert compiled.slot_budget(5, a='y' * 40) == 0
+
+
+class TestFitToBudget:
+    """Tests for fit_to_budget."""
+
+    def test_within_budget_is_untouched(self):
+        messages = [{'speaker': 'A', 'text': 'hi'}]
+        trimmed = fit_to_budget(messages, 1000)
+        assert trimmed.value == messages
+        assert trimmed.dropped == 0
+
+    def test_list_drops_oldest_messages(self):
+        messages = [{'speaker': 'A', 'text': f'message {i:03d} ' + 'x' * 50} for i in range(100)]
+        trimmed = fit_to_budget(messages, 500)
+        assert 0 < trimmed.kept < 100
+        assert trimmed.value == messages[-trimmed.kept:]
+        assert estimate_tokens(json.dumps(trimmed.value)) <= 500
+        # One more message would not have fit
+        assert estimate_tokens(json.dumps(messages[-trimmed.kept - 1:])) > 500
+        assert trimmed.unit == 'messages'
+        # The JSON measured while fitting is kept, so nothing is serialized twice
+        assert trimmed.text == json.dumps(trimmed.value)
+
+    def test_text_drops_oldest_lines(self):
+        text = '\n'.join(f'Alice: line {i}' for i in range(1000))
+        trimmed = fit_to_budget(text, 100)
+        assert trimmed.value.endswith('Alice: line 999')
+        assert len(trimmed.value) <= 100 * CHARS_PER_TOKEN
+        assert trimmed.value.split('\n')[0].startswith('Alice: line ')
+        assert trimmed.unit == 'lines'
+
+    def test_single_oversized_message_keeps_its_end(self):
+        messages = [{'speaker': 'A', 'text': 'start ' + 'x' * 10000 + ' end'}]
+        trimmed = fit_to_budget(messages, 100)
+        assert len(trimmed.value) == 1
+        assert trimmed.value[0]['text'].endswith(' end')
+        assert estimate_tokens(json.dumps(trimmed.value)) <= 101
+
+    def test_object_trims_its_largest_list(self):
+        profile = {
+            'name': 'Test',
+            'conversations': [{'summary': 'x' * 400, 'n': i} for i in range(50)],
+            'notes': ['short']
+        }
+        trimmed = fit_to_budget(profile, 1000)
+        assert trimmed.value['name'] == 'Test'
+        assert trimmed.value['notes'] == ['short']
+        assert trimmed.value['conversations'][-1]['n'] == 49
+        assert trimmed.unit == 'conversations'
+        assert 0 < trimmed.kept < 50
+        assert estimate_tokens(json.dumps(trimmed.value)) <= 1000
+
+
+class TestPromptStats:
+    """Tests for PromptStats."""
+
+    def test_records_sizes_and_trims(self):
+        stats = PromptStats()
+        template = PromptTemplate('{text}', ['text'])
+        stats.record('simple', template.render(text='x' * 40))
+        stats.record('simple', template.render(text='x' * 80), fit_to_budget(['a', 'b'], 0))
+        assert stats.stats()['simple'] == {
+            'prompts': 2, 'estimated_tokens': 30, 'max_estimated_tokens': 20, 'trimmed': 1
+        }
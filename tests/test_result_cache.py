@@ -0,0 +1,293 @@
+"""
+Tests for the analysis result cache.
+
+Run: python -m pytest tests/test_result_cache.py -v
+"""
+
+import time
+import pytest
+from unittest.mock import patch
+
+from result_cache import (
+    CacheBackend,
+    RedisCacheBackend,
+    ResultCache,
+    SQLiteCacheBackend,
+    TieredResultCache,
+    create_result_cache,
+    decode_shared_value,
+    encode_shared_value,
+    result_cache_key,
+)
+
+
+class FakeRedis:
+    """Minimal stand-in for the redis client calls the backend makes."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        self.ttls[key] = ex
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def eval(self, script, numkeys, key, value):
+        # Only ever called with the backend's compare-and-delete script
+        if self.data.get(key) != value:
+            return 0
+        del self.data[key]
+        return 1
+
+
+class BrokenBackend(CacheBackend):
+    name = 'broken'
+
+    def get(self, key):
+        raise ConnectionError("down")
+
+    def set(self, key, value, ttl):
+        raise ConnectionError("down")
+
+    def add(self, key, value, ttl):
+        raise ConnectionError("down")
+
+    def delete(self, key):
+        raise ConnectionError("down")
+
+    def delete_if(self, key, value):
+        raise ConnectionError("down")
+
+
+class TestResultCacheKey:
+    """Tests for content-addressed cache keys."""
+
+    def test_stable(self):
+        config = {'temperature': 0.4, 'max_output_tokens': 8192}
+        assert result_cache_key('m', config, 'prompt') == result_cache_key('m', dict(config), 'prompt')
+
+    def test_config_order_does_not_matter(self):
+        a = result_cache_key('m', {'a': 1, 'b': 2}, 'p')
+        b = result_cache_key('m', {'b': 2, 'a': 1}, 'p')
+        assert a == b
+
+    def test_every_input_changes_key(self):
+        base = result_cache_key('m', {'t': 0.4}, 'p')
+        assert result_cache_key('n', {'t': 0.4}, 'p') != base
+        assert result_cache_key('m', {'t': 0.5}, 'p') != base
+        assert result_cache_key('m', {'t': 0.4}, 'q') != base
+
+
+class TestResultCache:
+    """Tests for LRU, TTL and memory cap behavior."""
+
+    def test_hit_and_miss(self):
+        cache = ResultCache()
+        assert cache.get('k', 'conversation') is None
+        cache.set('k', '{"a": 1}', ttl=60, endpoint='conversation')
+        assert cache.get('k', 'conversation') == '{"a": 1}'
+        stats = cache.stats()['endpoints']['conversation']
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+
+    def test_expiry(self):
+        cache = ResultCache()
+        with patch('result_cache.time.monotonic', return_value=100.0):
+            cache.set('k', 'v', ttl=10)
+        with patch('result_cache.time.monotonic', return_value=111.0):
+            assert cache.get('k') is None
+        assert cache.stats()['endpoints']['default']['expirations'] == 1
+        assert len(cache) == 0
+
+    def test_lru_eviction_by_entries(self):
+        cache = ResultCache(max_entries=2)
+        cache.set('a', '1', ttl=60)
+        cache.set('b', '2', ttl=60)
+        cache.get('a')
+        cache.set('c', '3', ttl=60)
+        assert cache.get('b') is None
+        assert cache.get('a') == '1'
+        assert cache.get('c') == '3'
+
+    def test_memory_cap(self):
+        cache = ResultCache(max_bytes=10)
+        cache.set('a', 'x' * 6, ttl=60)
+        cache.set('b', 'y' * 6, ttl=60)
+        assert cache.get('a') is None
+        assert cache.stats()['bytes'] <= 10
+
+    def test_oversized_value_not_stored(self):
+        cache = ResultCache(max_bytes=4)
+        cache.set('a', 'too large', ttl=60)
+        assert len(cache) == 0
+
+    def test_zero_ttl_not_stored(self):
+        cache = ResultCache()
+        cache.set('a', 'v', ttl=0)
+        assert len(cache) == 0
+
+    def test_overwrite_updates_size(self):
+        cache = ResultCache()
+        cache.set('a', 'xxxx', ttl=60)
+        cache.set('a', 'xx', ttl=60)
+        assert cache.stats()['bytes'] == 2
+
+    def test_clear(self):
+        cache = ResultCache()
+        cache.set('a', 'v', ttl=60)
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.stats()['hits'] == 0
+
+
+# ============================================
+# SHARED TIER
+# ============================================
+
+class TestSharedValueEncoding:
+    """Tests for compressed shared-tier values."""
+
+    def test_round_trip(self):
+        blob = encode_shared_value('{"summary": "ok"}' * 100, 1234.5)
+        assert decode_shared_value(blob) == ('{"summary": "ok"}' * 100, 1234.5)
+
+    def test_compressed(self):
+        value = '{"summary": "repetitive"}' * 1000
+        assert len(encode_shared_value(value, 0)) < len(value) / 10
+
+
+class TestCacheBackend:
+    """Tests for the shared tier interface."""
+
+    def test_incomplete_backend_cannot_be_created(self):
+        class Incomplete(CacheBackend):
+            def get(self, key):
+                return None
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+
+class TestSQLiteCacheBackend:
+    """Tests for the local-process shared tier."""
+
+    def test_set_get_delete(self, tmp_path):
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        backend.set('k', b'value', ttl=60)
+        assert backend.get('k') == b'value'
+        backend.delete('k')
+        assert backend.get('k') is None
+
+    def test_expired_values_hidden(self, tmp_path):
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        backend.set('k', b'value', ttl=-1)
+        assert backend.get('k') is None
+
+    def test_shared_between_instances(self, tmp_path):
+        path = str(tmp_path / "cache.db")
+        SQLiteCacheBackend(path).set('k', b'value', ttl=60)
+        assert SQLiteCacheBackend(path).get('k') == b'value'
+
+    def test_delete_if_compares_value(self, tmp_path):
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        backend.set('k', b'mine', ttl=60)
+        assert backend.delete_if('k', b'other') is False
+        assert backend.get('k') == b'mine'
+        assert backend.delete_if('k', b'mine') is True
+        assert backend.get('k') is None
+
+
+class TestRedisCacheBackend:
+    """Tests for the Redis shared tier against a fake client."""
+
+    def test_prefixes_keys_and_sets_ttl(self):
+        client = FakeRedis()
+        backend = RedisCacheBackend(client=client)
+        backend.set('k', b'value', ttl=90.7)
+        assert client.ttls['text-decoder:result:k'] == 90
+        assert backend.get('k') == b'value'
+        backend.delete('k')
+        assert backend.get('k') is None
+
+    def test_add_is_set_if_absent(self):
+        backend = RedisCacheBackend(client=FakeRedis())
+        assert backend.add('lock', b'a', ttl=10) is True
+        assert backend.add('lock', b'b', ttl=10) is False
+
+    def test_delete_if_compares_value(self):
+        client = FakeRedis()
+        backend = RedisCacheBackend(client=client)
+        backend.set('k', b'mine', ttl=60)
+        assert backend.delete_if('k', b'other') is False
+        assert backend.delete_if('k', b'mine') is True
+        assert backend.get('k') is None
+
+
+class TestTieredResultCache:
+    """Tests for the two-level cache."""
+
+    def test_write_through_and_shared_hit(self, tmp_path):
+        path = str(tmp_path / "cache.db")
+        worker_a = TieredResultCache(ResultCache(), SQLiteCacheBackend(path))
+        worker_b = TieredResultCache(ResultCache(), SQLiteCacheBackend(path))
+
+        worker_a.set('k', '{"a": 1}', ttl=60, endpoint='conversation')
+        assert worker_b.get('k', 'conversation') == '{"a": 1}'
+        assert worker_b.stats()['shared']['hits'] == 1
+        # The shared hit is promoted into the worker's own tier
+        assert len(worker_b.local) == 1
+
+    def test_shared_miss(self):
+        cache = TieredResultCache(ResultCache(), RedisCacheBackend(client=FakeRedis()))
+        assert cache.get('missing') is None
+        assert cache.stats()['shared']['misses'] == 1
+
+    def test_expired_shared_value_is_miss(self):
+        client = FakeRedis()
+        client.data['text-decoder:result:k'] = encode_shared_value('v', time.time() - 1)
+        cache = TieredResultCache(ResultCache(), RedisCacheBackend(client=client))
+        assert cache.get('k') is None
+
+    def test_backend_failure_is_a_miss(self):
+        cache = TieredResultCache(ResultCache(), BrokenBackend())
+        cache.set('k', 'v', ttl=60)
+        cache.local.clear()
+        assert cache.get('k') is None
+        assert cache.stats()['shared']['errors'] == 2
+
+    def test_peek_shared_does_not_count(self):
+        client = FakeRedis()
+        cache = TieredResultCache(ResultCache(), RedisCacheBackend(client=client))
+        assert cache.peek_shared('k') is None
+        client.data['text-decoder:result:k'] = encode_shared_value('v', time.time() + 60)
+        assert cache.peek_shared('k') == 'v'
+        assert cache.stats()['shared']['misses'] == 0
+
+    def test_corrupt_value_is_a_miss(self):
+        client = FakeRedis()
+        client.data['text-decoder:result:k'] = b'garbage'
+        cache = TieredResultCache(ResultCache(), RedisCacheBackend(client=client))
+        assert cache.get('k') is None
+
+
+class TestCreateResultCache:
+    """Tests for backend selection."""
+
+    def test_memory(self):
+        assert isinstance(create_result_cache(1024), ResultCache)
+
+    def test_sqlite(self, tmp_path):
+        cache = create_result_cache(1024, 'sqlite', sqlite_path=str(tmp_path / "c.db"))
+        assert cache.stats()['shared']['backend'] == 'sqlite'
+
+    def test_redis_without_url_falls_back(self):
+        assert isinstance(create_result_cache(1024, 'redis'), ResultCache)
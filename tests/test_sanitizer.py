@@ -0,0 +1,91 @@
+"""
+Tests for the fast-path sanitizer.
+
+Run: python -m pytest tests/test_sanitizer.py -v
+"""
+
+import random
+
+import pytest
+
+from sanitizer import clean, sanitize, sanitize_fields
+
+PIECES = [
+    'a', 'hello', ' ', '\n', '\t', '\r', '\r\n', '\x00', '\x0c', '\x1b', 'é', '😀', '"', '=',
+    '<', '>', '&', '&amp;', '&lt;', '&#39;', '&nbsp', '<p>', '</p>', '<b', '<br/>',
+    '<script>', '</script>', '<style>', '<textarea>', '</textarea>', '<!--', '-->',
+    '<table>', '<td>', '</table>', '<select>', '<option>', '<plaintext>', '<svg>', '<![CDATA[',
+]
+
+
+def reference(text, max_length=None):
+    """What sanitize_input returned before the fast path."""
+    if not text:
+        return ""
+    cleaned = clean(text)
+    return cleaned[:max_length] if max_length is not None else cleaned
+
+
+class TestSanitize:
+    """sanitize must match bleach exactly."""
+
+    @pytest.mark.parametrize('text', [
+        "<script>alert('xss')</script>Hello",
+        '<a href="javascript:alert(1)">Click</a>',
+        "This is a normal message with no HTML",
+        "Line 1\nLine 2\nLine 3",
+        "Hello 世界 🌍 émoji",
+        "Tom & Jerry <3 > all",
+        "Windows\r\nline endings\r\n",
+        "bell\x07 and form\x0cfeed",
+        "",
+        None,
+    ])
+    def test_matches_bleach(self, text):
+        assert sanitize(text) == reference(text)
+
+    def test_plain_text_is_returned_as_is(self):
+        text = "Alice: are we still on for tonight?\nBob: yes!"
+        assert sanitize(text) is text
+
+    @pytest.mark.parametrize('text,max_length', [
+        ('x' * 100, 10),
+        ('x' * 20 + '<b>bold</b>', 10),
+        ('x' * 5 + '<b>bold</b>' + 'y' * 20, 10),
+        ('x' * 5 + '&' + 'y' * 20, 8),
+    ])
+    def test_truncation(self, text, max_length):
+        assert sanitize(text, max_length) == reference(text, max_length)
+
+    def test_random_markup(self):
+        rng = random.Random(7)
+        for _ in range(3000):
+            text = ''.join(rng.choice(PIECES) for _ in range(rng.randint(1, 15)))
+            max_length = rng.choice([None, 5, 20])
+            assert sanitize(text, max_length) == reference(text, max_length), repr(text)
+
+
+class TestSanitizeFields:
+    """Tests for sanitizing parsed request fields."""
+
+    def test_cleans_each_string_in_place(self):
+        conversation = [
+            {'speaker': 'Alice', 'text': 'I said x <b'},
+            {'speaker': 'Bob <i>', 'text': 'and y> z', 'meta': {'tags': ['<script>a</script>'], 'n': 3}},
+        ]
+        assert sanitize_fields(conversation) == [
+            {'speaker': 'Alice', 'text': 'I said x &lt;b'},
+            {'speaker': 'Bob ', 'text': 'and y&gt; z', 'meta': {'tags': ['a'], 'n': 3}},
+        ]
+
+    def test_keys_are_cleaned(self):
+        assert sanitize_fields({'<b>name</b>': 'Test'}) == {'name': 'Test'}
+
+    def test_nested_strings_are_cut_but_bare_text_is_not(self):
+        assert sanitize_fields(['x' * 30], 10) == ['x' * 10]
+        assert sanitize_fields({'text': 'x' * 30}, 10) == {'text': 'x' * 10}
+        assert sanitize_fields('x' * 30, 10) == 'x' * 30
+
+    @pytest.mark.parametrize('value', [None, 3, 2.5, True, [], {}])
+    def test_other_values_unchanged(self, value):
+        assert sanitize_fields(value, 10) == value
@@ -0,0 +1,154 @@
+"""
+Tests for single-flight coalescing of identical in-flight calls.
+
+Run: python -m pytest tests/test_single_flight.py -v
+"""
+
+import threading
+import time
+
+from result_cache import SQLiteCacheBackend
+from single_flight import SingleFlight
+
+
+def run_concurrently(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def worker(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+class TestSingleFlightInProcess:
+    """Tests for coalescing within one worker."""
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return "result"
+
+        results, errors = run_concurrently(5, lambda: flight.do('key', slow))
+        assert len(calls) == 1
+        assert [value for value, _ in results] == ["result"] * 5
+        assert sorted(coalesced for _, coalesced in results) == [False] + [True] * 4
+        assert flight.stats()['coalesced'] == 4
+
+    def test_errors_reach_every_waiter(self):
+        flight = SingleFlight()
+
+        def failing():
+            time.sleep(0.2)
+            raise RuntimeError("upstream failed")
+
+        _, errors = run_concurrently(3, lambda: flight.do('key', failing))
+        assert all(isinstance(error, RuntimeError) for error in errors)
+
+    def test_sequential_calls_run_again(self):
+        flight = SingleFlight()
+        calls = []
+        flight.do('key', lambda: calls.append(1))
+        flight.do('key', lambda: calls.append(1))
+        assert len(calls) == 2
+        assert flight.in_flight() == 0
+
+    def test_different_keys_run_independently(self):
+        flight = SingleFlight()
+        assert flight.do('a', lambda: 1) == (1, False)
+        assert flight.do('b', lambda: 2) == (2, False)
+
+
+class TestSingleFlightAcrossWorkers:
+    """Tests for coalescing through a lock in the shared store."""
+
+    def test_leader_releases_lock(self, tmp_path):
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        flight = SingleFlight(backend=backend)
+        assert flight.do('key', lambda: "value", lookup=lambda: None) == ("value", False)
+        assert backend.add('lock:key', b'token', 10) is True
+
+    def test_expired_lock_of_another_leader_is_kept(self, tmp_path):
+        """A leader that outlives lock_ttl must not release the next leader's lock."""
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        flight = SingleFlight(backend=backend, lock_ttl=0.05)
+
+        def slow():
+            time.sleep(0.1)
+            # The lock expired meanwhile and another worker took it
+            assert backend.add('lock:key', b'next-leader', 10) is True
+            return "value"
+
+        assert flight.do('key', slow, lookup=lambda: None) == ("value", False)
+        assert backend.get('lock:key') == b'next-leader'
+        assert flight.stats()['lock_expired'] == 1
+
+    def test_waits_for_other_worker_result(self, tmp_path):
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        backend.add('lock:key', b'other-worker', 10)
+        shared = {}
+
+        def other_worker_finishes():
+            time.sleep(0.2)
+            shared['result'] = "from other worker"
+            backend.delete('lock:key')
+
+        threading.Thread(target=other_worker_finishes).start()
+        flight = SingleFlight(backend=backend, poll_interval=0.01)
+        calls = []
+        value, coalesced = flight.do(
+            'key', lambda: calls.append(1), lookup=lambda: shared.get('result')
+        )
+        assert (value, coalesced) == ("from other worker", True)
+        assert calls == []
+
+    def test_runs_itself_when_other_worker_leaves_nothing(self, tmp_path):
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        backend.add('lock:key', b'other-worker', 10)
+        threading.Timer(0.1, backend.delete, args=('lock:key',)).start()
+
+        flight = SingleFlight(backend=backend, poll_interval=0.01)
+        assert flight.do('key', lambda: "own", lookup=lambda: None) == ("own", False)
+
+    def test_wait_timeout(self, tmp_path):
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        backend.add('lock:key', b'stuck-worker', 60)
+        flight = SingleFlight(backend=backend, wait_timeout=0.05, poll_interval=0.01)
+        assert flight.do('key', lambda: "own", lookup=lambda: None) == ("own", False)
+
+    def test_lock_failure_falls_back_to_local(self):
+        class Broken:
+            name = 'broken'
+
+            def add(self, *args):
+                raise ConnectionError("down")
+
+        flight = SingleFlight(backend=Broken())
+        assert flight.do('key', lambda: "own", lookup=lambda: None) == ("own", False)
+        assert flight.stats()['lock_errors'] == 1
+
+
+class TestSQLiteAdd:
+    """Tests for the set-if-absent primitive used as the lock."""
+
+    def test_add_only_once(self, tmp_path):
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        assert backend.add('lock', b'a', 10) is True
+        assert backend.add('lock', b'b', 10) is False
+
+    def test_add_replaces_expired(self, tmp_path):
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        backend.add('lock', b'a', -1)
+        assert backend.add('lock', b'b', 10) is True
@@ -0,0 +1,41 @@
+"""
+Tests for the shared local SQLite helpers.
+
+Run: python -m pytest tests/test_sqlite_store.py -v
+"""
+
+import threading
+import pytest
+
+from sqlite_store import SQLiteDatabase, require_cipher
+
+
+class TestSQLiteDatabase:
+    """Tests for SQLiteDatabase."""
+
+    def test_creates_directory_and_uses_wal(self, tmp_path):
+        db = SQLiteDatabase(str(tmp_path / 'nested' / 'store.db'))
+        assert (tmp_path / 'nested').is_dir()
+        (mode,) = db.connection().execute("PRAGMA journal_mode").fetchone()
+        assert mode == 'wal'
+
+    def test_one_connection_per_thread(self, tmp_path):
+        db = SQLiteDatabase(str(tmp_path / 'store.db'))
+        assert db.connection() is db.connection()
+        other = []
+        thread = threading.Thread(target=lambda: other.append(db.connection()))
+        thread.start()
+        thread.join()
+        assert other[0] is not db.connection()
+
+
+class TestRequireCipher:
+    """Tests for require_cipher."""
+
+    def test_returns_cipher(self):
+        cipher = object()
+        assert require_cipher(cipher, 'Store') is cipher
+
+    def test_rejects_missing_cipher(self):
+        with pytest.raises(ValueError, match='Store requires a cipher'):
+            require_cipher(None, 'Store')
@@ -0,0 +1,160 @@
+"""
+Tests for the sync blob store.
+
+Run: python -m pytest tests/test_sync_store.py -v
+"""
+
+import sqlite3
+import threading
+import pytest
+from cryptography.fernet import Fernet
+
+from sync_store import SQLiteSyncStore, SyncStore, content_hash
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'sync.db')
+
+
+@pytest.fixture
+def cipher():
+    return Fernet(Fernet.generate_key())
+
+
+def blob_count(db_path):
+    return sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM sync_blobs").fetchone()[0]
+
+
+class TestSQLiteSyncStore:
+    """Tests for SQLiteSyncStore."""
+
+    def test_is_a_sync_store(self, db_path, cipher):
+        assert isinstance(SQLiteSyncStore(db_path, cipher), SyncStore)
+
+    def test_put_and_get_latest(self, db_path, cipher):
+        store = SQLiteSyncStore(db_path, cipher)
+        assert store.get('u1') is None
+        assert store.latest('u1') is None
+        version, created = store.put('u1', b'first')
+        assert created is True
+        assert version.version == 1
+        assert version.content_hash == content_hash(b'first')
+        assert version.size == 5
+        store.put('u1', b'second')
+        latest, data = store.get('u1')
+        assert (latest.version, data) == (2, b'second')
+        assert store.latest('u1') == latest
+
+    def test_get_older_version(self, db_path, cipher):
+        store = SQLiteSyncStore(db_path, cipher)
+        store.put('u1', b'first')
+        store.put('u1', b'second')
+        assert store.get('u1', 1)[1] == b'first'
+        assert store.get('u1', 3) is None
+
+    def test_unchanged_upload_adds_no_version(self, db_path, cipher):
+        store = SQLiteSyncStore(db_path, cipher)
+        first, _ = store.put('u1', b'same')
+        again, created = store.put('u1', b'same')
+        assert created is False
+        assert again == first
+        assert len(store.versions('u1')) == 1
+        assert store.stats()['unchanged'] == 1
+
+    def test_identical_content_is_stored_once(self, db_path, cipher):
+        store = SQLiteSyncStore(db_path, cipher)
+        store.put('u1', b'shared')
+        store.put('u2', b'shared')
+        store.put('u1', b'other')
+        store.put('u1', b'shared')
+        assert blob_count(db_path) == 2
+        assert store.get('u2')[1] == b'shared'
+        stats = store.stats()
+        assert stats['deduplicated'] == 2
+        assert stats['versions'] == 4
+        assert stats['stored_bytes'] == len(b'shared') + len(b'other')
+
+    def test_versions_are_bounded(self, db_path, cipher):
+        store = SQLiteSyncStore(db_path, cipher, max_versions=3)
+        for i in range(6):
+            store.put('u1', f'v{i}'.encode())
+        assert [v.version for v in store.versions('u1')] == [6, 5, 4]
+        assert store.get('u1', 3) is None
+        # Pruned versions release their blobs
+        assert blob_count(db_path) == 3
+        assert store.stats()['pruned'] == 3
+
+    def test_pruning_keeps_blobs_still_referenced(self, db_path, cipher):
+        store = SQLiteSyncStore(db_path, cipher, max_versions=1)
+        store.put('u1', b'shared')
+        store.put('u2', b'shared')
+        store.put('u1', b'new')
+        assert store.get('u2')[1] == b'shared'
+        assert blob_count(db_path) == 2
+
+    def test_delete_user(self, db_path, cipher):
+        store = SQLiteSyncStore(db_path, cipher)
+        store.put('u1', b'mine')
+        store.put('u1', b'shared')
+        store.put('u2', b'shared')
+        assert store.delete_user('u1') == 2
+        assert store.get('u1') is None
+        assert store.versions('u1') == []
+        assert store.get('u2')[1] == b'shared'
+        assert blob_count(db_path) == 1
+        assert store.delete_user('u1') == 0
+
+    def test_new_upload_after_delete_starts_over(self, db_path, cipher):
+        store = SQLiteSyncStore(db_path, cipher)
+        store.put('u1', b'a')
+        store.delete_user('u1')
+        version, _ = store.put('u1', b'b')
+        assert version.version == 1
+
+    def test_encrypted_at_rest_and_shared_across_instances(self, db_path, cipher):
+        SQLiteSyncStore(db_path, cipher=cipher).put('u1', b'client ciphertext')
+        stored = sqlite3.connect(db_path).execute("SELECT data FROM sync_blobs").fetchone()[0]
+        assert b'client ciphertext' not in stored
+        assert SQLiteSyncStore(db_path, cipher=cipher).get('u1')[1] == b'client ciphertext'
+
+    def test_rejects_zero_versions(self, db_path, cipher):
+        with pytest.raises(ValueError):
+            SQLiteSyncStore(db_path, cipher, max_versions=0)
+
+    def test_requires_cipher(self, db_path):
+        with pytest.raises(ValueError):
+            SQLiteSyncStore(db_path, None)
+
+    def test_incomplete_store_cannot_be_created(self):
+        class Incomplete(SyncStore):
+            def put(self, user_hash, data):
+                return None
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    def test_concurrent_uploads(self, db_path, cipher):
+        store = SQLiteSyncStore(db_path, cipher, max_versions=4)
+        errors = []
+
+        def upload(worker):
+            try:
+                for i in range(20):
+                    store.put(f'user{worker % 4}', f'{worker}-{i}'.encode())
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+        threads = [threading.Thread(target=upload, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        for user in range(4):
+            versions = store.versions(f'user{user}')
+            # Two workers per user, 40 uploads, numbered without gaps
+            assert [v.version for v in versions] == [40, 39, 38, 37]
+            assert store.latest(f'user{user}') == versions[0]
+        assert blob_count(db_path) == 16